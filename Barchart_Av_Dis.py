@@ -1,8 +1,8 @@
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-
-# Paths to your CSV files
-fold_csv_files = ['/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/4 topic distribution/topic_distributions_fold_1.csv', '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/4 topic distribution/topic_distributions_fold_2.csv', '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/4 topic distribution/topic_distributions_fold_3.csv', '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/4 topic distribution/topic_distributions_fold_4.csv', '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/4 topic distribution/topic_distributions_fold_5.csv']
+from topic_store import load_fold_distributions, load_fold_topic_words
+from topic_alignment import align_fold_topics, consensus_distributions, dominant_topic_counts
 
 # Topic titles based on the provided mapping
 topic_titles = {
@@ -18,36 +18,48 @@ topic_titles = {
     9: "Image Data Analysis"
 }
 
-# Load and aggregate the topic probabilities for each document across all folds
-doc_topic_prob = pd.DataFrame()
+def plot_dominant_topics(topic_dist_folder, file_path=None):
+    # Load the topic probabilities for each document across all folds
+    fold_data = load_fold_distributions(topic_dist_folder)
 
-for file in fold_csv_files:
-    fold_df = pd.read_csv(file)
-    # Normalize probabilities within each document to ensure they sum to 1 across topics
-    fold_df['Normalized Probability'] = fold_df.groupby('Document ID')['Probability'].apply(lambda x: x / x.sum())
-    doc_topic_prob = doc_topic_prob.append(fold_df)
+    # Each fold trained its own model, so topic 3 of one fold is not topic 3 of another. Match every fold's topics
+    # to the last fold's (whose keywords topic_keywords.csv lists, and the titles above describe) by their topic-word vectors
+    topic_words = load_fold_topic_words(topic_dist_folder)
+    if all(fold in topic_words for fold, _ in fold_data):
+        mappings, similarities = align_fold_topics(topic_words)
+        for fold, fold_similarities in similarities.items():
+            print(f"Fold {fold}: matched topics have cosine similarity {fold_similarities.min():.3f}-{fold_similarities.max():.3f}")
+    else:
+        print("Topic-word matrices are missing for some folds; topic IDs are taken as matching across folds")
+        mappings = {fold: np.arange(data['distributions'].shape[1]) for fold, data in fold_data}
 
-# Calculate the mean probability for each document-topic pair
-mean_prob = doc_topic_prob.groupby(['Document ID', 'Topic ID'])['Normalized Probability'].mean().reset_index()
+    # Normalize each document's probabilities within its fold, then average them per document over the folds that scored it
+    document_keys, consensus = consensus_distributions(fold_data, mappings)
 
-# Determine the dominant topic for each document
-dominant_topics = mean_prob.loc[mean_prob.groupby('Document ID')['Normalized Probability'].idxmax()]
+    # Count how many documents have each topic as their dominant topic
+    topic_counts = pd.DataFrame({'Topic ID': np.arange(consensus.shape[1]), 'Document Count': dominant_topic_counts(consensus)})
+    topic_counts = topic_counts[topic_counts['Document Count'] > 0]
 
-# Count how many documents belong to each topic
-topic_counts = dominant_topics['Topic ID'].value_counts().reset_index()
-topic_counts.columns = ['Topic ID', 'Document Count']
+    # Map topic IDs to titles
+    topic_counts['Topic Title'] = topic_counts['Topic ID'].map(topic_titles)
 
-# Map topic IDs to titles
-topic_counts['Topic Title'] = topic_counts['Topic ID'].map(topic_titles)
+    # Sort by the number of documents per topic
+    topic_counts.sort_values('Document Count', ascending=False, inplace=True)
 
-# Sort by the number of documents per topic
-topic_counts.sort_values('Document Count', ascending=False, inplace=True)
+    # Plotting
+    plt.figure(figsize=(12, 8))
+    plt.barh(topic_counts['Topic Title'], topic_counts['Document Count'], color='skyblue')
+    plt.xlabel('Number of Documents', fontsize=14)
+    plt.ylabel('Topics', fontsize=14)
+    plt.title('Topic Distribution Across All Documents', fontsize=16)
+    plt.tight_layout()
+    if file_path:
+        plt.savefig(file_path)
+        plt.close()
+    else:
+        plt.show()
 
-# Plotting
-plt.figure(figsize=(12, 8))
-plt.barh(topic_counts['Topic Title'], topic_counts['Document Count'], color='skyblue')
-plt.xlabel('Number of Documents', fontsize=14)
-plt.ylabel('Topics', fontsize=14)
-plt.title('Topic Distribution Across All Documents', fontsize=16)
-plt.tight_layout()
-plt.show()
+if __name__ == '__main__':
+    # Folder holding the topic_distributions_fold_N outputs (.npz stores, or CSVs from older runs) and topic_words_fold_N.npz
+    topic_dist_folder = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/4 topic distribution'
+    plot_dominant_topics(topic_dist_folder)
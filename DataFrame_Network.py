@@ -1,33 +1,24 @@
-import pandas as pd
 import os
+from analysis_store import STORE_FILENAME, query_frame, update_store
 
-# File paths
-metadata_path = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/2 text output/metadata_summary.csv'
-topic_dist_folder = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/4 topic distribution'
+def build_merged_topic_data(metadata_path, topic_dist_folder, store_path):
+    # Bring the analysis store up to date with the metadata summary and the fold topic distributions (only what changed is re-read)
+    connection = update_store(store_path, metadata_path, topic_dist_folder)
 
-# Read the metadata file
-metadata_df = pd.read_csv(metadata_path)
+    # The metadata merged with the topic distributions, matched on the extractor serial number ('Document ID')
+    merged_df = query_frame(connection, 'SELECT * FROM merged_topic_data ORDER BY "Document ID", "Fold", "Topic ID"')
+    connection.close()
 
-# Rename 'Serial Number' to 'Document ID' to match topic distribution files
-metadata_df.rename(columns={'Serial Number': 'Document ID'}, inplace=True)
+    # Optionally, save this merged DataFrame for further analysis
+    output_path = os.path.join(topic_dist_folder, 'merged_topic_data.csv')
+    merged_df.to_csv(output_path, index=False)
 
-# Prepare to read topic distribution files
-topic_files = [f for f in os.listdir(topic_dist_folder) if f.endswith('.csv') and 'topic_distribution' in f]
+    print(f"Merged data saved to: {output_path}")
+    return output_path
 
-# Read and concatenate all topic distribution files
-topic_dfs = []
-for file in topic_files:
-    file_path = os.path.join(topic_dist_folder, file)
-    topic_df = pd.read_csv(file_path)
-    topic_dfs.append(topic_df)
-
-all_topics_df = pd.concat(topic_dfs, ignore_index=True)
-
-# Merge the metadata with topic distributions
-merged_df = pd.merge(metadata_df, all_topics_df, on='Document ID', how='inner')
-
-# Optionally, save this merged DataFrame for further analysis
-output_path = os.path.join(topic_dist_folder, 'merged_topic_data.csv')
-merged_df.to_csv(output_path, index=False)
-
-print(f"Merged data saved to: {output_path}")
+if __name__ == '__main__':
+    # File paths
+    metadata_path = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/2 text output/metadata_summary.csv'
+    topic_dist_folder = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/4 topic distribution'
+    store_path = os.path.join('/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI', STORE_FILENAME)
+    build_merged_topic_data(metadata_path, topic_dist_folder, store_path)
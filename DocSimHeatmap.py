@@ -1,41 +1,87 @@
 import os
+import argparse
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from scipy.spatial.distance import cosine
+from doc_similarity import block_mean_similarity, cluster_order, cosine_similarity_matrix, save_similarity_matrix, top_k_neighbours
+from topic_store import load_topic_distributions_frame
 
+# Load every fold's topic distributions, from the .npz stores where available
 def load_topic_distributions(folder_path):
-    dfs = []
-    for filename in os.listdir(folder_path):
-        if filename.startswith('topic_distributions_fold_') and filename.endswith('.csv'):
-            file_path = os.path.join(folder_path, filename)
-            dfs.append(pd.read_csv(file_path))
-    return pd.concat(dfs)
+    return load_topic_distributions_frame(folder_path)
 
-def compute_cosine_similarity_matrix(df):
+def pivot_topic_distributions(df):
     # Pivot the DataFrame to have documents as rows and topics as columns
-    pivot_df = df.pivot_table(index='Document ID', columns='Topic ID', values='Probability', fill_value=0)
-    
-    # Compute the cosine similarity matrix
-    cosine_sim_matrix = np.zeros((pivot_df.shape[0], pivot_df.shape[0]))
-    
-    for i in range(pivot_df.shape[0]):
-        for j in range(pivot_df.shape[0]):
-            cosine_sim_matrix[i, j] = 1 - cosine(pivot_df.iloc[i], pivot_df.iloc[j])
-    
-    return cosine_sim_matrix
-
-def plot_heatmap(matrix):
+    return df.pivot_table(index='Document ID', columns='Topic ID', values='Probability', fill_value=0)
+
+def compute_cosine_similarity_matrix(df):
+    # Compute the cosine similarity matrix with blocked float32 matrix products over the normalised rows
+    return cosine_similarity_matrix(pivot_topic_distributions(df).to_numpy())
+
+# Function to save each document's top-k most similar documents to a CSV file, without building the full matrix
+def save_top_k_neighbours(df, k, file_path):
+    pivot_df = pivot_topic_distributions(df)
+    neighbour_ids, scores = top_k_neighbours(pivot_df.to_numpy(), k)
+    document_ids = pivot_df.index.to_numpy()
+    rows, ranks = np.nonzero(neighbour_ids >= 0)
+    pd.DataFrame({'Document ID': document_ids[rows],
+                  'Rank': ranks + 1,
+                  'Neighbour ID': document_ids[neighbour_ids[rows, ranks]],
+                  'Similarity': scores[rows, ranks]}).to_csv(file_path, index=False)
+
+def plot_heatmap(matrix, file_path=None):
     plt.figure(figsize=(10, 8))
     sns.heatmap(matrix, cmap='viridis')
     plt.title('Document Similarity Heatmap')
     plt.xlabel('Document ID')
     plt.ylabel('Document ID')
-    plt.show()
+    if file_path:
+        plt.savefig(file_path, dpi=150)
+        plt.close()
+    else:
+        plt.show()
+
+# Function to save a similarity overview of any number of documents: documents are ordered so that similar
+# ones are adjacent, the matrix is averaged over at most resolution x resolution blocks, and drawn as one image
+def plot_similarity_overview(df, file_path, order_method='dominance', resolution=1000):
+    vectors = pivot_topic_distributions(df).to_numpy()
+    order = cluster_order(vectors, order_method)
+    matrix, edges = block_mean_similarity(vectors, order, resolution)
+    num_docs = len(vectors)
+
+    fig, ax = plt.subplots(figsize=(10, 8))
+    image = ax.imshow(matrix, cmap='viridis', interpolation='nearest', extent=(0, num_docs, num_docs, 0))
+    fig.colorbar(image, ax=ax, label='Mean cosine similarity')
+    if order_method == 'dominance':
+        # Mark where each dominant topic's group of documents starts
+        dominant = vectors.argmax(axis=1)[order]
+        starts = np.flatnonzero(np.diff(dominant, prepend=-1))
+        ax.set_xticks(starts, [f'T{topic}' for topic in dominant[starts]], fontsize=7)
+        ax.set_yticks(starts, [f'T{topic}' for topic in dominant[starts]], fontsize=7)
+    ax.set_title(f'Document Similarity Overview ({num_docs} documents, {len(edges) - 1} blocks per side)')
+    ax.set_xlabel(f'Documents ({order_method} order)')
+    ax.set_ylabel(f'Documents ({order_method} order)')
+    fig.savefig(file_path, dpi=150)
+    plt.close(fig)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Document similarity from the fold topic distributions.')
+    parser.add_argument('--top-k', type=int, default=None, help='Save each document\'s k nearest documents to document_neighbours.csv instead of plotting')
+    parser.add_argument('--matrix-path', default=None, help='Stream the full similarity matrix to this .npy file instead of plotting')
+    parser.add_argument('--overview', default=None, help='Save a block-averaged similarity overview image to this file instead of plotting every document')
+    parser.add_argument('--order', choices=['dominance', 'hierarchical'], default='dominance', help='Document ordering for --overview')
+    parser.add_argument('--resolution', type=int, default=1000, help='Blocks per side for --overview')
+    args = parser.parse_args()
+
     output_folder = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/4 topic distribution' # Update this path
     df = load_topic_distributions(output_folder)
-    similarity_matrix = compute_cosine_similarity_matrix(df)
-    plot_heatmap(similarity_matrix)
+    if args.top_k:
+        save_top_k_neighbours(df, args.top_k, os.path.join(output_folder, 'document_neighbours.csv'))
+    elif args.matrix_path:
+        save_similarity_matrix(pivot_topic_distributions(df).to_numpy(), args.matrix_path)
+    elif args.overview:
+        plot_similarity_overview(df, args.overview, args.order, args.resolution)
+    else:
+        similarity_matrix = compute_cosine_similarity_matrix(df)
+        plot_heatmap(similarity_matrix)
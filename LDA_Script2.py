@@ -1,97 +1,190 @@
 import os
 import csv
+import time
+import shutil
+import argparse
+import tempfile
 import gensim
 import gensim.corpora as corpora
-from gensim.models import CoherenceModel
-from gensim.utils import simple_preprocess
-from nltk.corpus import stopwords
-import numpy as np
+from token_cache import CACHE_DIRNAME, load_tokenized_corpus
+from coherence_cache import CoherenceStatsCache, topic_top_words
+from lda_training import save_convergence_traces, train_lda
 import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from supervised_pool import peak_rss_bytes
+from topic_distributions import infer_document_topics, save_topic_distribution_outputs
 
-# Adjusted function to load documents and ignore metadata
-def load_documents(folder_path):
-    documents = []
-    for filename in os.listdir(folder_path):
-        if filename.endswith('.txt'):
-            file_path = os.path.join(folder_path, filename)
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-                # Split the content at the "---METADATA END---" marker and keep only the text after it
-                _, _, text_after_metadata = content.partition('---METADATA END---')
-                documents.append(text_after_metadata.strip())
-    return documents
-
-# Function for tokenizing and cleaning the dataset
-def preprocess_texts(documents):
-    stop_words = stopwords.words('english')
-    return [[word for word in simple_preprocess(doc) if word not in stop_words] for doc in documents]
-
-# Function to save document topic distributions to a CSV file
-def save_topic_distributions(document_topics, file_path):
+# Load tokenized documents from the shared token cache, tokenizing only new or changed files
+def load_processed_texts(folder_path):
+    return load_tokenized_corpus(folder_path).texts()
+
+# Function to save a documents x topics distribution matrix to a CSV file, one row per document-topic pair, with a .npz store alongside
+def save_topic_distributions(distributions, file_path):
+    save_topic_distribution_outputs(distributions, file_path)
+
+# Corpus and training options shared with sweep workers, set once per worker by init_sweep_worker()
+_sweep_data = {}
+
+def init_sweep_worker(dictionary, corpus, training_options):
+    _sweep_data.update(dictionary=dictionary, corpus=corpus, training_options=training_options)
+
+# Function to train one candidate of the topic-count sweep in a worker process, optionally warm-started from another candidate's model
+def train_sweep_candidate(num_topics, model_dir, warm_start_path=None):
+    dictionary = _sweep_data['dictionary']
+    corpus = _sweep_data['corpus']
+    warm_start = gensim.models.ldamodel.LdaModel.load(warm_start_path) if warm_start_path else None
+
+    started = time.perf_counter()
+    model, trace = train_lda(gensim.models.ldamodel.LdaModel,
+                             corpus=corpus,
+                             id2word=dictionary,
+                             num_topics=num_topics,
+                             warm_start=warm_start,
+                             random_state=100,
+                             update_every=1,
+                             chunksize=100,
+                             alpha='auto',
+                             per_word_topics=True,
+                             **_sweep_data['training_options'])
+    training_seconds = time.perf_counter() - started
+
+    # The model goes to disk rather than back through the pool; the parent keeps only the best one.
+    # Coherence is scored in the parent from the top words, against statistics shared by every candidate.
+    model_path = os.path.join(model_dir, f'lda_{num_topics}_topics.model')
+    model.save(model_path)
+    return {'Num Topics': num_topics,
+            'Top Words': topic_top_words(model),
+            'Passes': trace[-1]['Pass'],
+            'Trace': trace,
+            'Warm Start': warm_start_path,
+            'Training Seconds': round(training_seconds, 3),
+            'Peak RSS MB': round(peak_rss_bytes() / 1e6, 1),
+            'Model Path': model_path}
+
+# Function to save the sweep results table to a CSV file
+def save_sweep_results(results, file_path):
+    fieldnames = ['Num Topics', 'Coherence', 'Passes', 'Training Seconds', 'Coherence Seconds', 'Peak RSS MB']
     with open(file_path, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow(['Document ID', 'Topic ID', 'Probability'])
-        for doc_id, topics in enumerate(document_topics):
-            for topic_id, prob in topics:
-                writer.writerow([doc_id, topic_id, prob])
+        writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        for result in sorted(results, key=lambda result: result['Num Topics']):
+            writer.writerow(result)
+
+# Function to split the candidates into contiguous runs, one per worker, for warm-started sweeps
+def warm_start_chains(candidates, max_workers):
+    chain_length = -(-len(candidates) // max_workers)
+    return [candidates[i:i + chain_length] for i in range(0, len(candidates), chain_length)]
 
 # Function to perform LDA analysis
-def perform_lda_analysis(processed_texts):
+def perform_lda_analysis(processed_texts, min_topics=2, max_topics=10, step_size=1, max_workers=None, coherence_cache_path=None,
+                         passes=10, tolerance=None, max_passes=50, warm_start=False,
+                         output_path='/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/4 topic distribution/document_topic_distributions.csv'):
+    candidates = list(range(min_topics, max_topics, step_size))
+    if not candidates:
+        raise ValueError(f'No topic counts to try: range({min_topics}, {max_topics}, {step_size}) is empty')
+
     # Create Dictionary and Corpus needed for Topic Modeling
     dictionary = corpora.Dictionary(processed_texts)
     corpus = [dictionary.doc2bow(text) for text in processed_texts]
+    # c_v window statistics over the corpus, computed once per word pair and reused by every candidate
+    coherence_cache = CoherenceStatsCache(processed_texts, cache_path=coherence_cache_path)
+    training_options = {'passes': passes, 'tolerance': tolerance, 'max_passes': max_passes}
+
+    # Training the candidate LDA models across a process pool and calculating the coherence score.
+    # Each worker gets a fresh process (max_tasks_per_child=1) so its peak memory belongs to one candidate.
+    # max_tasks_per_child rules out the 'fork' start method, so the pool spawns its workers whatever the
+    # default start method is, and the dictionary and corpus are pickled into every worker, once per candidate.
+    # With warm starts the candidates form one contiguous chain per worker, each candidate starting
+    # from the previous one's topics, so the chains still train in parallel.
+    max_workers = min(max_workers or os.cpu_count() or 1, len(candidates))
+    chains = warm_start_chains(candidates, max_workers) if warm_start else [[num_topics] for num_topics in candidates]
+    successors = {chain[i]: chain[i + 1] for chain in chains for i in range(len(chain) - 1)}
+    model_dir = tempfile.mkdtemp(prefix='lda_sweep_')
+    results = []
+    traces = {}
+    best = None
+    # Models a running candidate will warm-start from; they are deleted once it has finished
+    warm_start_paths = set()
+
+    def discard(model_path):
+        if model_path not in warm_start_paths and (best is None or model_path != best['Model Path']):
+            os.remove(model_path)
+
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, max_tasks_per_child=1, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_sweep_worker, initargs=(dictionary, corpus, training_options)) as executor:
+            futures = {executor.submit(train_sweep_candidate, chain[0], model_dir) for chain in chains}
+            while futures:
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    if result['Num Topics'] in successors:
+                        warm_start_paths.add(result['Model Path'])
+                        futures.add(executor.submit(train_sweep_candidate, successors[result['Num Topics']], model_dir, result['Model Path']))
+                    started = time.perf_counter()
+                    result['Coherence'] = coherence_cache.coherence_cv(result.pop('Top Words'))
+                    result['Coherence Seconds'] = round(time.perf_counter() - started, 3)
+                    traces[result['Num Topics']] = result.pop('Trace')
+                    results.append(result)
+                    print(f"Topics: {result['Num Topics']}  Coherence: {result['Coherence']:.4f}  Passes: {result['Passes']}  "
+                          f"Training: {result['Training Seconds']}s  Peak RSS: {result['Peak RSS MB']} MB")
+                    # Selecting the model with the highest coherence score, the fewest topics on ties
+                    if best is None or (result['Coherence'], -result['Num Topics']) > (best['Coherence'], -best['Num Topics']):
+                        previous_best, best = best, result
+                        if previous_best is not None:
+                            discard(previous_best['Model Path'])
+                    else:
+                        discard(result['Model Path'])
+                    if result['Warm Start']:
+                        warm_start_paths.discard(result['Warm Start'])
+                        discard(result['Warm Start'])
 
-    # Parameters for LDA training
-    min_topics = 2
-    max_topics = 10
-    step_size = 1
-    coherence_values = []
-    model_list = []
-
-    # Training multiple LDA models and calculating the coherence score
-    for num_topics in range(min_topics, max_topics, step_size):
-        model = gensim.models.ldamodel.LdaModel(corpus=corpus,
-                                                id2word=dictionary,
-                                                num_topics=num_topics,
-                                                random_state=100,
-                                                update_every=1,
-                                                chunksize=100,
-                                                passes=10,
-                                                alpha='auto',
-                                                per_word_topics=True)
-        model_list.append(model)
-        coherencemodel = CoherenceModel(model=model, texts=processed_texts, dictionary=dictionary, coherence='c_v')
-        coherence_values.append(coherencemodel.get_coherence())
-
-    # Selecting the model with the highest coherence score
-    optimal_model_index = np.argmax(coherence_values)
-    optimal_model = model_list[optimal_model_index]
-    optimal_num_topics = range(min_topics, max_topics, step_size)[optimal_model_index]
-
-    print(f'Optimal Number of Topics: {optimal_num_topics}')
-    print(f'Optimal Model\'s Coherence Score: {coherence_values[optimal_model_index]}')
+        optimal_model = gensim.models.ldamodel.LdaModel.load(best['Model Path'])
+    finally:
+        shutil.rmtree(model_dir, ignore_errors=True)
+        if coherence_cache_path:
+            coherence_cache.save()
+
+    save_sweep_results(results, os.path.join(os.path.dirname(output_path), 'topic_sweep_results.csv'))
+    save_convergence_traces(traces, os.path.join(os.path.dirname(output_path), 'topic_sweep_convergence.csv'), 'Num Topics')
+
+    print(f'Optimal Number of Topics: {best["Num Topics"]}')
+    print(f'Optimal Model\'s Coherence Score: {best["Coherence"]}')
 
     # To see the topics in the optimal model
     for idx, topic in optimal_model.print_topics(-1):
         print(f'Topic: {idx} \nWords: {topic}')
 
-    # Compute the topic distribution for each document
-    document_topics = optimal_model.get_document_topics(corpus, minimum_probability=0.0)
+    # Compute the topic distribution for each document, in batches
+    distributions = infer_document_topics(optimal_model, corpus)
 
     # Save the topic distributions to a CSV file
-    output_path = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/4 topic distribution/document_topic_distributions.csv'  # Update this path
-    save_topic_distributions(document_topics, output_path)
+    save_topic_distributions(distributions, output_path)
     print(f'Document topic distributions saved to {output_path}')
 
 # Main execution
 if __name__ == '__main__':
-    # If you are on macOS, use the 'fork' start method
+    parser = argparse.ArgumentParser(description='Sweep LDA topic counts and keep the most coherent model.')
+    parser.add_argument('--min-topics', type=int, default=2)
+    parser.add_argument('--max-topics', type=int, default=10, help='Exclusive upper bound')
+    parser.add_argument('--step', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--passes', type=int, default=10, help='Training passes when no tolerance is given')
+    parser.add_argument('--tolerance', type=float, default=None, help='Stop training once the per-word bound changes by less than this fraction per pass')
+    parser.add_argument('--max-passes', type=int, default=50, help='Upper bound on passes with --tolerance')
+    parser.add_argument('--warm-start', action='store_true', help='Start each candidate from the previous candidate\'s topics')
+    args = parser.parse_args()
+    if not range(args.min_topics, args.max_topics, args.step):
+        parser.error(f'no topic counts between --min-topics {args.min_topics} and --max-topics {args.max_topics} (exclusive)')
+
+    # If you are on macOS, use the 'fork' start method (the sweep's pool spawns its workers regardless)
     multiprocessing.set_start_method('fork')
 
     # Load and preprocess the dataset
     folder_path = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/3 processed output'  # Update this path
-    documents = load_documents(folder_path)
-    processed_texts = preprocess_texts(documents)
+    processed_texts = load_processed_texts(folder_path)
 
     # Perform LDA Analysis
-    perform_lda_analysis(processed_texts)
+    coherence_cache_path = os.path.join(folder_path, CACHE_DIRNAME, 'coherence_stats.npz')
+    perform_lda_analysis(processed_texts, args.min_topics, args.max_topics, args.step, args.workers, coherence_cache_path,
+                         args.passes, args.tolerance, args.max_passes, args.warm_start)
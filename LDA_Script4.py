@@ -2,35 +2,21 @@ import os
 import csv
 import gensim
 import gensim.corpora as corpora
-from gensim.models import CoherenceModel
-from gensim.utils import simple_preprocess
-from nltk.corpus import stopwords
+from token_cache import CACHE_DIRNAME, load_tokenized_corpus
+from coherence_cache import CoherenceStatsCache, topic_top_words
+from lda_training import save_convergence_traces, train_lda
+from topic_distributions import infer_document_topics, save_topic_distribution_outputs
+from topic_store import save_topic_words
 from sklearn.model_selection import KFold
 import numpy as np
 
-def load_documents(folder_path):
-    documents = []
-    for filename in os.listdir(folder_path):
-        if filename.endswith('.txt'):
-            file_path = os.path.join(folder_path, filename)
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-                _, _, text_after_metadata = content.partition('---METADATA END---')
-                documents.append(text_after_metadata.strip())
-    return documents
+# Load tokenized documents from the shared token cache, tokenizing only new or changed files
+def load_processed_texts(folder_path):
+    return load_tokenized_corpus(folder_path).texts()
 
-def preprocess_texts(documents):
-    stop_words = stopwords.words('english')
-    return [[word for word in simple_preprocess(doc) if word not in stop_words] for doc in documents]
-
-def save_topic_distributions(document_topics, fold_number, output_folder):
+def save_topic_distributions(distributions, fold_number, output_folder, minimum_probability=0.0):
     file_path = os.path.join(output_folder, f'topic_distributions_fold_{fold_number}.csv')
-    with open(file_path, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow(['Document ID', 'Topic ID', 'Probability'])
-        for doc_id, topics in enumerate(document_topics):
-            for topic_id, prob in topics:
-                writer.writerow([doc_id, topic_id, prob])
+    save_topic_distribution_outputs(distributions, file_path, minimum_probability=minimum_probability)
 
 def save_topic_keywords(lda_model, output_folder, num_words):
     file_path = os.path.join(output_folder, 'topic_keywords.csv')
@@ -42,9 +28,14 @@ def save_topic_keywords(lda_model, output_folder, num_words):
             keywords = ", ".join([word for word, _ in topic_keywords])
             writer.writerow([topic_id, keywords])
 
-def perform_lda_and_save_distributions(processed_texts, output_folder, num_topics=10, num_folds=5):
+def perform_lda_and_save_distributions(processed_texts, output_folder, num_topics=10, num_folds=5, coherence_cache_path=None,
+                                       passes=10, tolerance=None, max_passes=50, warm_start=False):
     kf = KFold(n_splits=num_folds, shuffle=True, random_state=42)
     coherence_scores = []
+    # c_v window statistics over the whole corpus; each fold is scored against its test documents only
+    coherence_cache = CoherenceStatsCache(processed_texts, cache_path=coherence_cache_path)
+    traces = {}
+    lda_model = None
 
     for fold, (train_index, test_index) in enumerate(kf.split(processed_texts)):
         train_texts = [processed_texts[i] for i in train_index]
@@ -53,22 +44,34 @@ def perform_lda_and_save_distributions(processed_texts, output_folder, num_topic
         dictionary = corpora.Dictionary(train_texts)
         corpus = [dictionary.doc2bow(text) for text in train_texts]
 
-        lda_model = gensim.models.LdaMulticore(corpus=corpus,
-                                               id2word=dictionary,
-                                               num_topics=num_topics,
-                                               random_state=100,
-                                               chunksize=100,
-                                               passes=10,
-                                               per_word_topics=True)
+        # With warm starts each fold starts from the previous fold's topics; that model trained on part of
+        # this fold's test documents, so warm starts trade some independence between folds for speed
+        lda_model, traces[fold + 1] = train_lda(gensim.models.LdaMulticore,
+                                                corpus=corpus,
+                                                id2word=dictionary,
+                                                num_topics=num_topics,
+                                                passes=passes,
+                                                tolerance=tolerance,
+                                                max_passes=max_passes,
+                                                warm_start=lda_model if warm_start else None,
+                                                random_state=100,
+                                                chunksize=100,
+                                                per_word_topics=True)
 
         # Evaluate model coherence
         test_corpus = [dictionary.doc2bow(text) for text in test_texts]
-        coherence_model = CoherenceModel(model=lda_model, texts=test_texts, dictionary=dictionary, coherence='c_v')
-        coherence_scores.append(coherence_model.get_coherence())
+        coherence_scores.append(coherence_cache.coherence_cv(topic_top_words(lda_model), documents=test_index))
 
         # Save document-topic distributions for the fold
-        document_topics = [lda_model.get_document_topics(bow) for bow in test_corpus]
-        save_topic_distributions(document_topics, fold + 1, output_folder)
+        # Batched inference; topics below the model's minimum_probability are left out, as get_document_topics() does
+        distributions = infer_document_topics(lda_model, test_corpus)
+        save_topic_distributions(distributions, fold + 1, output_folder, lda_model.minimum_probability)
+        save_topic_words(lda_model.get_topics(), [dictionary[i] for i in range(len(dictionary))],
+                         os.path.join(output_folder, f'topic_words_fold_{fold + 1}.npz'))
+
+    if coherence_cache_path:
+        coherence_cache.save()
+    save_convergence_traces(traces, os.path.join(output_folder, 'fold_convergence.csv'), 'Fold')
 
     # Save topic keywords for the entire corpus
     save_topic_keywords(lda_model, output_folder, num_words=10)
@@ -81,11 +84,11 @@ def perform_lda_and_save_distributions(processed_texts, output_folder, num_topic
 if __name__ == '__main__':
     input_folder = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/3 processed output'  # Update this path to where your documents are located
     output_folder = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/4 topic distribution'    # Update this path to where you want to save CSV files
-    documents = load_documents(input_folder)
-    processed_texts = preprocess_texts(documents)
+    processed_texts = load_processed_texts(input_folder)
 
     # Perform LDA and save distributions
-    average_coherence = perform_lda_and_save_distributions(processed_texts, output_folder)
+    coherence_cache_path = os.path.join(input_folder, CACHE_DIRNAME, 'coherence_stats.npz')
+    average_coherence = perform_lda_and_save_distributions(processed_texts, output_folder, coherence_cache_path=coherence_cache_path)
 
     # Optionally, you can save the average coherence score and any other summary statistics to a text or CSV file as well.
     summary_path = os.path.join(output_folder, 'lda_summary.csv')
@@ -1,13 +1,21 @@
 import os
 import csv
+import time
+import argparse
 import gensim
 import gensim.corpora as corpora
-from gensim.models import CoherenceModel
-from gensim.utils import simple_preprocess
-from nltk.corpus import stopwords
+import instrumentation
+from instrumentation import stage, traced
+from token_cache import CACHE_DIRNAME, get_stop_words, load_tokenized_corpus, preprocess_text
+from coherence_cache import CoherenceStatsCache, topic_top_words
+from lda_training import save_convergence_traces, train_lda
+from topic_distributions import infer_document_topics, save_topic_distribution_outputs
+from topic_store import save_topic_words
 from sklearn.model_selection import KFold
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
 
+@traced()
 def load_documents(folder_path):
     documents = []
     for filename in os.listdir(folder_path):
@@ -19,18 +27,19 @@ def load_documents(folder_path):
                 documents.append((filename, text_after_metadata.strip()))  # Include filename here
     return documents
 
+@traced()
 def preprocess_texts(documents):
-    stop_words = stopwords.words('english')
-    return [(doc[0], [word for word in simple_preprocess(doc[1]) if word not in stop_words]) for doc in documents]
+    stop_words = get_stop_words()
+    return [(doc[0], preprocess_text(doc[1], stop_words)) for doc in documents]
 
-def save_topic_distributions(document_topics_with_filenames, fold_number, output_folder):
+# Load (filename, tokens) pairs from the shared token cache, tokenizing only new or changed files
+def load_processed_texts(folder_path):
+    corpus = load_tokenized_corpus(folder_path)
+    return list(zip(corpus.filenames, corpus.texts()))
+
+def save_topic_distributions(distributions, filenames, fold_number, output_folder, minimum_probability=0.0):
     file_path = os.path.join(output_folder, f'topic_distributions_fold_{fold_number}.csv')
-    with open(file_path, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow(['Filename', 'Document ID', 'Topic ID', 'Probability'])
-        for doc_id, (filename, topics) in enumerate(document_topics_with_filenames):  # Adjusted to include filename
-            for topic_id, prob in topics:
-                writer.writerow([filename, doc_id, topic_id, prob])
+    save_topic_distribution_outputs(distributions, file_path, filenames=filenames, minimum_probability=minimum_probability)
 
 def save_topic_keywords(lda_model, output_folder, num_words):
     file_path = os.path.join(output_folder, 'topic_keywords.csv')
@@ -42,62 +51,164 @@ def save_topic_keywords(lda_model, output_folder, num_words):
             keywords = ", ".join([word for word, _ in topic_keywords])
             writer.writerow([topic_id, keywords])
 
-def perform_lda_and_save_distributions(processed_texts, output_folder, num_topics=10, num_folds=5):
-    kf = KFold(n_splits=num_folds, shuffle=True, random_state=42)
-    coherence_scores = []
-
-    for fold, (train_index, test_index) in enumerate(kf.split(processed_texts)):
-     # Adjust how train_texts and test_texts are created from processed_texts
-        train_texts = [processed_texts[i][1] for i in train_index]  # Extract texts for training
-        test_texts = [processed_texts[i] for i in test_index]  # Keep full tuple for test (to preserve filenames)
-        for item in test_texts:
-            assert isinstance(item, tuple) and len(item) == 2, "Each item in test_texts must be a tuple of length 2"
-            assert isinstance(item[0], str), "The first item of each tuple in test_texts should be a string (filename)"
-            assert isinstance(item[1], list), "The second item of each tuple in test_texts should be a list (tokenized words)"
-
-
+def fold_worker_budget(num_folds, total_cores, concurrent_folds=None):
+    """
+    Splits a CPU budget between fold-level and intra-model parallelism. Returns the number of folds
+    to run at once and the LdaMulticore worker count for each fold; cores that do not divide evenly
+    go to the first folds.
+    """
+    concurrent_folds = max(1, min(concurrent_folds or num_folds, num_folds, total_cores))
+    base, extra = divmod(total_cores, concurrent_folds)
+    return concurrent_folds, [base + (1 if fold % concurrent_folds < extra else 0) for fold in range(num_folds)]
+
+def cpu_seconds():
+    """
+    CPU time of this process plus its finished child processes (and theirs, once reaped).
+    """
+    import resource
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+# Processed texts and training options shared with fold workers, set once per worker by init_fold_worker()
+_fold_data = {}
+
+def init_fold_worker(processed_texts, training_options):
+    _fold_data.update(processed_texts=processed_texts, training_options=training_options)
+
+@traced('fold')
+def run_fold(fold_number, train_index, test_index, num_topics, workers, output_folder, save_keywords, warm_start_path=None):
+    """
+    Trains and applies the model for one fold in a worker process and writes its distributions CSV.
+    Returns the topics' top words for coherence scoring in the parent, with the fold's timings and
+    convergence trace. Every fold can be warm-started from the same previously trained model.
+    """
+    started, cpu_started = time.perf_counter(), cpu_seconds()
+    processed_texts = _fold_data['processed_texts']
+    # Adjust how train_texts and test_texts are created from processed_texts
+    train_texts = [processed_texts[i][1] for i in train_index]  # Extract texts for training
+    test_texts = [processed_texts[i] for i in test_index]  # Keep full tuple for test (to preserve filenames)
+    for item in test_texts:
+        assert isinstance(item, tuple) and len(item) == 2, "Each item in test_texts must be a tuple of length 2"
+        assert isinstance(item[0], str), "The first item of each tuple in test_texts should be a string (filename)"
+        assert isinstance(item[1], list), "The second item of each tuple in test_texts should be a list (tokenized words)"
+
+    with stage('dictionary', documents=len(train_texts)):
         dictionary = corpora.Dictionary(train_texts)
         corpus = [dictionary.doc2bow(text) for text in train_texts]
 
-        lda_model = gensim.models.LdaMulticore(corpus=corpus,
-                                               id2word=dictionary,
-                                               num_topics=num_topics,
-                                               random_state=100,
-                                               chunksize=100,
-                                               passes=10,
-                                               per_word_topics=True)
-
-        # Evaluate model coherence
-        test_corpus = [dictionary.doc2bow(text[1]) for text in test_texts]
-        coherence_model = CoherenceModel(model=lda_model, texts=[text[1] for text in test_texts], dictionary=dictionary, coherence='c_v')
-        coherence_scores.append(coherence_model.get_coherence())
-
-        # Save document-topic distributions for the fold
-        # Assuming test_texts is structured as [(filename1, [words1]), (filename2, [words2]), ...]
-        document_topics_with_filenames = [(test_texts[i][0], lda_model.get_document_topics(test_corpus[i])) for i in range(len(test_texts))]
-
-        save_topic_distributions(document_topics_with_filenames, fold + 1, output_folder)
+    warm_start = gensim.models.ldamodel.LdaModel.load(warm_start_path) if warm_start_path else None
+    lda_model, trace = train_lda(gensim.models.LdaMulticore,
+                                 corpus=corpus,
+                                 id2word=dictionary,
+                                 num_topics=num_topics,
+                                 warm_start=warm_start,
+                                 workers=workers,
+                                 random_state=100,
+                                 chunksize=100,
+                                 per_word_topics=True,
+                                 **_fold_data['training_options'])
+
+    # Save document-topic distributions for the fold, inferred in batches
+    # Assuming test_texts is structured as [(filename1, [words1]), (filename2, [words2]), ...]
+    # Topics below the model's minimum_probability are left out, as get_document_topics() does
+    test_corpus = [dictionary.doc2bow(text[1]) for text in test_texts]
+    distributions = infer_document_topics(lda_model, test_corpus)
+    save_topic_distributions(distributions, [text[0] for text in test_texts], fold_number, output_folder, lda_model.minimum_probability)
+    # The fold's topic-word matrix, for aligning its topics with the other folds' (see topic_alignment.py)
+    save_topic_words(lda_model.get_topics(), [dictionary[i] for i in range(len(dictionary))],
+                     os.path.join(output_folder, f'topic_words_fold_{fold_number}.npz'))
+
+    if save_keywords:
+        save_topic_keywords(lda_model, output_folder, num_words=10)
+
+    return {'Fold': fold_number,
+            'Top Words': topic_top_words(lda_model),
+            'Trace': trace,
+            'Passes': trace[-1]['Pass'],
+            'Workers': workers,
+            'Seconds': round(time.perf_counter() - started, 3),
+            'CPU Seconds': round(cpu_seconds() - cpu_started, 3)}
+
+def save_fold_timings(fold_results, output_folder):
+    file_path = os.path.join(output_folder, 'fold_timings.csv')
+    with open(file_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=['Fold', 'Coherence', 'Passes', 'Workers', 'Seconds', 'CPU Seconds'], extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(sorted(fold_results, key=lambda result: result['Fold']))
 
-    # Save topic keywords for the entire corpus
-    save_topic_keywords(lda_model, output_folder, num_words=10)
+def perform_lda_and_save_distributions(processed_texts, output_folder, num_topics=10, num_folds=5, coherence_cache_path=None,
+                                       total_cores=None, concurrent_folds=None, passes=10, tolerance=None, max_passes=50, warm_start_path=None):
+    kf = KFold(n_splits=num_folds, shuffle=True, random_state=42)
+    splits = list(kf.split(processed_texts))
+    # c_v window statistics over the whole corpus; each fold is scored against its test documents only
+    coherence_cache = CoherenceStatsCache([text[1] for text in processed_texts], cache_path=coherence_cache_path)
+
+    # Folds run concurrently, each with its share of the cores for LdaMulticore. Every fold writes its
+    # distributions CSV as soon as it finishes; coherence is scored here as results come in.
+    total_cores = total_cores or os.cpu_count() or 1
+    concurrent_folds, fold_workers = fold_worker_budget(num_folds, total_cores, concurrent_folds)
+    started, cpu_started = time.perf_counter(), cpu_seconds()
+    fold_results = []
+    training_options = {'passes': passes, 'tolerance': tolerance, 'max_passes': max_passes}
+    traces = {}
+    with ProcessPoolExecutor(max_workers=concurrent_folds, initializer=init_fold_worker, initargs=(processed_texts, training_options)) as executor:
+        # The last fold's model provides the topic keywords, as when folds ran one after another
+        futures = [executor.submit(run_fold, fold + 1, train_index, test_index, num_topics, fold_workers[fold], output_folder,
+                                   fold == num_folds - 1, warm_start_path)
+                   for fold, (train_index, test_index) in enumerate(splits)]
+        for future in as_completed(futures):
+            result = future.result()
+            result['Coherence'] = coherence_cache.coherence_cv(result.pop('Top Words'), documents=splits[result['Fold'] - 1][1])
+            traces[result['Fold']] = result.pop('Trace')
+            fold_results.append(result)
+            print(f"Fold {result['Fold']} done in {result['Seconds']}s ({result['Passes']} passes) with {result['Workers']} LDA workers  "
+                  f"Coherence: {result['Coherence']:.4f}")
+    # Finished fold workers are reaped by now, so their CPU time (and their LDA workers') is counted
+    wall_seconds, total_cpu_seconds = time.perf_counter() - started, cpu_seconds() - cpu_started
+    print(f"{num_folds} folds in {wall_seconds:.1f}s wall-clock, {total_cpu_seconds:.1f} CPU seconds on {total_cores} cores "
+          f"({100 * total_cpu_seconds / (wall_seconds * total_cores):.0f}% utilisation, {concurrent_folds} folds at a time)")
+
+    if coherence_cache_path:
+        coherence_cache.save()
+    save_fold_timings(fold_results, output_folder)
+    save_convergence_traces(traces, os.path.join(output_folder, 'fold_convergence.csv'), 'Fold')
 
     # Print and return the average coherence score
+    coherence_scores = [result['Coherence'] for result in fold_results]
     average_coherence_score = np.mean(coherence_scores)
     print(f"Average Coherence Score: {average_coherence_score}")
     return average_coherence_score
 
+def save_lda_summary(output_folder, average_coherence):
+    summary_path = os.path.join(output_folder, 'lda_summary.csv')
+    with open(summary_path, 'w', newline='', encoding='utf-8') as summary_file:
+        writer = csv.writer(summary_file)
+        writer.writerow(['Metric', 'Value'])
+        writer.writerow(['Average Coherence Score', average_coherence])
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cross-validated LDA with per-fold topic distributions.')
+    parser.add_argument('--cores', type=int, default=None, help='CPU budget shared by all folds (default: CPU count)')
+    parser.add_argument('--concurrent-folds', type=int, default=None, help='Folds to run at once (default: as many as the budget allows)')
+    parser.add_argument('--passes', type=int, default=10, help='Training passes when no tolerance is given')
+    parser.add_argument('--tolerance', type=float, default=None, help='Stop training once the per-word bound changes by less than this fraction per pass')
+    parser.add_argument('--max-passes', type=int, default=50, help='Upper bound on passes with --tolerance')
+    parser.add_argument('--warm-start', default=None, help='Saved LDA model whose topics initialise every fold; a model trained on the full corpus has seen every test fold')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.start_from_args(args)
+
     input_folder = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/3 processed output'  # Update this path to where your documents are located
     output_folder = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/4 topic distribution'    # Update this path to where you want to save CSV files
-    documents = load_documents(input_folder)
-    processed_texts = preprocess_texts(documents)
+    processed_texts = load_processed_texts(input_folder)
 
     # Perform LDA and save distributions
-    average_coherence = perform_lda_and_save_distributions(processed_texts, output_folder)
+    coherence_cache_path = os.path.join(input_folder, CACHE_DIRNAME, 'coherence_stats.npz')
+    average_coherence = perform_lda_and_save_distributions(processed_texts, output_folder, coherence_cache_path=coherence_cache_path,
+                                                           total_cores=args.cores, concurrent_folds=args.concurrent_folds,
+                                                           passes=args.passes, tolerance=args.tolerance, max_passes=args.max_passes,
+                                                           warm_start_path=args.warm_start)
 
     # Optionally, you can save the average coherence score and any other summary statistics to a text or CSV file as well.
-    summary_path = os.path.join(output_folder, 'lda_summary.csv')
-    with open(summary_path, 'w', newline='', encoding='utf-8') as summary_file:
-        writer = csv.writer(summary_file)
-        writer.writerow(['Metric', 'Value'])
-        writer.writerow(['Average Coherence Score', average_coherence])
+    save_lda_summary(output_folder, average_coherence)
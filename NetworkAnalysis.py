@@ -1,42 +1,54 @@
-import pandas as pd
+import os
 import networkx as nx
-from itertools import combinations
+import matplotlib
+matplotlib.use('Agg')  # Render to file, no display needed
 import matplotlib.pyplot as plt
-
-# Load the merged topic data
-merged_data_path = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/4 topic distribution/merged_topic_data.csv'
-merged_df = pd.read_csv(merged_data_path)
-
-# Calculate co-occurrence of topics within documents
-co_occurrences = merged_df.groupby('Document ID')['Topic ID'].apply(lambda x: list(combinations(sorted(set(x)), 2))).reset_index(name='Pairs')
-co_occurrences = co_occurrences.explode('Pairs').dropna()
-
-# Count the frequency of each pair
-co_occurrence_counts = co_occurrences['Pairs'].value_counts().reset_index()
-co_occurrence_counts.columns = ['Topic Pair', 'Weight']
-
-# Split the topic pairs for clarity
-co_occurrence_counts[['Topic 1', 'Topic 2']] = pd.DataFrame(co_occurrence_counts['Topic Pair'].tolist(), index=co_occurrence_counts.index)
-co_occurrence_counts.drop('Topic Pair', axis=1, inplace=True)
-
-# Exporting co-occurrence data to CSV
-co_occurrence_csv_path = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/7 network analysis/networkanalysis.csv'
-co_occurrence_counts.to_csv(co_occurrence_csv_path, index=False)
-print(f"Co-occurrence data saved to: {co_occurrence_csv_path}")
-
-# Create the network graph
-G = nx.Graph()
-for _, row in co_occurrence_counts.iterrows():
-    G.add_edge(row['Topic 1'], row['Topic 2'], weight=row['Weight'])
-
-# Draw the graph
-plt.figure(figsize=(10, 10))
-pos = nx.spring_layout(G, seed=42)  # For consistent layout
-edges, weights = zip(*nx.get_edge_attributes(G, 'weight').items())
-
-# Scale edge weights for visibility
-weights = [w * 0.1 for w in weights]  # Adjust scaling factor as needed
-
-nx.draw(G, pos, node_color='skyblue', with_labels=True, edgelist=edges, edge_color=weights, width=1, edge_cmap=plt.cm.Blues)
-plt.title('Network Analysis of Topic Co-Occurrence')
-plt.show()
+from analysis_store import STORE_FILENAME, query_frame, update_store
+from topic_cooccurrence import cooccurrence_edges, cooccurrence_graph, cooccurrence_matrix, document_topic_matrix
+
+def analyse_topic_network(metadata_path, topic_dist_folder, store_path, network_folder_path, min_probability=0.0, weighting='binary'):
+    """
+    A topic occurs in a document when its probability is at least min_probability; with 'binary' weighting
+    each pair of topics in a document counts once, with 'probability' it counts the product of their probabilities.
+    """
+    # Load the merged topic data from the analysis store
+    connection = update_store(store_path, metadata_path, topic_dist_folder)
+    merged_df = query_frame(connection, 'SELECT "Document ID", "Topic ID", "Probability" FROM merged_topic_data')
+    connection.close()
+
+    # Calculate co-occurrence of topics within documents as one sparse product
+    doc_topic, _, topic_ids = document_topic_matrix(merged_df, min_probability, weighting)
+    topic_cooccurrence = cooccurrence_matrix(doc_topic)
+    co_occurrence_counts = cooccurrence_edges(topic_cooccurrence, topic_ids)
+
+    # Exporting co-occurrence data to CSV
+    os.makedirs(network_folder_path, exist_ok=True)
+    co_occurrence_csv_path = os.path.join(network_folder_path, 'networkanalysis.csv')
+    co_occurrence_counts.to_csv(co_occurrence_csv_path, index=False)
+    print(f"Co-occurrence data saved to: {co_occurrence_csv_path}")
+
+    # Create the network graph from the co-occurrence matrix
+    G = cooccurrence_graph(topic_cooccurrence, topic_ids)
+
+    # Draw the graph
+    plt.figure(figsize=(10, 10))
+    pos = nx.spring_layout(G, seed=42)  # For consistent layout
+    edge_weights = nx.get_edge_attributes(G, 'weight')  # Empty when no topics co-occur above min_probability
+    edges, weights = list(edge_weights), list(edge_weights.values())
+
+    # Scale edge weights for visibility
+    weights = [w * 0.1 for w in weights]  # Adjust scaling factor as needed
+
+    nx.draw(G, pos, node_color='skyblue', with_labels=True, edgelist=edges, edge_color=weights, width=1, edge_cmap=plt.cm.Blues)
+    plt.title('Network Analysis of Topic Co-Occurrence')
+    graph_path = os.path.join(network_folder_path, 'topic_cooccurrence_network.png')
+    plt.savefig(graph_path, dpi=150)
+    plt.close()
+    print(f"Network graph saved to: {graph_path}")
+
+if __name__ == '__main__':
+    metadata_path = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/2 text output/metadata_summary.csv'
+    topic_dist_folder = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/4 topic distribution'
+    store_path = os.path.join('/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI', STORE_FILENAME)
+    network_folder_path = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/7 network analysis'
+    analyse_topic_network(metadata_path, topic_dist_folder, store_path, network_folder_path, min_probability=0.0, weighting='binary')
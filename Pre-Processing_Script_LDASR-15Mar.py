@@ -1,72 +1,159 @@
 import os
-import nltk
-from nltk.corpus import words
+import argparse
+from contextlib import nullcontext
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import instrumentation
+from instrumentation import count, traced
 
-# Ensure necessary NLTK data is downloaded
-nltk.download('words', quiet=True)
+# Sorted, newline-separated snapshot of the NLTK English word list, kept in the user's cache directory rather than
+# the source tree. It is built on first use, which needs the NLTK 'words' corpus (downloaded if missing), and
+# rebuilt with --rebuild-vocab, e.g. after updating that corpus.
+VOCAB_CACHE_PATH = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser(os.path.join('~', '.cache')),
+                                'slr-lda', 'english_vocab.txt')
 
-english_vocab = set(words.words())
+def build_vocab_cache(cache_path=VOCAB_CACHE_PATH):
+    """
+    Builds the vocabulary snapshot from the NLTK 'words' corpus, downloading the corpus only if
+    it is not installed, and writes it to cache_path atomically.
+    """
+    import nltk
+    from nltk.corpus import words
+    try:
+        nltk.data.find('corpora/words')
+    except LookupError:
+        # Ensure necessary NLTK data is downloaded
+        nltk.download('words', quiet=True)
+    vocab = sorted(set(words.words()))
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temp_path = cache_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(vocab))
+    os.replace(temp_path, cache_path)
+    return frozenset(vocab)
+
+@lru_cache(maxsize=None)
+def get_english_vocab(cache_path=VOCAB_CACHE_PATH):
+    """
+    Returns the English vocabulary as a frozenset, loaded on first use from the snapshot on disk
+    (no network access, milliseconds to load) and built from NLTK only if the snapshot is missing.
+    """
+    if not os.path.exists(cache_path):
+        return build_vocab_cache(cache_path)
+    with open(cache_path, 'r', encoding='utf-8') as file:
+        return frozenset(file.read().split('\n'))
 
 def is_valid_word(word):
-    return word in english_vocab
+    return word in get_english_vocab()
 
+@traced()
 def merge_artefacts(text):
     """
     Merge adjacent words if their concatenation forms a valid word,
     and remove standalone non-words.
+    Single pass: the word being built is kept aside and only emitted once the next word
+    no longer extends it, instead of deleting merged words from the middle of a list.
     """
-    words = text.split()
-    i = 0
-    while i < len(words) - 1:
-        if is_valid_word(words[i] + words[i + 1]):
-            words[i] = words[i] + words[i + 1]  # Merge the words
-            del words[i + 1]  # Remove the next word as it's merged
+    english_vocab = get_english_vocab()
+    merged_words = []
+    current = None
+    for word in text.split():
+        if current is None:
+            current = word
+        elif current + word in english_vocab:
+            current = current + word  # Merge the words
         else:
-            i += 1
+            if current in english_vocab:  # Remove standalone non-words
+                merged_words.append(current)
+            current = word
+    if current is not None and current in english_vocab:
+        merged_words.append(current)
 
-    # Remove standalone non-words
-    words = [word for word in words if is_valid_word(word)]
+    return ' '.join(merged_words)
 
-    return ' '.join(words)
+@traced()
+def process_file(file_path, output_folder):
+    """
+    Merges the artefacts in one text file, keeping its metadata header, and saves it to the output folder.
+    Returns the output path, or None and the error message if processing failed.
+    """
+    filename = os.path.basename(file_path)
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
+            text = file.read()
+
+        # Separate metadata and content
+        metadata_end_index = text.find('---METADATA END---')
+        if metadata_end_index != -1:
+            metadata = text[:metadata_end_index + len('---METADATA END---')].strip()
+            content = text[metadata_end_index + len('---METADATA END---'):].strip()
+        else:
+            metadata = ""
+            content = text  # Process the entire text if no metadata end marker is found
 
-def process_files(input_folder, output_folder):
+        count('documents')
+        count('bytes', len(content))
+        processed_content = merge_artefacts(content)
+
+        # Reinsert metadata at the beginning of the processed content
+        output_text = metadata + '\n\n' + processed_content if metadata else processed_content
+
+        output_file_path = os.path.join(output_folder, filename)
+        with open(output_file_path, 'w', encoding='utf-8') as file:
+            file.write(output_text)
+
+        return output_file_path, None
+    except Exception as e:
+        return None, str(e)
+
+@traced()
+def process_files(input_folder, output_folder, max_workers=None, executor=None, prune=False):
+    """
+    Processes every .txt file in the input folder across a process pool (default: one worker per CPU),
+    handing files to workers in chunks to keep scheduling overhead low. With prune, output .txt files
+    with no counterpart in the input folder are deleted.
+    An executor can be given to run the files on instead, such as a ThreadPoolExecutor to stay in this process.
+    """
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
-    for filename in os.listdir(input_folder):
-        if not filename.endswith('.txt'):  # Skip non-txt files
-            continue
-        
-        file_path = os.path.join(input_folder, filename)
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-                text = file.read()
-
-            # Separate metadata and content
-            metadata_end_index = text.find('---METADATA END---')
-            if metadata_end_index != -1:
-                metadata = text[:metadata_end_index + len('---METADATA END---')].strip()
-                content = text[metadata_end_index + len('---METADATA END---'):].strip()
-            else:
-                metadata = ""
-                content = text  # Process the entire text if no metadata end marker is found
-            
-            processed_content = merge_artefacts(content)
+    filenames = [filename for filename in os.listdir(input_folder) if filename.endswith('.txt')]  # Skip non-txt files
+    file_paths = [os.path.join(input_folder, filename) for filename in filenames]
+    if prune:
+        # The output folder mirrors the input folder: outputs of texts removed upstream (their PDF was deleted) are removed too
+        for filename in set(filename for filename in os.listdir(output_folder) if filename.endswith('.txt')) - set(filenames):
+            os.remove(os.path.join(output_folder, filename))
+            print(f"Removed: {filename} (no longer in the input folder)")
+    max_workers = max_workers or os.cpu_count() or 1
+    # Load (or build) the vocabulary once up front; forked workers inherit it, spawned ones read the snapshot
+    get_english_vocab()
+    chunksize = max(1, len(file_paths) // (max_workers * 4))
 
-            # Reinsert metadata at the beginning of the processed content
-            output_text = metadata + '\n\n' + processed_content if metadata else processed_content
+    with nullcontext(executor) if executor else ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(process_file, file_paths, [output_folder] * len(file_paths), chunksize=chunksize)
+        for filename, (output_file_path, error) in zip(filenames, results):
+            if error:
+                print(f"Error processing {filename}: {error}")
+            else:
+                print(f"Processed and saved: {output_file_path}")
 
-            output_file_path = os.path.join(output_folder, filename)
-            with open(output_file_path, 'w', encoding='utf-8') as file:
-                file.write(output_text)
+def main():
+    parser = argparse.ArgumentParser(description='Merge split-word artefacts in extracted text files.')
+    parser.add_argument('--input-folder', default='/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/2 text output')
+    parser.add_argument('--output-folder', default='/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/3 processed output')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--prune', action='store_true',
+                        help='Delete output .txt files with no counterpart in the input folder (only if nothing else writes there)')
+    parser.add_argument('--rebuild-vocab', action='store_true', help=f'Rebuild the vocabulary snapshot at {VOCAB_CACHE_PATH} from NLTK')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.start_from_args(args)
 
-            print(f"Processed and saved: {output_file_path}")
-        except Exception as e:
-            print(f"Error processing {filename}: {e}")
+    if args.rebuild_vocab:
+        build_vocab_cache()
+        get_english_vocab.cache_clear()
 
-# Set your input and output folders
-input_folder = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/2 text output'
-output_folder = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/3 processed output'
+    process_files(args.input_folder, args.output_folder, args.workers, prune=args.prune)
 
-process_files(input_folder, output_folder)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+import os
+import re
+import sqlite3
+import numpy as np
+import pandas as pd
+from topic_store import list_fold_files, load_distributions
+from topic_time_cube import TopicTimeCube
+
+STORE_FILENAME = 'analysis_store.sqlite'
+# Bump when the schema or the derived tables change, so existing stores re-ingest their sources
+SCHEMA_VERSION = 2
+# Extractor output files are named '<serial number>-<author>-<year>.txt', and keep that name through pre-processing
+SERIAL_PREFIX_PATTERN = re.compile(r'(\d+)-')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+-- One row per extracted PDF; doc_key is the extractor's serial number
+CREATE TABLE IF NOT EXISTS documents (
+    doc_key INTEGER PRIMARY KEY,
+    author TEXT,
+    year INTEGER,           -- NULL when the extracted year is not a year ('Unknown', '-26-', 'know', ...)
+    year_text TEXT,
+    doi TEXT,
+    pdf_file TEXT,
+    output_file TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_year ON documents (year);
+CREATE INDEX IF NOT EXISTS documents_output_file ON documents (output_file);
+-- One row per document scored in a fold's topic distribution output
+CREATE TABLE IF NOT EXISTS lda_documents (
+    fold INTEGER NOT NULL,
+    document_id INTEGER NOT NULL,
+    filename TEXT,
+    filename_key INTEGER,   -- the serial number the filename starts with
+    doc_key INTEGER,
+    PRIMARY KEY (fold, document_id)
+);
+CREATE TABLE IF NOT EXISTS topic_distributions (
+    fold INTEGER NOT NULL,
+    document_id INTEGER NOT NULL,
+    topic_id INTEGER NOT NULL,
+    probability REAL NOT NULL,
+    doc_key INTEGER,
+    PRIMARY KEY (fold, document_id, topic_id)
+);
+CREATE INDEX IF NOT EXISTS topic_distributions_doc_key ON topic_distributions (doc_key);
+CREATE INDEX IF NOT EXISTS topic_distributions_topic ON topic_distributions (topic_id, doc_key);
+-- Per-fold year x topic aggregates of the dated topic rows (see TopicTimeCube), kept in step with them on ingestion
+CREATE TABLE IF NOT EXISTS topic_year_stats (
+    fold INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    topic_id INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    probability_sum REAL NOT NULL,
+    probability_sum_squares REAL NOT NULL,
+    PRIMARY KEY (fold, year, topic_id)
+);
+CREATE TABLE IF NOT EXISTS year_documents (
+    fold INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    documents INTEGER NOT NULL,
+    PRIMARY KEY (fold, year)
+);
+
+-- The rows of merged_topic_data.csv: document metadata joined with every topic row
+CREATE VIEW IF NOT EXISTS merged_topic_data AS
+SELECT d.doc_key AS "Document ID", d.author AS "Author", d.year_text AS "Year", d.doi AS "DOI",
+       d.pdf_file AS "Original PDF Name", d.output_file AS "Output File",
+       t.fold AS "Fold", l.filename AS "Filename", t.topic_id AS "Topic ID", t.probability AS "Probability"
+FROM topic_distributions t
+JOIN documents d ON d.doc_key = t.doc_key
+LEFT JOIN lda_documents l ON l.fold = t.fold AND l.document_id = t.document_id;
+-- Topic rows of the documents with a known year
+CREATE VIEW IF NOT EXISTS dated_topic_distributions AS
+SELECT d.year AS year, t.doc_key AS doc_key, t.fold AS fold, t.topic_id AS topic_id, t.probability AS probability
+FROM topic_distributions t
+JOIN documents d ON d.doc_key = t.doc_key
+WHERE d.year IS NOT NULL;
+CREATE VIEW IF NOT EXISTS topic_prevalence_by_year AS
+SELECT year AS "Year", topic_id AS "Topic ID", AVG(probability) AS "Probability"
+FROM dated_topic_distributions
+GROUP BY year, topic_id;
+CREATE VIEW IF NOT EXISTS articles_per_year AS
+SELECT year AS "Year", COUNT(DISTINCT doc_key) AS "Articles"
+FROM dated_topic_distributions
+GROUP BY year;
+"""
+
+def open_store(db_path):
+    """
+    Opens (creating if needed) the analysis store, an SQLite database.
+    """
+    connection = sqlite3.connect(db_path)
+    connection.executescript(SCHEMA)
+    if connection.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+        with connection:
+            connection.execute('DELETE FROM sources')
+        connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    return connection
+
+def parse_year(value):
+    """
+    Returns an extracted year as an integer, or None if it is not a four-digit year.
+    """
+    text = str(value).strip()
+    return int(text) if re.fullmatch(r'\d{4}', text) else None
+
+def filename_doc_key(filename):
+    """
+    Returns the serial number an extractor output filename starts with, or None.
+    """
+    match = SERIAL_PREFIX_PATTERN.match(filename or '')
+    return int(match.group(1)) if match else None
+
+def _source_changed(connection, path):
+    """
+    Returns the (size, mtime_ns) signature of a file if it differs from the one recorded, or None.
+    """
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    recorded = connection.execute('SELECT size, mtime_ns FROM sources WHERE path = ?', (path,)).fetchone()
+    return None if recorded == signature else signature
+
+def _record_source(connection, path, signature):
+    connection.execute('INSERT OR REPLACE INTO sources (path, size, mtime_ns) VALUES (?, ?, ?)', (path, *signature))
+
+def _resolve_doc_keys(connection, fold=None):
+    """
+    Sets the doc_key of scored documents: the serial number whose extractor output file has the
+    document's filename, else the serial number the filename starts with. Outputs written without
+    filenames fall back to their Document ID, as the CSV merges did.
+    """
+    condition, params = ('WHERE fold = ?', (fold,)) if fold is not None else ('', ())
+    connection.execute(f"""
+        UPDATE lda_documents SET doc_key = COALESCE(
+            (SELECT doc_key FROM documents WHERE output_file = lda_documents.filename),
+            filename_key,
+            CASE WHEN filename IS NULL THEN document_id END)
+        {condition}""", params)
+    connection.execute(f"""
+        UPDATE topic_distributions SET doc_key = (
+            SELECT doc_key FROM lda_documents
+            WHERE lda_documents.fold = topic_distributions.fold AND lda_documents.document_id = topic_distributions.document_id)
+        {condition}""", params)
+
+def _refresh_topic_year_stats(connection, fold=None):
+    """
+    Recomputes the year x topic aggregates of one fold (or of every fold) from its dated topic rows.
+    """
+    folds = [fold] if fold is not None else [row[0] for row in connection.execute('SELECT DISTINCT fold FROM topic_distributions')]
+    for fold in folds:
+        connection.execute('DELETE FROM topic_year_stats WHERE fold = ?', (fold,))
+        connection.execute('DELETE FROM year_documents WHERE fold = ?', (fold,))
+        rows = query_frame(connection, 'SELECT year, doc_key, topic_id, probability FROM dated_topic_distributions WHERE fold = ?', (fold,))
+        cube = TopicTimeCube.from_rows(rows['year'], rows['doc_key'], rows['topic_id'], rows['probability'])
+        stats, year_documents = cube.stats_frames()
+        connection.executemany('INSERT INTO topic_year_stats VALUES (?, ?, ?, ?, ?, ?)',
+                               zip([fold] * len(stats), *(stats[column].tolist() for column in stats.columns)))
+        connection.executemany('INSERT INTO year_documents VALUES (?, ?, ?)',
+                               zip([fold] * len(year_documents), year_documents['Year'].tolist(), year_documents['Documents'].tolist()))
+
+def ingest_metadata(connection, metadata_path):
+    """
+    Loads metadata_summary.csv into the documents table if it changed since it was last ingested.
+    Returns whether it was (re)loaded.
+    """
+    signature = _source_changed(connection, metadata_path)
+    if signature is None:
+        return False
+    metadata_df = pd.read_csv(metadata_path, dtype=str, keep_default_na=False)
+
+    def column(name):
+        return metadata_df[name] if name in metadata_df else pd.Series([None] * len(metadata_df))
+
+    pdf_files = column('Original PDF Name') if 'Original PDF Name' in metadata_df else column('PDF File')
+    rows = zip(metadata_df['Serial Number'].astype(int).tolist(), column('Author'), column('Year').map(parse_year), column('Year'),
+               column('DOI'), pdf_files, column('Output File'))
+    with connection:
+        connection.execute('DELETE FROM documents')
+        connection.executemany('INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        _resolve_doc_keys(connection)
+        _refresh_topic_year_stats(connection)
+        _record_source(connection, metadata_path, signature)
+    return True
+
+def ingest_topic_distributions(connection, folder_path):
+    """
+    Loads every fold's topic distribution output that is new or changed since it was last ingested
+    (the .npz store where there is one), and drops the folds whose outputs are gone.
+    Returns the folds that were (re)loaded.
+    """
+    loaded = []
+    folds = list_fold_files(folder_path)
+    fold_numbers = {fold for fold, _ in folds}
+    with connection:
+        for (fold,) in connection.execute('SELECT DISTINCT fold FROM lda_documents').fetchall():
+            if fold not in fold_numbers:
+                for table in ('lda_documents', 'topic_distributions', 'topic_year_stats', 'year_documents'):
+                    connection.execute(f'DELETE FROM {table} WHERE fold = ?', (fold,))
+
+    for fold, base_path in folds:
+        path = base_path + '.npz' if os.path.exists(base_path + '.npz') else base_path + '.csv'
+        signature = _source_changed(connection, path)
+        if signature is None:
+            continue
+        data = load_distributions(path)
+        distributions = data['distributions']
+        minimum_probability = max(data['minimum_probability'], 1e-8)
+        doc_index, topic_ids = np.nonzero(distributions >= minimum_probability)
+        document_ids = data['document_ids'].astype(np.int64)
+        filenames = data['filenames'] if data['filenames'] is not None else [None] * len(document_ids)
+        filename_keys = [filename_doc_key(filename) for filename in filenames]
+        with connection:
+            connection.execute('DELETE FROM lda_documents WHERE fold = ?', (fold,))
+            connection.execute('DELETE FROM topic_distributions WHERE fold = ?', (fold,))
+            connection.executemany('INSERT INTO lda_documents (fold, document_id, filename, filename_key) VALUES (?, ?, ?, ?)',
+                                   zip([fold] * len(document_ids), document_ids.tolist(), filenames, filename_keys))
+            connection.executemany('INSERT INTO topic_distributions (fold, document_id, topic_id, probability) VALUES (?, ?, ?, ?)',
+                                   zip([fold] * len(doc_index), document_ids[doc_index].tolist(), topic_ids.tolist(),
+                                       distributions[doc_index, topic_ids].astype(np.float64).tolist()))
+            _resolve_doc_keys(connection, fold)
+            _refresh_topic_year_stats(connection, fold)
+            _record_source(connection, path, signature)
+        loaded.append(fold)
+    return loaded
+
+def update_store(db_path, metadata_path, topic_dist_folder):
+    """
+    Opens the analysis store and brings it up to date with the extractor's metadata summary and the
+    fold topic distribution outputs, re-reading only what changed. Returns the open connection.
+    """
+    connection = open_store(db_path)
+    ingest_metadata(connection, metadata_path)
+    ingest_topic_distributions(connection, topic_dist_folder)
+    return connection
+
+def query_frame(connection, sql, params=()):
+    """
+    Runs a query against the store and returns the result as a DataFrame.
+    """
+    return pd.read_sql_query(sql, connection, params=params)
+
+def load_topic_time_cube(connection):
+    """
+    Returns the TopicTimeCube of every fold's dated topic rows, summed from the stored per-fold aggregates.
+    """
+    stats = query_frame(connection, """
+        SELECT year AS "Year", topic_id AS "Topic ID", SUM(rows) AS "Rows",
+               SUM(probability_sum) AS "Sum", SUM(probability_sum_squares) AS "Sum Squares"
+        FROM topic_year_stats GROUP BY year, topic_id""")
+    year_documents = query_frame(connection, 'SELECT year AS "Year", SUM(documents) AS "Documents" FROM year_documents GROUP BY year')
+    return TopicTimeCube.from_stats(stats, year_documents)
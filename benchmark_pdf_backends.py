@@ -0,0 +1,107 @@
+import os
+import csv
+import time
+import argparse
+import multiprocessing
+from collections import Counter
+
+from pdf_backends import DEFAULT_BACKEND, available_backends, open_pdf
+from supervised_pool import peak_rss_bytes
+from synthetic_corpus import generate_pdf_corpus
+
+FIELDNAMES = ['Backend', 'Documents', 'Pages', 'MB', 'Seconds', 'Pages/sec', 'MB/sec', 'Peak RSS MB', 'Text Equivalence', 'Errors']
+
+def token_counts(text):
+    return Counter(text.lower().split())
+
+def run_backend(backend, pdf_paths, result_queue):
+    """
+    Extracts every PDF with one backend in a fresh process, so peak RSS is measured per backend.
+    Puts the timings, peak RSS and per-document token counts on the result queue.
+    """
+    pages = 0
+    errors = 0
+    documents = []
+    started = time.perf_counter()
+    for pdf_path in pdf_paths:
+        try:
+            with open_pdf(pdf_path, backend) as document:
+                pages += len(document)
+                text = ''.join([document.page_text(index) for index in range(len(document))])
+        except Exception:
+            errors += 1
+            text = ''
+        documents.append(token_counts(text))
+    seconds = time.perf_counter() - started
+    result_queue.put({'pages': pages, 'errors': errors, 'seconds': seconds, 'peak_rss': peak_rss_bytes(), 'documents': documents})
+
+def text_equivalence(documents, reference_documents):
+    """
+    Mean token overlap (Dice coefficient over token multisets) between each document's text
+    and the reference backend's text. 1.0 means the same words in the same quantities.
+    """
+    scores = []
+    for counts, reference in zip(documents, reference_documents):
+        total = sum(counts.values()) + sum(reference.values())
+        scores.append(1.0 if total == 0 else 2 * sum((counts & reference).values()) / total)
+    return sum(scores) / len(scores) if scores else 1.0
+
+def benchmark_backends(pdf_paths, backends, reference_backend=DEFAULT_BACKEND):
+    """
+    Benchmarks each backend over the PDFs and returns one row per backend with pages/sec, MB/sec,
+    peak RSS and text equivalence against the reference backend.
+    """
+    context = multiprocessing.get_context('spawn')
+    total_bytes = sum(os.path.getsize(pdf_path) for pdf_path in pdf_paths)
+    results = {}
+    for backend in backends:
+        result_queue = context.Queue()
+        process = context.Process(target=run_backend, args=(backend, pdf_paths, result_queue))
+        process.start()
+        results[backend] = result_queue.get()
+        process.join()
+
+    reference = results.get(reference_backend, next(iter(results.values())))
+    rows = []
+    for backend, result in results.items():
+        seconds = max(result['seconds'], 1e-9)
+        rows.append({
+            'Backend': backend,
+            'Documents': len(pdf_paths),
+            'Pages': result['pages'],
+            'MB': round(total_bytes / 1e6, 2),
+            'Seconds': round(result['seconds'], 3),
+            'Pages/sec': round(result['pages'] / seconds, 1),
+            'MB/sec': round(total_bytes / 1e6 / seconds, 2),
+            'Peak RSS MB': round(result['peak_rss'] / 1e6, 1),
+            'Text Equivalence': round(text_equivalence(result['documents'], reference['documents']), 4),
+            'Errors': result['errors']
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the PDF text extraction backends on a synthetic corpus.')
+    parser.add_argument('--corpus-directory', default='benchmark_pdf_corpus')
+    parser.add_argument('--documents', type=int, default=50)
+    parser.add_argument('--min-pages', type=int, default=1)
+    parser.add_argument('--max-pages', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--backends', nargs='+', default=available_backends(), choices=available_backends())
+    parser.add_argument('--output', default=None, help='Optional CSV file for the results')
+    args = parser.parse_args()
+
+    pdf_paths = generate_pdf_corpus(args.corpus_directory, args.documents, args.min_pages, args.max_pages, args.seed)
+    rows = benchmark_backends(pdf_paths, args.backends)
+
+    print(' | '.join(FIELDNAMES))
+    for row in sorted(rows, key=lambda row: row['Pages/sec'], reverse=True):
+        print(' | '.join(str(row[field]) for field in FIELDNAMES))
+
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+import os
+import sys
+import json
+import time
+import shutil
+import statistics
+import platform
+import argparse
+import tempfile
+import multiprocessing
+from datetime import datetime, timezone
+
+from supervised_pool import get_rss_bytes, peak_rss_bytes
+from synthetic_corpus import generate_pdf_corpus, generate_text_corpus, generate_topic_distributions, topic_vocabularies
+
+FIELDNAMES = ['Stage', 'Items', 'Unit', 'Seconds', 'Items/sec', 'MB/sec', 'Setup RSS MB', 'Peak RSS MB']
+CODE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# Each stage is a pair of functions run in a fresh process: prepare(corpus, options) loads the stage's inputs
+# untimed and returns them; run(corpus, inputs, options) does the timed work and returns the items processed,
+# their unit, and optionally the bytes read.
+
+def prepare_extract(corpus, options):
+    from pdf_text_extractor_with_metadata import list_pdf_files
+    pdf_files = list_pdf_files(corpus['pdf'])
+    # A fresh output directory, so no PDF is skipped as already extracted
+    output_directory = tempfile.mkdtemp(prefix='extract-', dir=corpus['root'])
+    return {'output_directory': output_directory, 'documents': len(pdf_files),
+            'bytes': sum(os.path.getsize(os.path.join(corpus['pdf'], pdf_file)) for pdf_file in pdf_files)}
+
+def run_extract(corpus, inputs, options):
+    from pdf_text_extractor_with_metadata import process_pdfs_in_parallel
+    output_directory = inputs['output_directory']
+    try:
+        errors = process_pdfs_in_parallel(corpus['pdf'], output_directory, os.path.join(output_directory, 'metadata_summary.csv'),
+                                          os.path.join(output_directory, 'error_log.csv'), max_workers=options['workers'])
+    finally:
+        shutil.rmtree(output_directory, ignore_errors=True)
+    return {'Items': inputs['documents'], 'Unit': 'PDFs', 'Bytes': inputs['bytes'], 'Errors': len(errors)}
+
+def load_preprocessing_module():
+    import importlib.util
+    spec = importlib.util.spec_from_file_location('preprocessing', os.path.join(CODE_DIRECTORY, 'Pre-Processing_Script_LDASR-15Mar.py'))
+    preprocessing = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(preprocessing)
+    return preprocessing
+
+def prepare_merge_artefacts(corpus, options):
+    from LDA_Script5 import load_documents
+    preprocessing = load_preprocessing_module()
+    preprocessing.get_english_vocab()  # Load the vocabulary snapshot before timing
+    return {'merge_artefacts': preprocessing.merge_artefacts, 'documents': load_documents(corpus['text'])}
+
+def run_merge_artefacts(corpus, inputs, options):
+    merged = [inputs['merge_artefacts'](text) for _, text in inputs['documents']]
+    return {'Items': len(merged), 'Unit': 'documents', 'Bytes': sum(len(text.encode('utf-8')) for _, text in inputs['documents'])}
+
+def prepare_preprocess_texts(corpus, options):
+    from LDA_Script5 import load_documents
+    from token_cache import get_stop_words
+    get_stop_words()
+    return {'documents': load_documents(corpus['text'])}
+
+def run_preprocess_texts(corpus, inputs, options):
+    from LDA_Script5 import preprocess_texts
+    processed_texts = preprocess_texts(inputs['documents'])
+    return {'Items': len(processed_texts), 'Unit': 'documents', 'Bytes': sum(len(text.encode('utf-8')) for _, text in inputs['documents']),
+            'Tokens': sum(len(tokens) for _, tokens in processed_texts)}
+
+def prepare_processed_texts(corpus, options):
+    from LDA_Script5 import load_documents, preprocess_texts
+    return {'texts': [tokens for _, tokens in preprocess_texts(load_documents(corpus['text']))]}
+
+def prepare_lda_training(corpus, options):
+    import gensim.corpora as corpora
+    texts = prepare_processed_texts(corpus, options)['texts']
+    dictionary = corpora.Dictionary(texts)
+    return {'dictionary': dictionary, 'corpus': [dictionary.doc2bow(text) for text in texts], 'tokens': sum(len(text) for text in texts)}
+
+def run_lda_training(corpus, inputs, options):
+    import gensim
+    from lda_training import train_lda
+    train_lda(gensim.models.LdaMulticore, corpus=inputs['corpus'], id2word=inputs['dictionary'], num_topics=options['num_topics'],
+              passes=options['passes'], workers=options['workers'], random_state=100, chunksize=100, per_word_topics=True)
+    return {'Items': len(inputs['corpus']), 'Unit': 'documents', 'Tokens': inputs['tokens'], 'Passes': options['passes']}
+
+def prepare_coherence(corpus, options):
+    # The synthetic topics' own word lists stand in for a model's top words
+    inputs = prepare_processed_texts(corpus, options)
+    inputs['topics'] = topic_vocabularies(options['num_topics'], options['seed'])
+    return inputs
+
+def run_coherence(corpus, inputs, options):
+    from coherence_cache import CoherenceStatsCache
+    CoherenceStatsCache(inputs['texts']).coherence_cv(inputs['topics'])
+    return {'Items': len(inputs['texts']), 'Unit': 'documents', 'Tokens': sum(len(text) for text in inputs['texts'])}
+
+def prepare_topic_distributions(corpus, options):
+    from DocSimHeatmap import load_topic_distributions
+    from analysis_store import filename_doc_key
+    frame = load_topic_distributions(corpus['topic_distribution'])
+    # Documents are identified across folds by the serial number their filename starts with, as in the analysis store
+    frame['Document ID'] = frame['Filename'].map(filename_doc_key)
+    return {'frame': frame}
+
+def run_cosine_similarity(corpus, inputs, options):
+    from DocSimHeatmap import compute_cosine_similarity_matrix
+    matrix = compute_cosine_similarity_matrix(inputs['frame'])
+    return {'Items': len(matrix), 'Unit': 'documents'}
+
+def run_cooccurrence(corpus, inputs, options):
+    from topic_cooccurrence import cooccurrence_edges, cooccurrence_matrix, document_topic_matrix
+    doc_topic, document_ids, topic_ids = document_topic_matrix(inputs['frame'])
+    cooccurrence_edges(cooccurrence_matrix(doc_topic), topic_ids)
+    return {'Items': len(document_ids), 'Unit': 'documents'}
+
+STAGES = {
+    'extract': (prepare_extract, run_extract),
+    'merge_artefacts': (prepare_merge_artefacts, run_merge_artefacts),
+    'preprocess_texts': (prepare_preprocess_texts, run_preprocess_texts),
+    'lda_training': (prepare_lda_training, run_lda_training),
+    'coherence': (prepare_coherence, run_coherence),
+    'cosine_similarity': (prepare_topic_distributions, run_cosine_similarity),
+    'cooccurrence': (prepare_topic_distributions, run_cooccurrence),
+}
+
+def run_stage(stage, corpus, options, result_queue):
+    """
+    Runs one stage in a fresh process, so its peak RSS is its own. Puts the stage's counts, its timed
+    seconds, the RSS after preparing its inputs and the process's peak RSS on the result queue.
+    Only this process is measured; the extractor's and LDA's worker processes are not.
+    """
+    prepare, run = STAGES[stage]
+    try:
+        inputs = prepare(corpus, options)
+        setup_rss = get_rss_bytes(os.getpid())
+        started = time.perf_counter()
+        result = run(corpus, inputs, options)
+        result['Seconds'] = time.perf_counter() - started
+        result['Setup RSS'] = setup_rss
+        result['Peak RSS'] = peak_rss_bytes()
+    except Exception as error:
+        result = {'Error': repr(error)}
+    result_queue.put(result)
+
+def generate_corpus(corpus_directory, options):
+    """
+    Generates (or regenerates, identically) the synthetic inputs of every stage under corpus_directory.
+    """
+    corpus = {'root': corpus_directory,
+              'pdf': os.path.join(corpus_directory, 'pdf'),
+              'text': os.path.join(corpus_directory, 'text'),
+              'topic_distribution': os.path.join(corpus_directory, 'topic distribution')}
+    for folder in ('pdf', 'text', 'topic_distribution'):
+        shutil.rmtree(corpus[folder], ignore_errors=True)
+    generate_pdf_corpus(corpus['pdf'], options['pdf_documents'], 1, options['max_pages'], options['seed'])
+    generate_text_corpus(corpus['text'], options['text_documents'], options['min_words'], options['max_words'],
+                         options['num_topics'], seed=options['seed'])
+    generate_topic_distributions(corpus['topic_distribution'], options['distribution_documents'], options['num_topics'],
+                                 options['num_folds'], seed=options['seed'])
+    return corpus
+
+def benchmark_stages(corpus, stages, options, repeats=3):
+    """
+    Runs each stage repeats times, each in a fresh spawned process, and returns one result per stage
+    with the median of its runs' seconds, the throughput at that median (items and, where the stage reads
+    known bytes, MB per second) and its largest peak RSS.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for stage in stages:
+        runs = []
+        for _ in range(repeats):
+            result_queue = context.Queue()
+            process = context.Process(target=run_stage, args=(stage, corpus, options, result_queue))
+            process.start()
+            runs.append(result_queue.get())
+            process.join()
+        failed = [run for run in runs if 'Error' in run]
+        if failed:
+            results[stage] = {'Stage': stage, 'Error': failed[0]['Error']}
+            print(f"{stage}: failed with {failed[0]['Error']}")
+            continue
+        # The median damps a single slow or fast run; every stage processes the same items in each run
+        first = runs[0]
+        median_seconds = statistics.median(run['Seconds'] for run in runs)
+        seconds = max(median_seconds, 1e-9)
+        result = {key: value for key, value in first.items() if key not in ('Seconds', 'Setup RSS', 'Peak RSS')}
+        result.update({
+            'Stage': stage,
+            'Seconds': round(median_seconds, 4),
+            'Run Seconds': [round(run['Seconds'], 4) for run in runs],
+            'Items/sec': round(first['Items'] / seconds, 2),
+            'MB/sec': round(first['Bytes'] / 1e6 / seconds, 3) if 'Bytes' in first else None,
+            'Tokens/sec': round(first['Tokens'] / seconds, 1) if 'Tokens' in first else None,
+            'Setup RSS MB': round((first['Setup RSS'] or 0) / 1e6, 1),
+            'Peak RSS MB': round(max(run['Peak RSS'] for run in runs) / 1e6, 1),
+        })
+        results[stage] = result
+    return results
+
+def compare_results(results, baseline, tolerance=0.2, min_seconds=0.5):
+    """
+    Compares each stage's seconds and peak RSS with a baseline run's and returns one row per stage
+    present in both, with the ratios and whether either grew by more than the tolerance (a fraction).
+    Stages taking under min_seconds in both runs are too short for their time ratio to mean anything,
+    so only their memory is tested.
+    """
+    rows = []
+    for stage, result in results.items():
+        previous = baseline['Stages'].get(stage)
+        if not previous or 'Error' in result or 'Error' in previous:
+            continue
+        time_ratio = result['Seconds'] / max(previous['Seconds'], 1e-9)
+        memory_ratio = result['Peak RSS MB'] / max(previous['Peak RSS MB'], 1e-9)
+        time_tested = max(result['Seconds'], previous['Seconds']) >= min_seconds
+        rows.append({'Stage': stage, 'Time Ratio': round(time_ratio, 3), 'Peak RSS Ratio': round(memory_ratio, 3),
+                     'Time Tested': time_tested,
+                     'Regression': (time_tested and time_ratio > 1 + tolerance) or memory_ratio > 1 + tolerance})
+    return rows
+
+def environment():
+    return {'Python': platform.python_version(), 'Platform': platform.platform(), 'CPUs': os.cpu_count()}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark each pipeline stage on a deterministic synthetic corpus.')
+    parser.add_argument('--corpus-directory', default='benchmark_corpus')
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=list(STAGES))
+    parser.add_argument('--pdf-documents', type=int, default=50)
+    parser.add_argument('--max-pages', type=int, default=30)
+    parser.add_argument('--text-documents', type=int, default=200)
+    parser.add_argument('--min-words', type=int, default=500)
+    parser.add_argument('--max-words', type=int, default=5000)
+    parser.add_argument('--distribution-documents', type=int, default=5000)
+    parser.add_argument('--num-topics', type=int, default=10)
+    parser.add_argument('--num-folds', type=int, default=5)
+    parser.add_argument('--passes', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None, help='Extraction and LDA workers (default: CPU count, and one less for LDA)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per stage; the median is reported')
+    parser.add_argument('--output', default=None, help='JSON file for the results')
+    parser.add_argument('--baseline', default=None, help='Earlier results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Slowdown or memory growth over the baseline counted as a regression')
+    parser.add_argument('--min-seconds', type=float, default=0.5, help='Stages faster than this in both runs are not tested for slowdowns')
+    args = parser.parse_args()
+
+    options = {'pdf_documents': args.pdf_documents, 'max_pages': args.max_pages, 'text_documents': args.text_documents,
+               'min_words': args.min_words, 'max_words': args.max_words, 'distribution_documents': args.distribution_documents,
+               'num_topics': args.num_topics, 'num_folds': args.num_folds, 'passes': args.passes, 'workers': args.workers,
+               'seed': args.seed}
+    corpus = generate_corpus(os.path.abspath(args.corpus_directory), options)
+    results = benchmark_stages(corpus, args.stages, options, args.repeats)
+
+    print(' | '.join(FIELDNAMES))
+    for result in results.values():
+        if 'Error' not in result:
+            print(' | '.join(str(result[field]) for field in FIELDNAMES))
+
+    report = {'Created': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'Environment': environment(),
+              'Options': options, 'Repeats': args.repeats, 'Stages': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f"Results saved to: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        if baseline['Options'] != options:
+            print('Warning: the baseline was run with different options, so its timings are not comparable')
+        rows = compare_results(results, baseline, args.tolerance, args.min_seconds)
+        print('Stage | Time Ratio | Peak RSS Ratio | Regression')
+        for row in rows:
+            time_ratio = row['Time Ratio'] if row['Time Tested'] else f"{row['Time Ratio']} (under {args.min_seconds}s, not tested)"
+            print(f"{row['Stage']} | {time_ratio} | {row['Peak RSS Ratio']} | {'REGRESSION' if row['Regression'] else 'ok'}")
+        if any(row['Regression'] for row in rows):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+import os
+import hashlib
+import numpy as np
+from gensim import matutils
+from instrumentation import traced
+
+# gensim's default sliding window for c_v, and the epsilon of its direct confirmation measure
+WINDOW_SIZE = 110
+EPSILON = 1e-12
+
+def encode_texts(texts):
+    """
+    Encodes tokenized texts as (vocab, tokens, offsets): int32 token ids in one flat array, with each
+    document's start offset into it, as the token cache stores them.
+    """
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts)), out=offsets[1:])
+    tokens = np.empty(offsets[-1], dtype=np.int32)
+    word_ids = {}
+    for index, text in enumerate(texts):
+        tokens[offsets[index]:offsets[index + 1]] = [word_ids.setdefault(word, len(word_ids)) for word in text]
+    return list(word_ids), tokens, offsets
+
+def document_fingerprints(vocab, tokens, offsets):
+    """
+    Hashes every document's words, so persisted statistics can be matched to documents by content.
+    Returns a documents x 32 array of SHA-256 digests.
+    """
+    vocab = np.array(vocab, dtype=object)
+    digests = [hashlib.sha256('\n'.join(vocab[tokens[offsets[index]:offsets[index + 1]]]).encode('utf-8')).digest()
+               for index in range(len(offsets) - 1)]
+    return np.frombuffer(b''.join(digests), dtype=np.uint8).reshape(-1, 32)
+
+def topic_top_words(model, topn=20):
+    """
+    Returns the top words of every topic of a gensim topic model, selected exactly as
+    CoherenceModel(model=...) selects them.
+    """
+    return [[model.id2word[word_id] for word_id in matutils.argsort(topic, topn=topn, reverse=True)]
+            for topic in model.get_topics()]
+
+class CoherenceStatsCache:
+    """
+    Sliding-window occurrence and co-occurrence statistics over a reference corpus, for computing
+    c_v coherence without re-scanning the texts for every model.
+
+    Statistics are kept per document, so any subset of the corpus (such as a held-out fold) can be
+    used as the reference texts, and are computed lazily: a query only scans the documents containing
+    word pairs it has not seen before. Scores match gensim's CoherenceModel(coherence='c_v').
+    """
+
+    def __init__(self, texts, window_size=WINDOW_SIZE, cache_path=None):
+        """
+        texts is a list of token lists, or a TokenizedCorpus from the token cache, whose memory-mapped
+        arrays are then used as they are.
+        """
+        if hasattr(texts, 'offsets'):
+            self._vocab, self._tokens, self._offsets = texts.vocab, texts.tokens, np.asarray(texts.offsets, dtype=np.int64)
+        else:
+            self._vocab, self._tokens, self._offsets = encode_texts(texts)
+        self._word_ids = {word: index for index, word in enumerate(self._vocab)}
+        self.window_size = window_size
+        self.cache_path = cache_path
+        self.num_documents = len(self._offsets) - 1
+        self._doc_lengths = np.diff(self._offsets)
+        self._fingerprints = document_fingerprints(self._vocab, self._tokens, self._offsets)
+        # Windows per document; gensim treats a document shorter than the window, even an empty one, as one window
+        self._doc_windows = np.maximum(1, self._doc_lengths - window_size + 1)
+        self._postings = None
+        # word -> (document indices, windows containing the word in each)
+        self._word_stats = {}
+        # (word1, word2) with word1 < word2 -> (document indices, windows containing both in each)
+        self._pair_stats = {}
+        if cache_path and os.path.exists(cache_path):
+            self.load()
+
+    def _get_postings(self):
+        """
+        Builds (once) the positions of every word in the corpus as one array of token positions grouped
+        by word id (a stable argsort of the token ids) and each word's start in it, so the postings take
+        a few bytes per token rather than a Python object per occurrence.
+        """
+        if self._postings is None:
+            order = np.argsort(self._tokens, kind='stable')
+            order = order.astype(np.int32 if len(order) < 2 ** 31 else np.int64)
+            starts = np.zeros(len(self._vocab) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self._tokens, minlength=len(self._vocab)), out=starts[1:])
+            self._postings = (order, starts)
+        return self._postings
+
+    def _word_occurrences(self, word, doc_mask=None):
+        """
+        Yields (document index, positions within it) for every document containing the word,
+        restricted to the documents in doc_mask if given.
+        """
+        word_id = self._word_ids.get(word)
+        if word_id is None:
+            return
+        order, starts = self._get_postings()
+        positions = order[starts[word_id]:starts[word_id + 1]]
+        docs = np.searchsorted(self._offsets, positions, side='right') - 1
+        if doc_mask is not None:
+            keep = doc_mask[docs]
+            positions, docs = positions[keep], docs[keep]
+        if not len(docs):
+            return
+        boundaries = np.flatnonzero(np.diff(docs)) + 1
+        for doc_index, doc_positions in zip(docs[np.r_[0, boundaries]].tolist(), np.split(positions - self._offsets[docs], boundaries)):
+            yield doc_index, doc_positions
+
+    def _window_membership(self, positions, num_windows, text_length):
+        """
+        Returns a boolean array marking the windows of one document that count as containing a word.
+        gensim slides the window by removing the token leaving it and adding the one entering it, so a
+        word is dropped when one of its occurrences leaves even if another remains inside; that
+        behaviour is reproduced here so the counts, and the scores, are identical.
+        """
+        positions = np.asarray(positions)
+        window_size = self.window_size
+        if text_length <= window_size:
+            return np.ones(1, dtype=bool)
+        events = np.zeros(num_windows, dtype=np.int8)
+        events[0] = 1 if positions[0] < window_size else -1
+        removed = positions[positions + 1 < num_windows] + 1
+        events[removed] = -1
+        added = positions[positions >= window_size] - window_size + 1
+        events[added] = 1  # Within a step gensim removes before it adds
+        last_event = np.maximum.accumulate(np.where(events != 0, np.arange(num_windows), 0))
+        return events[last_event] > 0
+
+    def _accumulate(self, words, pairs, doc_mask=None):
+        """
+        Scans the documents containing the given words once, recording the missing word and pair statistics.
+        With a doc_mask only those documents are scanned, and their statistics are added to the existing ones.
+        """
+        doc_words = {}
+        for word in words:
+            for doc_index, positions in self._word_occurrences(word, doc_mask):
+                doc_words.setdefault(doc_index, []).append((word, positions))
+
+        word_counts = {word: ([], []) for word in words}
+        pair_counts = {pair: ([], []) for pair in pairs}
+        for doc_index, present in doc_words.items():
+            num_windows = self._doc_windows[doc_index]
+            text_length = self._doc_lengths[doc_index]
+            membership = np.array([self._window_membership(positions, num_windows, text_length) for _, positions in present],
+                                  dtype=np.float64)
+            counts = membership @ membership.T
+            local = {word: index for index, (word, _) in enumerate(present)}
+            for word, index in local.items():
+                word_counts[word][0].append(doc_index)
+                word_counts[word][1].append(counts[index, index])
+            for first, second in pairs:
+                if first in local and second in local:
+                    count = counts[local[first], local[second]]
+                    if count:
+                        pair_counts[(first, second)][0].append(doc_index)
+                        pair_counts[(first, second)][1].append(count)
+
+        for stats, new_counts in ((self._word_stats, word_counts), (self._pair_stats, pair_counts)):
+            for key, (docs, counts) in new_counts.items():
+                docs, counts = np.array(docs, dtype=np.int32), np.array(counts, dtype=np.int64)
+                if doc_mask is not None and key in stats:
+                    docs, counts = np.concatenate([stats[key][0], docs]), np.concatenate([stats[key][1], counts])
+                stats[key] = (docs, counts)
+
+    def _ensure_stats(self, topics):
+        missing_pairs = set()
+        for words in topics:
+            for i, first in enumerate(words):
+                for second in words[i + 1:]:
+                    pair = (first, second) if first < second else (second, first)
+                    if pair not in self._pair_stats:
+                        missing_pairs.add(pair)
+        missing_words = {word for words in topics for word in words if word not in self._word_stats}
+        missing_words.update(word for pair in missing_pairs for word in pair)
+        if missing_words:
+            self._accumulate(sorted(missing_words), sorted(missing_pairs))
+
+    @staticmethod
+    def _masked_sum(stats, doc_mask):
+        docs, counts = stats
+        return counts.sum() if doc_mask is None else counts[doc_mask[docs]].sum()
+
+    @traced('coherence_cv')
+    def coherence_cv(self, topics, documents=None, per_topic=False):
+        """
+        Computes c_v coherence for topics given as lists of top words, using the documents with the
+        given indices as reference texts (all documents by default). Returns the mean over topics,
+        or the list of per-topic coherences if per_topic is set.
+        """
+        self._ensure_stats(topics)
+        doc_mask = None
+        if documents is not None:
+            doc_mask = np.zeros(self.num_documents, dtype=bool)
+            doc_mask[np.asarray(list(documents), dtype=np.int64)] = True
+
+        num_docs = float(self._doc_windows.sum() if doc_mask is None else self._doc_windows[doc_mask].sum())
+
+        topic_coherences = []
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for words in topics:
+                size = len(words)
+                co_counts = np.zeros((size, size), dtype=np.float64)
+                for i, first in enumerate(words):
+                    co_counts[i, i] = self._masked_sum(self._word_stats[first], doc_mask)
+                    for j in range(i + 1, size):
+                        second = words[j]
+                        pair = (first, second) if first < second else (second, first)
+                        co_counts[i, j] = co_counts[j, i] = self._masked_sum(self._pair_stats[pair], doc_mask)
+                # Normalized log ratio (NPMI) between every pair of topic words, including each word with itself
+                probabilities = np.diag(co_counts) / num_docs
+                co_probabilities = co_counts / num_docs
+                log_ratio = np.log((co_probabilities + EPSILON) / np.outer(probabilities, probabilities))
+                npmi = log_ratio / -np.log(co_probabilities + EPSILON)
+                # Indirect cosine measure: each word's context vector against the whole topic's
+                topic_vector = npmi.sum(axis=0)
+                segment_sims = (npmi @ topic_vector) / (np.sqrt((npmi ** 2).sum(axis=1)) * np.sqrt((topic_vector ** 2).sum()))
+                topic_coherences.append(float(np.mean(segment_sims)))
+
+        if per_topic:
+            return topic_coherences
+        return float(np.mean(topic_coherences))
+
+    def save(self, cache_path=None):
+        """
+        Persists the accumulated statistics as a compressed .npz file.
+        """
+        cache_path = cache_path or self.cache_path
+        words = sorted(self._word_stats)
+        pairs = sorted(self._pair_stats)
+        word_ids = {word: index for index, word in enumerate(words)}
+
+        def flatten(stats):
+            offsets = np.zeros(len(stats) + 1, dtype=np.int64)
+            np.cumsum([len(docs) for docs, _ in stats], out=offsets[1:])
+            docs = np.concatenate([docs for docs, _ in stats]) if stats else np.zeros(0, dtype=np.int32)
+            counts = np.concatenate([counts for _, counts in stats]) if stats else np.zeros(0, dtype=np.int64)
+            return offsets, docs, counts
+
+        word_offsets, word_docs, word_counts = flatten([self._word_stats[word] for word in words])
+        pair_offsets, pair_docs, pair_counts = flatten([self._pair_stats[pair] for pair in pairs])
+        temp_path = cache_path + '.tmp.npz'
+        np.savez_compressed(temp_path,
+                            document_fingerprints=self._fingerprints,
+                            window_size=np.array(self.window_size),
+                            words=np.array(words, dtype=str),
+                            word_offsets=word_offsets, word_docs=word_docs, word_counts=word_counts,
+                            pairs=np.array([[word_ids[first], word_ids[second]] for first, second in pairs], dtype=np.int64).reshape(-1, 2),
+                            pair_offsets=pair_offsets, pair_docs=pair_docs, pair_counts=pair_counts)
+        os.replace(temp_path, cache_path)
+
+    def load(self, cache_path=None):
+        """
+        Loads persisted statistics accumulated with the same window size. They are kept per document, so
+        documents are matched to the saved ones by content: statistics of removed documents are dropped,
+        and new or changed documents are scanned for the saved words and pairs. Returns whether anything
+        was loaded.
+        """
+        cache_path = cache_path or self.cache_path
+        with np.load(cache_path) as data:
+            if 'document_fingerprints' not in data or int(data['window_size']) != self.window_size:
+                return False
+            # Saved document index -> current document index, or -1 if the document is gone
+            current = {}
+            for index, fingerprint in enumerate(self._fingerprints):
+                current.setdefault(fingerprint.tobytes(), index)
+            saved_to_current = np.array([current.pop(fingerprint.tobytes(), -1) for fingerprint in data['document_fingerprints']],
+                                        dtype=np.int64)
+            covered = np.zeros(self.num_documents, dtype=bool)
+            covered[saved_to_current[saved_to_current >= 0]] = True
+            if not covered.any():
+                return False
+
+            def remap(docs, counts):
+                docs = saved_to_current[docs]
+                keep = docs >= 0
+                return docs[keep].astype(np.int32), counts[keep]
+
+            words = data['words'].tolist()
+            word_offsets, word_docs, word_counts = data['word_offsets'], data['word_docs'], data['word_counts']
+            for index, word in enumerate(words):
+                start, stop = word_offsets[index], word_offsets[index + 1]
+                self._word_stats[word] = remap(word_docs[start:stop], word_counts[start:stop])
+            pair_offsets, pair_docs, pair_counts = data['pair_offsets'], data['pair_docs'], data['pair_counts']
+            pairs = [(words[first], words[second]) for first, second in data['pairs'].tolist()]
+            for index, pair in enumerate(pairs):
+                start, stop = pair_offsets[index], pair_offsets[index + 1]
+                self._pair_stats[pair] = remap(pair_docs[start:stop], pair_counts[start:stop])
+        if not covered.all():
+            self._accumulate(words, pairs, doc_mask=~covered)
+        return True
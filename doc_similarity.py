@@ -0,0 +1,167 @@
+import numpy as np
+from scipy.cluster.hierarchy import leaves_list, linkage
+
+# Documents per side of a similarity tile; a tile of float32 scores takes BLOCK_SIZE**2 * 4 bytes
+BLOCK_SIZE = 4096
+# Most documents clustered hierarchically; the rest are placed next to their most similar clustered document
+HIERARCHICAL_SAMPLE_SIZE = 2000
+
+def normalize_rows(vectors):
+    """
+    Returns the rows of a documents x topics matrix scaled to unit length, as float32.
+    All-zero rows stay zero, so their similarity to everything is 0.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+def iter_similarity_tiles(vectors, block_size=BLOCK_SIZE):
+    """
+    Yields (row_start, col_start, tile) for the tiles on and above the diagonal of the cosine
+    similarity matrix of the rows of vectors; the tiles below are their transposes.
+    """
+    unit = normalize_rows(vectors)
+    for row_start in range(0, len(unit), block_size):
+        rows = unit[row_start:row_start + block_size]
+        for col_start in range(row_start, len(unit), block_size):
+            yield row_start, col_start, rows @ unit[col_start:col_start + block_size].T
+
+def cosine_similarity_matrix(vectors, block_size=BLOCK_SIZE, out=None):
+    """
+    Returns the full n x n float32 cosine similarity matrix of the rows of vectors, computed a tile at
+    a time over the upper triangle and mirrored. out may be a preallocated array, such as a memmap.
+    """
+    num_docs = len(vectors)
+    matrix = np.empty((num_docs, num_docs), dtype=np.float32) if out is None else out
+    for row_start, col_start, tile in iter_similarity_tiles(vectors, block_size):
+        row_stop, col_stop = row_start + tile.shape[0], col_start + tile.shape[1]
+        matrix[row_start:row_stop, col_start:col_stop] = tile
+        if col_start != row_start:
+            matrix[col_start:col_stop, row_start:row_stop] = tile.T
+    return matrix
+
+def save_similarity_matrix(vectors, file_path, block_size=BLOCK_SIZE):
+    """
+    Streams the full similarity matrix into a .npy file tile by tile, so it never has to fit in memory.
+    Returns the file memory-mapped read-only.
+    """
+    num_docs = len(vectors)
+    matrix = np.lib.format.open_memmap(file_path, mode='w+', dtype=np.float32, shape=(num_docs, num_docs))
+    cosine_similarity_matrix(vectors, block_size, out=matrix)
+    matrix.flush()
+    del matrix
+    return np.load(file_path, mmap_mode='r')
+
+def _merge_top_k(best_ids, best_scores, col_start, tile, k, transposed=False):
+    """
+    Merges a tile of candidate scores (columns numbered from col_start) into the running top-k of a
+    block of rows, in place; with transposed set, the tile's columns are the rows being updated, which
+    saves working on a strided transpose. Only the entries above their row's current k-th best are
+    considered; after a row's first tiles these are a small fraction of the tile, and are merged sparsely.
+    """
+    thresholds = best_scores.min(axis=1)
+    is_candidate = tile > (thresholds[None, :] if transposed else thresholds[:, None])
+    if np.count_nonzero(is_candidate) > 4 * k * len(best_scores):
+        # Dense case (a row's first tiles): reduce every row of the tile to its own top k first
+        scores = np.ascontiguousarray(tile.T) if transposed else tile
+        if scores.shape[1] > k:
+            candidate_cols = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, candidate_cols, axis=1)
+        else:
+            candidate_cols = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        merged_ids = np.concatenate([best_ids, candidate_cols + col_start], axis=1)
+        merged_scores = np.concatenate([best_scores, scores], axis=1)
+        keep = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+        best_ids[:] = np.take_along_axis(merged_ids, keep, axis=1)
+        best_scores[:] = np.take_along_axis(merged_scores, keep, axis=1)
+        return
+
+    candidate_rows, candidate_cols = np.nonzero(is_candidate)
+    if not len(candidate_rows):
+        return
+    candidate_scores = tile[candidate_rows, candidate_cols]
+    if transposed:
+        candidate_rows, candidate_cols = candidate_cols, candidate_rows
+    rows = np.unique(candidate_rows)
+    all_rows = np.concatenate([np.repeat(rows, k), candidate_rows])
+    all_ids = np.concatenate([best_ids[rows].ravel(), candidate_cols + col_start])
+    all_scores = np.concatenate([best_scores[rows].ravel(), candidate_scores])
+    # Sort by row, best score first, and keep the first k entries of every row
+    order = np.lexsort((-all_scores, all_rows))
+    all_rows, all_ids, all_scores = all_rows[order], all_ids[order], all_scores[order]
+    row_starts = np.searchsorted(all_rows, rows)
+    keep = np.arange(len(all_rows)) - np.repeat(row_starts, np.diff(np.append(row_starts, len(all_rows)))) < k
+    best_ids[rows] = all_ids[keep].reshape(-1, k)
+    best_scores[rows] = all_scores[keep].reshape(-1, k)
+
+def top_k_neighbours(vectors, k=10, block_size=BLOCK_SIZE, exclude_self=True):
+    """
+    Returns (ids, scores), each n x k, of every document's k most similar documents, most similar first.
+    Each upper-triangle tile updates the neighbours of both its rows and its columns, so every pair
+    is scored once, and memory stays at O(n * k) plus one tile. Rows with fewer than k other documents
+    are padded with id -1 and score -inf.
+    """
+    num_docs = len(vectors)
+    best_ids = np.full((num_docs, k), -1, dtype=np.int64)
+    best_scores = np.full((num_docs, k), -np.inf, dtype=np.float32)
+    for row_start, col_start, tile in iter_similarity_tiles(vectors, block_size):
+        row_stop, col_stop = row_start + tile.shape[0], col_start + tile.shape[1]
+        if exclude_self and row_start == col_start:
+            np.fill_diagonal(tile, -np.inf)
+        _merge_top_k(best_ids[row_start:row_stop], best_scores[row_start:row_stop], col_start, tile, k)
+        if col_start != row_start:
+            _merge_top_k(best_ids[col_start:col_stop], best_scores[col_start:col_stop], row_start, tile, k, transposed=True)
+
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    best_ids = np.take_along_axis(best_ids, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    best_ids[np.isneginf(best_scores)] = -1
+    return best_ids, best_scores
+
+def cluster_order(vectors, method='dominance', sample_size=HIERARCHICAL_SAMPLE_SIZE, seed=0):
+    """
+    Returns an ordering of the documents that puts similar documents next to each other.
+    'dominance' groups documents by their most probable topic, most strongly dominated first.
+    'hierarchical' orders the leaves of an average-linkage clustering of the normalised vectors; above
+    sample_size documents a random sample is clustered and every other document is placed after its
+    most similar sampled document.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if method == 'dominance':
+        return np.lexsort((-vectors.max(axis=1), vectors.argmax(axis=1)))
+    if method != 'hierarchical':
+        raise ValueError(f"Unknown ordering method: {method}")
+    unit = normalize_rows(vectors)
+    num_docs = len(unit)
+    if num_docs < 2:
+        return np.arange(num_docs)
+    sample = np.arange(num_docs) if num_docs <= sample_size else np.sort(np.random.default_rng(seed).choice(num_docs, sample_size, replace=False))
+    # Euclidean distance between unit vectors is a monotone function of their cosine similarity
+    leaves = sample[leaves_list(linkage(unit[sample], method='average', metric='euclidean'))]
+    if len(leaves) == num_docs:
+        return leaves
+    nearest_leaf = np.empty(num_docs, dtype=np.int64)
+    similarity = np.empty(num_docs, dtype=np.float32)
+    for start in range(0, num_docs, BLOCK_SIZE):
+        tile = unit[start:start + BLOCK_SIZE] @ unit[leaves].T
+        nearest_leaf[start:start + BLOCK_SIZE] = tile.argmax(axis=1)
+        similarity[start:start + BLOCK_SIZE] = tile.max(axis=1)
+    return np.lexsort((-similarity, nearest_leaf))
+
+def block_mean_similarity(vectors, order=None, resolution=1000):
+    """
+    Returns (matrix, edges): the cosine similarity matrix of the documents taken in the given order,
+    averaged over a grid of at most resolution x resolution blocks of consecutive documents, and the
+    document positions where the blocks start (plus the total). The mean similarity of two blocks is
+    the dot product of their summed unit vectors over the product of their sizes, so the full matrix
+    is never formed and the cost is O(n * topics + resolution**2 * topics).
+    """
+    unit = normalize_rows(vectors)
+    if order is not None:
+        unit = unit[order]
+    num_docs = len(unit)
+    edges = np.linspace(0, num_docs, min(resolution, num_docs) + 1).astype(np.int64)
+    sums = np.add.reduceat(unit.astype(np.float64), edges[:-1], axis=0) if num_docs else np.zeros((0, unit.shape[1]))
+    sizes = np.diff(edges).astype(np.float64)
+    matrix = (sums @ sums.T) / np.outer(sizes, sizes)
+    return matrix.astype(np.float32), edges
@@ -0,0 +1,333 @@
+import os
+import sys
+import csv
+import json
+import glob
+import time
+import atexit
+import threading
+from collections import Counter, defaultdict
+from multiprocessing import util
+
+from supervised_pool import peak_rss_bytes
+
+# Tracing is switched on by these environment variables, so worker processes (forked, spawned or run as
+# subprocesses) trace into the same folder as the script that started them.
+TRACE_DIR_VARIABLE = 'SLR_TRACE_DIR'
+PROFILE_INTERVAL_VARIABLE = 'SLR_PROFILE_INTERVAL'
+TRACE_FILENAME = 'trace.json'
+SUMMARY_FILENAME = 'stage_summary.csv'
+HOT_FUNCTIONS_FILENAME = 'hot_functions.csv'
+SUMMARY_FIELDNAMES = ['Stage', 'Count', 'Total Seconds', 'Mean ms', 'Max ms', 'Peak RSS MB']
+HOT_FUNCTIONS_FIELDNAMES = ['Function', 'Self Samples', 'Total Samples', 'Self %', 'Total %']
+
+class _NullSpan:
+    """
+    The span returned while tracing is off: entering, leaving and setting arguments do nothing.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **args):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    """
+    A timed stage, written as a Chrome trace complete event when it ends, with its arguments
+    and the process's peak RSS at that point.
+    """
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        ended = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args['error'] = repr(exc_value)
+        self.args['peak_rss_mb'] = round(peak_rss_bytes() / 1e6, 1)
+        self.tracer.write({'name': self.name, 'cat': 'stage', 'ph': 'X', 'ts': self.started / 1000, 'dur': (ended - self.started) / 1000,
+                           'pid': self.tracer.pid, 'tid': threading.get_ident(), 'args': self.args})
+        return False
+
+    def set(self, **args):
+        self.args.update(args)
+
+class _Tracer:
+    """
+    Appends this process's trace events, one JSON line each, to its own file in the trace folder.
+    Every event is flushed as it is written, so a worker killed for a timeout still leaves its events behind.
+    """
+
+    def __init__(self, trace_dir):
+        self.pid = os.getpid()
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        os.makedirs(trace_dir, exist_ok=True)
+        self.file = open(os.path.join(trace_dir, f'events-{self.pid}.jsonl'), 'a', encoding='utf-8')
+        label = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else 'python'
+        self.write({'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'args': {'name': f'{label} ({self.pid})'}})
+
+    def write(self, event):
+        line = json.dumps(event, default=str) + '\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def count(self, name, value):
+        with self.lock:
+            self.counts[name] += value
+            total = self.counts[name]
+        self.write({'name': name, 'cat': 'count', 'ph': 'C', 'ts': time.perf_counter_ns() / 1000, 'pid': self.pid, 'args': {name: total}})
+
+class SamplingProfiler:
+    """
+    Samples the main thread's Python stack every interval seconds from a background thread and counts
+    the collapsed stacks ('outer;...;inner' function names), which flamegraph.pl and speedscope read.
+    With a file path, the counts are also saved every save_interval seconds, since pool workers may be
+    killed or exit without running exit handlers.
+    """
+
+    def __init__(self, interval=0.01, file_path=None, save_interval=1.0):
+        self.interval = interval
+        self.file_path = file_path
+        self.save_interval = save_interval
+        self.stacks = Counter()
+        self.thread_id = threading.main_thread().ident
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        last_saved = time.monotonic()
+        while not self.stopped.wait(self.interval):
+            if self.file_path and time.monotonic() - last_saved > self.save_interval:
+                self.save(self.file_path)
+                last_saved = time.monotonic()
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def save(self, file_path):
+        temp_path = file_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            for stack, samples in list(self.stacks.items()):
+                file.write(f'{stack} {samples}\n')
+        os.replace(temp_path, file_path)
+
+_tracer = None
+_profiler = None
+_owner_dir = None
+
+def enabled():
+    return _tracer is not None
+
+def stage(name, **args):
+    """
+    Returns a context manager timing the enclosed code as one stage, for example
+    'with stage("process_pdf", file=pdf_file) as span: ... span.set(pages=pages)'. Costs one global lookup when tracing is off.
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _Span(_tracer, name, args)
+
+def traced(name=None):
+    """
+    Decorator timing every call of a function as a stage named after it (or name).
+    """
+    def decorate(function):
+        stage_name = name or function.__name__
+
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return function(*args, **kwargs)
+            with _Span(_tracer, stage_name, {}):
+                return function(*args, **kwargs)
+        wrapper.__name__, wrapper.__qualname__, wrapper.__doc__ = function.__name__, function.__qualname__, function.__doc__
+        wrapper.__module__, wrapper.__wrapped__ = function.__module__, function
+        return wrapper
+    return decorate
+
+def count(name, value=1):
+    """
+    Adds value to a counter (documents, pages, tokens...), traced as a running total per process.
+    """
+    if _tracer is not None:
+        _tracer.count(name, value)
+
+def _save_profile():
+    if _profiler is not None and _profiler.thread.is_alive():
+        _profiler.stop()
+        _profiler.save(_profiler.file_path)
+
+def _register_exit_save(profiler):
+    # multiprocessing workers leave through os._exit() and skip atexit, but run finalizers registered
+    # after multiprocessing has reset them in the new process
+    util.Finalize(None, _save_profile, exitpriority=100)
+
+def _enable_from_environment():
+    """
+    Starts tracing (and profiling) in this process if the environment asks for it.
+    """
+    global _tracer, _profiler
+    trace_dir = os.environ.get(TRACE_DIR_VARIABLE)
+    if not trace_dir or (_tracer is not None and _tracer.pid == os.getpid()):
+        return
+    _tracer = _Tracer(trace_dir)
+    interval = os.environ.get(PROFILE_INTERVAL_VARIABLE)
+    if interval:
+        _profiler = SamplingProfiler(float(interval), os.path.join(trace_dir, f'profile-{_tracer.pid}.txt')).start()
+        atexit.register(_save_profile)
+        util.register_after_fork(_profiler, _register_exit_save)
+
+def _reset_after_fork():
+    # A forked child has its own pid, so it writes its own event file (and runs its own profiler)
+    global _tracer, _profiler
+    if _tracer is not None:
+        _tracer, _profiler = None, None
+        _enable_from_environment()
+
+def start(trace_dir, profile_interval=None):
+    """
+    Turns tracing on for this process and every process it starts, and writes the merged trace and
+    summaries to trace_dir when this process exits (see finish()). Events left by an earlier run are removed.
+    """
+    global _owner_dir
+    trace_dir = os.path.abspath(trace_dir)
+    os.makedirs(trace_dir, exist_ok=True)
+    for file_path in glob.glob(os.path.join(trace_dir, 'events-*.jsonl')) + glob.glob(os.path.join(trace_dir, 'profile-*.txt')):
+        os.remove(file_path)
+    os.environ[TRACE_DIR_VARIABLE] = trace_dir
+    if profile_interval:
+        os.environ[PROFILE_INTERVAL_VARIABLE] = str(profile_interval)
+    _enable_from_environment()
+    _owner_dir = trace_dir
+    atexit.register(finish)
+
+def read_events(trace_dir):
+    events = []
+    for file_path in sorted(glob.glob(os.path.join(trace_dir, 'events-*.jsonl'))):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass  # A line cut short by a killed worker
+    return events
+
+def stage_summary(events):
+    """
+    Returns one row per stage name with its count, total and mean seconds, longest run and highest peak RSS,
+    then one row per counter with its total across processes, longest-running stages first.
+    """
+    durations, peaks = defaultdict(list), defaultdict(float)
+    counters = {}
+    for event in events:
+        if event['ph'] == 'X':
+            durations[event['name']].append(event['dur'])
+            peaks[event['name']] = max(peaks[event['name']], event['args'].get('peak_rss_mb', 0.0))
+        elif event['ph'] == 'C':
+            counters[(event['pid'], event['name'])] = event['args'][event['name']]
+    rows = [{'Stage': name, 'Count': len(values), 'Total Seconds': round(sum(values) / 1e6, 3),
+             'Mean ms': round(sum(values) / len(values) / 1000, 3), 'Max ms': round(max(values) / 1000, 3), 'Peak RSS MB': peaks[name]}
+            for name, values in durations.items()]
+    rows.sort(key=lambda row: row['Total Seconds'], reverse=True)
+    totals = Counter()
+    for (_, name), value in counters.items():
+        totals[name] += value
+    rows += [{'Stage': name, 'Count': value, 'Total Seconds': '', 'Mean ms': '', 'Max ms': '', 'Peak RSS MB': ''}
+             for name, value in sorted(totals.items())]
+    return rows
+
+def hot_functions(trace_dir, limit=30):
+    """
+    Aggregates every process's sampled stacks into the functions most often on top of the stack (self)
+    and anywhere on it (total).
+    """
+    self_samples, total_samples = Counter(), Counter()
+    samples = 0
+    for file_path in glob.glob(os.path.join(trace_dir, 'profile-*.txt')):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                stack, _, value = line.rstrip('\n').rpartition(' ')
+                functions = stack.split(';')
+                value = int(value)
+                samples += value
+                self_samples[functions[-1]] += value
+                for function in set(functions):
+                    total_samples[function] += value
+    return [{'Function': function, 'Self Samples': self_samples[function], 'Total Samples': total,
+             'Self %': round(100 * self_samples[function] / samples, 1), 'Total %': round(100 * total / samples, 1)}
+            for function, total in sorted(total_samples.items(), key=lambda item: (-self_samples[item[0]], -item[1]))[:limit]]
+
+def write_csv(rows, fieldnames, file_path):
+    with open(file_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def finish():
+    """
+    Writes the events of every traced process as one Chrome trace (trace.json, for chrome://tracing or
+    ui.perfetto.dev), the per-stage summary table and, when profiling, the hot functions, and prints the summaries.
+    """
+    global _owner_dir
+    if _owner_dir is None:
+        return
+    trace_dir, _owner_dir = _owner_dir, None
+    _save_profile()
+    events = read_events(trace_dir)
+    with open(os.path.join(trace_dir, TRACE_FILENAME), 'w', encoding='utf-8') as file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+    rows = stage_summary(events)
+    write_csv(rows, SUMMARY_FIELDNAMES, os.path.join(trace_dir, SUMMARY_FILENAME))
+    print(' | '.join(SUMMARY_FIELDNAMES))
+    for row in rows:
+        print(' | '.join(str(row[field]) for field in SUMMARY_FIELDNAMES))
+
+    functions = hot_functions(trace_dir)
+    if functions:
+        write_csv(functions, HOT_FUNCTIONS_FIELDNAMES, os.path.join(trace_dir, HOT_FUNCTIONS_FILENAME))
+        print(' | '.join(HOT_FUNCTIONS_FIELDNAMES))
+        for row in functions[:10]:
+            print(' | '.join(str(row[field]) for field in HOT_FUNCTIONS_FIELDNAMES))
+    print(f"Trace saved to: {os.path.join(trace_dir, TRACE_FILENAME)}")
+
+def add_arguments(parser):
+    parser.add_argument('--trace', default=None, metavar='FOLDER', help='Record stage timings, counts and peak RSS of this run and its workers '
+                                                                       'to a Chrome trace (trace.json) and summary table in FOLDER')
+    parser.add_argument('--profile', type=float, nargs='?', const=0.01, default=None, metavar='SECONDS',
+                        help='With --trace, also sample every process\'s stack every SECONDS (default 0.01) and report the hot functions')
+
+def start_from_args(args):
+    if args.trace:
+        start(args.trace, args.profile)
+
+_enable_from_environment()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,85 @@
+import csv
+import time
+import numpy as np
+from instrumentation import stage
+
+TRACE_FIELDNAMES = ['Pass', 'Training Seconds', 'Evaluation Seconds', 'Per-Word Bound', 'Perplexity', 'Relative Change']
+# Documents sampled from the training corpus to measure the bound when no held-out corpus is given
+BOUND_SAMPLE_SIZE = 1000
+
+def warm_start_state(model, previous_model):
+    """
+    Initialises an untrained model's topic-word statistics from a previously trained model.
+    Words are matched by their text, so the two dictionaries may differ. With fewer topics the previous
+    model's heaviest topics are kept; with more, the extra topics keep their random initialisation,
+    rescaled to the previous model's counts so they are not swamped.
+    """
+    previous = previous_model.state.sstats
+    order = np.argsort(-previous.sum(axis=1), kind='stable')[:model.num_topics]
+    new_ids, old_ids = [], []
+    for word, new_id in model.id2word.token2id.items():
+        old_id = previous_model.id2word.token2id.get(word)
+        if old_id is not None:
+            new_ids.append(new_id)
+            old_ids.append(old_id)
+
+    sstats = model.state.sstats
+    sstats *= previous.mean()
+    sstats[np.ix_(np.arange(len(order)), new_ids)] = previous[np.ix_(order, old_ids)]
+    model.sync_state()
+
+def train_lda(model_class, corpus, id2word, num_topics, passes=10, tolerance=None, max_passes=50,
+              holdout=None, warm_start=None, **model_kwargs):
+    """
+    Trains a gensim LdaModel or LdaMulticore and returns (model, trace), the trace holding one row per pass.
+
+    Without a tolerance or warm start the model is trained exactly as before, in one call with a fixed
+    number of passes. Otherwise it is trained one pass at a time: after each pass the per-word bound is
+    measured on the held-out corpus (by default a sample of the training corpus), and with a tolerance
+    training stops once the bound's relative change falls below it, or after max_passes.
+    """
+    if tolerance is None and warm_start is None:
+        started = time.perf_counter()
+        with stage('lda_training', documents=len(corpus), passes=passes):
+            model = model_class(corpus=corpus, id2word=id2word, num_topics=num_topics, passes=passes, **model_kwargs)
+        return model, [{'Pass': passes, 'Training Seconds': round(time.perf_counter() - started, 3)}]
+
+    # gensim's own perplexity logging (eval_every) is turned off, the bound is measured here once per pass
+    model = model_class(corpus=None, id2word=id2word, num_topics=num_topics, passes=1, eval_every=None, **model_kwargs)
+    if warm_start is not None:
+        warm_start_state(model, warm_start)
+    if holdout is None:
+        holdout = corpus[::max(1, len(corpus) // BOUND_SAMPLE_SIZE)]
+
+    trace = []
+    previous_bound = None
+    for pass_number in range(1, (max_passes if tolerance is not None else passes) + 1):
+        started = time.perf_counter()
+        with stage('lda_pass', documents=len(corpus), number=pass_number):
+            model.update(corpus)
+        training_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        with stage('lda_bound', documents=len(holdout)):
+            bound = model.log_perplexity(holdout)
+        change = None if previous_bound is None else abs(bound - previous_bound) / abs(previous_bound)
+        trace.append({'Pass': pass_number,
+                      'Training Seconds': round(training_seconds, 3),
+                      'Evaluation Seconds': round(time.perf_counter() - started, 3),
+                      'Per-Word Bound': bound,
+                      'Perplexity': float(np.exp2(-bound)),
+                      'Relative Change': change})
+        if tolerance is not None and change is not None and change < tolerance:
+            break
+        previous_bound = bound
+    return model, trace
+
+def save_convergence_traces(traces, file_path, run_field):
+    """
+    Writes the per-pass traces of several training runs to one CSV, keyed by run_field (e.g. 'Fold').
+    """
+    with open(file_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=[run_field] + TRACE_FIELDNAMES)
+        writer.writeheader()
+        for run in sorted(traces):
+            for row in traces[run]:
+                writer.writerow({run_field: run, **row})
@@ -0,0 +1,135 @@
+import io
+import importlib.util
+from contextlib import contextmanager
+
+DEFAULT_BACKEND = 'pypdf2'
+
+class PyPDF2Document:
+    """
+    Text extraction backend using PyPDF2, the extractor's original implementation.
+    """
+
+    def __init__(self, file):
+        from PyPDF2 import PdfReader
+        self._reader = PdfReader(file)
+
+    def __len__(self):
+        return len(self._reader.pages)
+
+    def page_text(self, index):
+        return self._reader.pages[index].extract_text() or ''
+
+    @property
+    def metadata(self):
+        return self._reader.metadata
+
+    def close(self):
+        pass
+
+class PdfminerDocument:
+    """
+    Text extraction backend using pdfminer.six.
+    """
+
+    def __init__(self, file):
+        from pdfminer.pdfparser import PDFParser
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfpage import PDFPage
+        from pdfminer.pdfinterp import PDFResourceManager
+        self._document = PDFDocument(PDFParser(file))
+        self._pages = list(PDFPage.create_pages(self._document))
+        self._resources = PDFResourceManager(caching=True)
+
+    def __len__(self):
+        return len(self._pages)
+
+    def page_text(self, index):
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfinterp import PDFPageInterpreter
+        output = io.StringIO()
+        device = TextConverter(self._resources, output, laparams=LAParams())
+        try:
+            PDFPageInterpreter(self._resources, device).process_page(self._pages[index])
+        finally:
+            device.close()
+        return output.getvalue()
+
+    @property
+    def metadata(self):
+        from pdfminer.pdftypes import resolve1
+        from pdfminer.psparser import PSLiteral
+        from pdfminer.utils import decode_text
+        info = resolve1(self._document.info[0]) if self._document.info else {}
+        metadata = {}
+        for key, value in info.items():
+            value = resolve1(value)
+            if isinstance(value, bytes):
+                value = decode_text(value)
+            elif isinstance(value, PSLiteral):
+                value = value.name
+            if value:
+                metadata['/' + key] = value
+        return metadata
+
+    def close(self):
+        pass
+
+class PdfiumDocument:
+    """
+    Text extraction backend using pypdfium2, the PDFium bindings.
+    """
+
+    def __init__(self, file):
+        import pypdfium2
+        self._pdf = pypdfium2.PdfDocument(file)
+
+    def __len__(self):
+        return len(self._pdf)
+
+    def page_text(self, index):
+        page = self._pdf[index]
+        try:
+            text_page = page.get_textpage()
+            try:
+                return text_page.get_text_range()
+            finally:
+                text_page.close()
+        finally:
+            page.close()
+
+    @property
+    def metadata(self):
+        # Empty fields are dropped so they read as missing, as they do with PyPDF2
+        return {'/' + key: value for key, value in self._pdf.get_metadata_dict().items() if value}
+
+    def close(self):
+        self._pdf.close()
+
+# Backend name -> (module that must be installed, document class)
+BACKENDS = {
+    'pypdf2': ('PyPDF2', PyPDF2Document),
+    'pdfminer': ('pdfminer', PdfminerDocument),
+    'pypdfium2': ('pypdfium2', PdfiumDocument),
+}
+
+def available_backends():
+    """
+    Returns the names of the backends whose library is installed.
+    """
+    return [name for name, (module, _) in BACKENDS.items() if importlib.util.find_spec(module) is not None]
+
+@contextmanager
+def open_pdf(pdf_path, backend=DEFAULT_BACKEND):
+    """
+    Opens a PDF with the named backend and yields a document offering len(), page_text(index)
+    and a metadata dictionary keyed like the PDF information dictionary ('/Title', '/Author', ...).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown PDF backend '{backend}', expected one of {sorted(BACKENDS)}")
+    with open(pdf_path, 'rb') as file:
+        document = BACKENDS[backend][1](file)
+        try:
+            yield document
+        finally:
+            document.close()
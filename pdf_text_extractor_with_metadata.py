@@ -1,14 +1,39 @@
 import csv
 import os
 import re
+import json
+import time
+import hashlib
 import logging
-from PyPDF2 import PdfReader
+import argparse
+from collections import deque
+from pdf_backends import DEFAULT_BACKEND, available_backends, open_pdf
 from PyPDF2.generic import IndirectObject
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from supervised_pool import SupervisedPool, SUCCESS, TIMEOUT, MEMORY_LIMIT, CRASHED
+import instrumentation
+from instrumentation import count, stage, traced
 
 # Setup basic logging
 logging.basicConfig(level=logging.ERROR, filename='error_log.log', filemode='w', format='%(name)s - %(levelname)s - %(message)s')
 
+METADATA_KEYS = ['Title', 'Author', 'Keywords', 'CreationDate', 'ModDate', 'Description', 'Year', 'DOI']
+SUMMARY_FIELDNAMES = ['Serial Number', 'Author', 'Year', 'DOI', 'Original PDF Name', 'Output File']
+ERROR_FIELDNAMES = ['Serial Number', 'PDF File', 'Status', 'Error']
+REPORT_FIELDNAMES = ['Serial Number', 'PDF File', 'Pages', 'Page Tasks', 'Extraction Seconds', 'Status']
+MANIFEST_FILENAME = 'extraction_manifest.jsonl'
+# PDFs at least this large are page-counted up front and split into page-range tasks
+SPLIT_MIN_BYTES = 2 * 1024 * 1024
+PAGES_PER_TASK = 50
+# Budgets enforced per task by the pool supervisor; a worker exceeding them is killed and replaced
+TASK_TIMEOUT_SECONDS = 300
+MEMORY_LIMIT_BYTES = 4 * 1024 * 1024 * 1024
+MAX_TASKS_PER_WORKER = 100
+# Pool outcomes recorded under their own status, so pathological PDFs are easy to find in error_log.csv
+POOL_FAILURE_STATUSES = {TIMEOUT: 'Timeout', MEMORY_LIMIT: 'MemoryLimit', CRASHED: 'Crashed'}
+FAILED_STATUSES = ('Error', 'Timeout', 'MemoryLimit', 'Crashed')
+# Manifest field holding the budget each pool failure status was recorded under
+FAILURE_BUDGETS = {'Timeout': 'Task Timeout', 'MemoryLimit': 'Memory Limit'}
+
 def find_doi_in_text(text):
     """
     Searches the extracted text for DOIs using regular expressions and returns the first match found.
@@ -31,57 +56,71 @@ def get_metadata_value(value):
         print(f"Error extracting metadata value: {e}")
         return 'Unknown'
 
-def extract_and_standardize_metadata(pdf_path, text):
+def unknown_metadata():
+    """
+    Returns a metadata dictionary with every field set to 'Unknown'.
+    """
+    return {key: 'Unknown' for key in METADATA_KEYS}
+
+def standardize_metadata(raw_metadata, text):
+    """
+    Maps the raw PDF document information dictionary onto the standard metadata fields.
+    """
+    return {
+        'Title': get_metadata_value(raw_metadata.get('/Title', 'Unknown')),
+        'Author': get_metadata_value(raw_metadata.get('/Author', 'Unknown')),
+        'Keywords': get_metadata_value(raw_metadata.get('/Keywords', 'Unknown')),
+        'CreationDate': get_metadata_value(raw_metadata.get('/CreationDate', 'Unknown'))[2:10] if '/CreationDate' in raw_metadata else 'Unknown',
+        'ModDate': get_metadata_value(raw_metadata.get('/ModDate', 'Unknown'))[2:10] if '/ModDate' in raw_metadata else 'Unknown',
+        'Description': get_metadata_value(raw_metadata.get('/Subject', 'Unknown')),
+        'Year': get_metadata_value(raw_metadata.get('/CreationDate', 'Unknown'))[2:6] if '/CreationDate' in raw_metadata else 'Unknown',
+        'DOI': find_doi_in_text(text)
+    }
+
+@traced('extract_metadata')
+def extract_and_standardize_metadata(pdf_path, text, reader=None, backend=DEFAULT_BACKEND):
     """
     Extracts and standardizes metadata from a given PDF file and extracted text,
     with added exception handling for more robust processing.
+    If an open document is passed in, it is reused instead of re-opening the file.
     """
     try:
-        with open(pdf_path, 'rb') as file:
-            reader = PdfReader(file)
-            raw_metadata = reader.metadata
-            standardized_metadata = {
-                'Title': get_metadata_value(raw_metadata.get('/Title', 'Unknown')),
-                'Author': get_metadata_value(raw_metadata.get('/Author', 'Unknown')),
-                'Keywords': get_metadata_value(raw_metadata.get('/Keywords', 'Unknown')),
-                'CreationDate': get_metadata_value(raw_metadata.get('/CreationDate', 'Unknown'))[2:10] if '/CreationDate' in raw_metadata else 'Unknown',
-                'ModDate': get_metadata_value(raw_metadata.get('/ModDate', 'Unknown'))[2:10] if '/ModDate' in raw_metadata else 'Unknown',
-                'Description': get_metadata_value(raw_metadata.get('/Subject', 'Unknown')),
-                'Year': get_metadata_value(raw_metadata.get('/CreationDate', 'Unknown'))[2:6] if '/CreationDate' in raw_metadata else 'Unknown',
-                'DOI': find_doi_in_text(text)
-            }
-            return standardized_metadata
+        if reader is not None:
+            return standardize_metadata(reader.metadata, text)
+        with open_pdf(pdf_path, backend) as document:
+            return standardize_metadata(document.metadata, text)
     except Exception as e:
         print(f"Error extracting or standardizing metadata for {pdf_path}: {e}")
         # Return a dictionary with 'Unknown' values if an error occurs
-        return {key: 'Unknown' for key in ['Title', 'Author', 'Keywords', 'CreationDate', 'ModDate', 'Description', 'Year', 'DOI']}
+        return unknown_metadata()
+
+def extract_text_from_reader(reader, start=0, stop=None):
+    """
+    Concatenates the text of the pages of an open document, optionally limited to pages start to stop - 1.
+    """
+    stop = len(reader) if stop is None else stop
+    count('pages', stop - start)
+    with stage('extract_text', pages=stop - start):
+        return ''.join([reader.page_text(index) for index in range(start, stop)])
 
-def extract_text_from_pdf(pdf_path, serial_number):
+def extract_text_from_pdf(pdf_path, serial_number, reader=None, backend=DEFAULT_BACKEND):
     """
-    Attempts to extract text from a PDF file using PyPDF2. If an error occurs,
-    the error is logged along with the serial number and filename.
+    Attempts to extract text from a PDF file using the chosen backend (PyPDF2 by default).
+    If an error occurs, the error is logged along with the serial number and filename.
+    If an open document is passed in, it is reused instead of re-opening the file.
     """
     try:
-        with open(pdf_path, 'rb') as file:
-            reader = PdfReader(file)
-            text = ''.join([page.extract_text() or '' for page in reader.pages])
+        if reader is not None:
+            text = extract_text_from_reader(reader)
+        else:
+            with open_pdf(pdf_path, backend) as document:
+                text = extract_text_from_reader(document)
         return serial_number, pdf_path, text, None  # No error
     except Exception as e:
         logging.error(f"Error extracting text from {pdf_path} (Serial {serial_number}): {e}")
         return serial_number, pdf_path, "", str(e)  # Error encountered
 
 
-def log_errors_to_csv(errors, csv_file_path='error_log.csv'):
-    """
-    Logs errors to a CSV file. Each error is associated with the serial number of the PDF and its filename.
-    """
-    with open(csv_file_path, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['Serial Number', 'PDF File', 'Error']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for error in errors:
-            writer.writerow({'Serial Number': error[0], 'PDF File': error[1], 'Error': error[2]})
-
 def generate_output_filename(serial_number, metadata):
     """
     Generates an output filename based on serial number, author, and year.
@@ -90,82 +129,507 @@ def generate_output_filename(serial_number, metadata):
     year = metadata['Year']
     return f"{serial_number}-{author}-{year}.txt"
 
-def process_pdf(pdf_path, serial_number, output_directory):
-    try:
-        text = extract_text_from_pdf(pdf_path, serial_number)[2]  # Adjusted to match the output format
-        metadata = extract_and_standardize_metadata(pdf_path, text)
-        output_filename = generate_output_filename(serial_number, metadata)
-        output_path = os.path.join(output_directory, output_filename)
+def build_summary_record(serial_number, pdf_file, metadata, output_filename=''):
+    """
+    Builds the metadata_summary.csv row for a processed PDF.
+    """
+    return {
+        'Serial Number': serial_number,
+        'Author': metadata['Author'],
+        'Year': metadata['Year'],
+        'DOI': metadata['DOI'],
+        'Original PDF Name': pdf_file,
+        'Output File': output_filename
+    }
 
-        # Save extracted text and metadata to an output file
-        with open(output_path, 'w', encoding='utf-8') as text_file:
-            metadata_text = f"Title: {metadata['Title']}\nAuthor: {metadata['Author']}\nYear: {metadata['Year']}\nDOI: {metadata['DOI']}\nKeywords: {metadata['Keywords']}\nCreated: {metadata['CreationDate']}\nModified: {metadata['ModDate']}"
-            text_file.write(metadata_text + "\n\n---METADATA END---\n\n" + text)
+@traced()
+def write_text_output(output_directory, serial_number, metadata, text):
+    """
+    Writes the metadata header and extracted text to the output file and returns its filename.
+    """
+    output_filename = generate_output_filename(serial_number, metadata)
+    output_path = os.path.join(output_directory, output_filename)
+    with open(output_path, 'w', encoding='utf-8') as text_file:
+        metadata_text = f"Title: {metadata['Title']}\nAuthor: {metadata['Author']}\nYear: {metadata['Year']}\nDOI: {metadata['DOI']}\nKeywords: {metadata['Keywords']}\nCreated: {metadata['CreationDate']}\nModified: {metadata['ModDate']}"
+        text_file.write(metadata_text + "\n\n---METADATA END---\n\n" + text)
+    return output_filename
 
-        return serial_number, pdf_path, "Success", None
+def process_pdf(pdf_path, serial_number, output_directory, backend=DEFAULT_BACKEND):
+    """
+    Opens the PDF once, shares a single document between text and metadata extraction,
+    writes the text output file and returns the metadata, output filename, page count and
+    extraction time alongside any error.
+    """
+    started = time.perf_counter()
+    pages = 0
+    count('documents')
+    try:
+        with stage('process_pdf', file=os.path.basename(pdf_path)):
+            with open_pdf(pdf_path, backend) as reader:
+                pages = len(reader)
+                _, _, text, error = extract_text_from_pdf(pdf_path, serial_number, reader)
+                metadata = extract_and_standardize_metadata(pdf_path, text, reader)
+            output_filename = write_text_output(output_directory, serial_number, metadata, text)
+        result = {'Metadata': metadata, 'Output File': output_filename, 'Pages': pages, 'Seconds': time.perf_counter() - started}
+        return serial_number, pdf_path, result, error
     except Exception as e:
         logging.error(f"Error processing PDF {pdf_path} (Serial {serial_number}): {e}")
-        return serial_number, pdf_path, None, str(e)
+        result = {'Metadata': unknown_metadata(), 'Output File': '', 'Pages': pages, 'Seconds': time.perf_counter() - started}
+        return serial_number, pdf_path, result, str(e)
+
+def count_pdf_pages(pdf_path, backend=DEFAULT_BACKEND):
+    """
+    Returns the number of pages in a PDF, or None if it cannot be read.
+    """
+    try:
+        with open_pdf(pdf_path, backend) as reader:
+            return len(reader)
+    except Exception:
+        return None
+
+def page_part_path(output_directory, serial_number, start):
+    """
+    Returns the path of the temporary file holding one page range of a split PDF.
+    """
+    return os.path.join(output_directory, f".{serial_number}.pages-{start:06d}.part")
+
+@traced()
+def extract_page_range(pdf_path, serial_number, start, stop, output_directory, backend=DEFAULT_BACKEND):
+    """
+    Extracts the text of pages start to stop - 1 of a large PDF into a temporary part file, so the
+    text never travels back through the pool. The task covering the first page also returns the
+    document metadata; its DOI is filled in once the full text is reassembled.
+    """
+    started = time.perf_counter()
+    try:
+        with open_pdf(pdf_path, backend) as reader:
+            text = extract_text_from_reader(reader, start, stop)
+            metadata = extract_and_standardize_metadata(pdf_path, '', reader) if start == 0 else None
+        with open(page_part_path(output_directory, serial_number, start), 'w', encoding='utf-8') as part_file:
+            part_file.write(text)
+        return serial_number, start, metadata, None, time.perf_counter() - started
+    except Exception as e:
+        logging.error(f"Error extracting pages {start}-{stop - 1} from {pdf_path} (Serial {serial_number}): {e}")
+        return serial_number, start, None, str(e), time.perf_counter() - started
+
+def page_ranges(pages, pages_per_task):
+    """
+    Splits a page count into consecutive (start, stop) ranges of at most pages_per_task pages.
+    """
+    return [(start, min(start + pages_per_task, pages)) for start in range(0, pages, pages_per_task)]
+
+def failed_result(seconds=0.0):
+    """
+    Builds the result dictionary for a PDF whose task was killed or crashed before returning.
+    """
+    return {'Metadata': unknown_metadata(), 'Output File': '', 'Pages': 0, 'Seconds': seconds}
+
+@traced()
+def assemble_split_document(pdf_path, serial_number, output_directory, starts, metadata, pages, seconds, error):
+    """
+    Joins the part files of a split PDF in page order, writes its output file and removes the parts.
+    Runs in a worker and returns the same tuple as process_pdf(). Ranges whose task failed have no
+    part file and contribute no text.
+    """
+    started = time.perf_counter()
+    text_parts = []
+    for start in sorted(starts):
+        part_path = page_part_path(output_directory, serial_number, start)
+        if os.path.exists(part_path):
+            with open(part_path, 'r', encoding='utf-8') as part_file:
+                text_parts.append(part_file.read())
+    text = ''.join(text_parts)
+    metadata = metadata or unknown_metadata()
+    metadata['DOI'] = find_doi_in_text(text)
+    result = {'Metadata': metadata, 'Output File': '', 'Pages': pages, 'Seconds': seconds}
+    try:
+        result['Output File'] = write_text_output(output_directory, serial_number, metadata, text)
+        for start in starts:
+            part_path = page_part_path(output_directory, serial_number, start)
+            if os.path.exists(part_path):
+                os.remove(part_path)
+    except Exception as e:
+        logging.error(f"Error writing output for {pdf_path} (Serial {serial_number}): {e}")
+        error = error or str(e)
+    result['Seconds'] += time.perf_counter() - started
+    return serial_number, pdf_path, result, error
+
+def list_pdf_files(pdf_directory):
+    """
+    Lists the PDF files in a directory in a stable order, so serial numbers are reproducible.
+    """
+    return sorted(f for f in os.listdir(pdf_directory) if f.endswith('.pdf'))
+
+def file_sha256(file_path, block_size=1 << 20):
+    """
+    Computes the SHA-256 hash of a file's content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(manifest_path):
+    """
+    Loads the extraction manifest, a JSON Lines journal with one entry appended per finished PDF.
+    Later entries for the same serial number replace earlier ones. A truncated last line left by
+    a crash is ignored. Returns a dictionary keyed by serial number.
+    """
+    manifest = {}
+    if not os.path.exists(manifest_path):
+        return manifest
+    with open(manifest_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            manifest[entry['Serial Number']] = entry
+    return manifest
+
+def save_manifest(manifest, manifest_path):
+    """
+    Rewrites the manifest with one line per serial number, replacing the old file atomically.
+    """
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        for serial_number in sorted(manifest):
+            file.write(json.dumps(manifest[serial_number]) + '\n')
+    os.replace(temp_path, manifest_path)
+
+def append_manifest_entry(manifest_file, entry):
+    """
+    Appends a finished entry to the manifest journal and flushes it, so a crash or Ctrl-C
+    never loses work that has already been written to the output directory.
+    """
+    manifest_file.write(json.dumps(entry) + '\n')
+    manifest_file.flush()
+
+def budget_is_larger(budget, recorded_budget):
+    """
+    Checks whether a task timeout or memory limit (None for no limit) is larger than the one a failure was recorded under.
+    """
+    if recorded_budget is None:
+        return False
+    return budget is None or budget > recorded_budget
+
+def is_finished(entry, output_directory, backend=DEFAULT_BACKEND, task_timeout=TASK_TIMEOUT_SECONDS, memory_limit=MEMORY_LIMIT_BYTES,
+                retry_failed=False):
+    """
+    Checks whether a manifest entry needs no further work: it was extracted with the same backend and
+    either failed, or succeeded and its text output file is still present.
+    A timeout or memory limit kill only counts as final while the budget it ran under is not raised,
+    and retry_failed treats every failure as unfinished.
+    """
+    if entry.get('Backend', DEFAULT_BACKEND) != backend:
+        return False
+    if entry['Status'] in FAILED_STATUSES:
+        if retry_failed:
+            return False
+        if entry['Status'] in FAILURE_BUDGETS:
+            # Entries from before budgets were recorded ran under the defaults
+            budget, default = (task_timeout, TASK_TIMEOUT_SECONDS) if entry['Status'] == 'Timeout' else (memory_limit, MEMORY_LIMIT_BYTES)
+            return not budget_is_larger(budget, entry.get(FAILURE_BUDGETS[entry['Status']], default))
+        return True
+    return entry['Status'] == 'Success' and os.path.exists(os.path.join(output_directory, entry['Output File']))
+
+def plan_extraction(pdf_directory, output_directory, manifest, backend=DEFAULT_BACKEND, task_timeout=TASK_TIMEOUT_SECONDS,
+                    memory_limit=MEMORY_LIMIT_BYTES, retry_failed=False):
+    """
+    Matches the PDFs in the input directory against the manifest.
+    Every file is first matched to the entry recorded under its own filename; only files without one
+    fall back to their content hash, and only to entries no file claimed by name, so a new copy of an
+    existing PDF never takes over the original's serial number.
+    A file whose size and modification time are unchanged is trusted without hashing.
+    Changed files keep their serial number, renamed files keep theirs, new files get the next free one.
+    Failed PDFs are planned again as is_finished() decides for the given budgets.
+    Returns (unchanged_entries, pending_entries, removed_entries), the last being the entries no file matched.
+    """
+    by_name = {entry['PDF File']: entry for entry in manifest.values()}
+    next_serial = max(manifest, default=0) + 1
+    unchanged, pending = [], []
+
+    # Match by filename first
+    matches = {}
+    for pdf_file in list_pdf_files(pdf_directory):
+        pdf_path = os.path.join(pdf_directory, pdf_file)
+        stat = os.stat(pdf_path)
+        entry = by_name.get(pdf_file)
+        if entry and entry['Size'] == stat.st_size and entry['MTime'] == stat.st_mtime:
+            sha256 = entry['SHA256']
+        else:
+            sha256 = file_sha256(pdf_path)
+        matches[pdf_file] = (stat, sha256, entry)
+    claimed = {entry['Serial Number'] for _, _, entry in matches.values() if entry}
+
+    # Then by content, for renamed files, among the entries left unclaimed
+    by_hash = {}
+    for entry in manifest.values():
+        if entry['Serial Number'] not in claimed:
+            by_hash.setdefault(entry['SHA256'], entry)
+    for pdf_file, (stat, sha256, entry) in matches.items():
+        if entry is None:
+            entry = by_hash.pop(sha256, None)
+            if entry:
+                claimed.add(entry['Serial Number'])
+
+        if entry and entry['SHA256'] == sha256 and is_finished(entry, output_directory, backend, task_timeout, memory_limit, retry_failed):
+            unchanged.append(dict(entry, **{'PDF File': pdf_file, 'Size': stat.st_size, 'MTime': stat.st_mtime}))
+            continue
+        if entry:
+            serial_number = entry['Serial Number']
+        else:
+            serial_number = next_serial
+            next_serial += 1
+        pending.append({
+            'Serial Number': serial_number,
+            'PDF File': pdf_file,
+            'SHA256': sha256,
+            'Size': stat.st_size,
+            'MTime': stat.st_mtime,
+            'Output File': entry['Output File'] if entry else '',
+            'Metadata': None,
+            'Backend': backend,
+            'Status': 'Pending',
+            'Error': None
+        })
+
+    removed = [entry for serial_number, entry in sorted(manifest.items()) if serial_number not in claimed]
+    return unchanged, pending, removed
+
+def remove_outputs(entries, output_directory):
+    """
+    Deletes the text output files of manifest entries whose PDF is no longer in the input directory,
+    so later stages stop reading them.
+    """
+    for entry in entries:
+        if entry.get('Output File'):
+            output_path = os.path.join(output_directory, entry['Output File'])
+            if os.path.exists(output_path):
+                os.remove(output_path)
+
+@traced()
+def process_pdfs_in_parallel(pdf_directory, output_directory, csv_file_path=None, error_csv_path=None, manifest_path=None, report_csv_path=None,
+                             pages_per_task=PAGES_PER_TASK, split_min_bytes=SPLIT_MIN_BYTES, task_timeout=TASK_TIMEOUT_SECONDS,
+                             memory_limit=MEMORY_LIMIT_BYTES, max_tasks_per_worker=MAX_TASKS_PER_WORKER, max_workers=None, max_in_flight=None,
+                             backend=DEFAULT_BACKEND, retry_failed=False):
+    """
+    Processes the PDFs in the directory in parallel, skipping those the manifest records as already
+    extracted from identical content. Each finished PDF is journaled to the manifest immediately,
+    so an interrupted run resumes where it stopped.
+
+    PDFs are submitted largest first. Those of at least split_min_bytes are page-counted by a worker
+    and, if they have more than pages_per_task pages, split into page-range tasks that jump the queue
+    and are reassembled in page order, so one huge document does not hold a single worker at the end of the run.
+
+    Every task runs under a SupervisedPool: a task exceeding task_timeout seconds or memory_limit bytes
+    is killed, its worker replaced, and the PDF recorded with a Timeout or MemoryLimit status, along with
+    the budget, so a later run with a larger budget tries it again. retry_failed retries every failed PDF.
+    Workers are recycled after max_tasks_per_worker tasks.
+
+    Tasks are submitted as a stream: at most max_in_flight (default twice max_workers, which defaults
+    to the CPU count) are queued or running at once. Workers write every output file themselves and
+    return only small status records, so parent memory stays flat however large the corpus is.
+
+    Text and metadata are read with the named backend from pdf_backends; changing it re-extracts every PDF.
+    Summary rows are streamed to csv_file_path, errors to error_csv_path and per-document page counts
+    and extraction times to report_csv_path. Returns the list of errors encountered, including earlier runs'.
+    """
+    if manifest_path is None:
+        manifest_path = os.path.join(output_directory, MANIFEST_FILENAME)
+    max_workers = max_workers or os.cpu_count() or 1
+    max_in_flight = max(max_in_flight or 2 * max_workers, 1)
+    manifest = load_manifest(manifest_path)
+    unchanged, pending, removed = plan_extraction(pdf_directory, output_directory, manifest, backend, task_timeout, memory_limit, retry_failed)
+    for entry in unchanged:
+        manifest[entry['Serial Number']] = entry
+    # PDFs removed from the input directory lose their text output; their entries are kept, marked
+    # 'Removed', so their serial numbers are never reused and a PDF that comes back gets its old one
+    newly_removed = [entry for entry in removed if entry['Status'] != 'Removed']
+    remove_outputs(newly_removed, output_directory)
+    for entry in newly_removed:
+        manifest[entry['Serial Number']] = dict(entry, **{'Status': 'Removed', 'Output File': '', 'Error': None})
+    save_manifest(manifest, manifest_path)
+    print(f"{len(unchanged)} PDFs unchanged, {len(pending)} to extract, {len(newly_removed)} removed.")
 
-def process_pdfs_in_parallel(pdf_directory, output_directory):
-    pdf_files = [f for f in os.listdir(pdf_directory) if f.endswith('.pdf')]
     errors = []
+    summary_file = open(csv_file_path, 'w', newline='', encoding='utf-8') if csv_file_path else None
+    report_file = open(report_csv_path, 'w', newline='', encoding='utf-8') if report_csv_path else None
+    error_file = None
+    manifest_file = open(manifest_path, 'a', encoding='utf-8')
+    try:
+        summary_writer = None
+        if summary_file:
+            summary_writer = csv.DictWriter(summary_file, fieldnames=SUMMARY_FIELDNAMES)
+            summary_writer.writeheader()
+        report_writer = None
+        if report_file:
+            report_writer = csv.DictWriter(report_file, fieldnames=REPORT_FIELDNAMES)
+            report_writer.writeheader()
+        error_writer = None
+
+        def record_result(entry):
+            nonlocal error_file, error_writer
+            metadata = entry['Metadata'] or unknown_metadata()
+            if summary_writer:
+                summary_writer.writerow(build_summary_record(entry['Serial Number'], entry['PDF File'], metadata, entry['Output File']))
+            if report_writer:
+                report_writer.writerow({
+                    'Serial Number': entry['Serial Number'],
+                    'PDF File': entry['PDF File'],
+                    'Pages': entry.get('Pages', ''),
+                    'Page Tasks': entry.get('Page Tasks', ''),
+                    'Extraction Seconds': round(entry.get('Extraction Seconds', 0.0), 3),
+                    'Status': entry['Status']
+                })
+            if entry['Error']:
+                errors.append((entry['Serial Number'], entry['PDF File'], entry['Error']))
+                if error_csv_path:
+                    if error_writer is None:
+                        # Only create the error log once there is something to record
+                        error_file = open(error_csv_path, 'w', newline='', encoding='utf-8')
+                        error_writer = csv.DictWriter(error_file, fieldnames=ERROR_FIELDNAMES)
+                        error_writer.writeheader()
+                    error_writer.writerow({'Serial Number': entry['Serial Number'], 'PDF File': entry['PDF File'],
+                                           'Status': entry['Status'], 'Error': entry['Error']})
+
+        def finish_entry(entry, result, error, page_tasks, status=None):
+            previous_output = entry['Output File']
+            entry.update({
+                'Output File': result['Output File'],
+                'Metadata': result['Metadata'],
+                'Pages': result['Pages'],
+                'Page Tasks': page_tasks,
+                'Extraction Seconds': result['Seconds'],
+                'Status': status or ('Error' if error else 'Success'),
+                'Error': error,
+                'Task Timeout': task_timeout,
+                'Memory Limit': memory_limit
+            })
+            if previous_output and previous_output != entry['Output File']:
+                # The author or year changed, so the old text file would duplicate this serial number
+                stale_path = os.path.join(output_directory, previous_output)
+                if os.path.exists(stale_path):
+                    os.remove(stale_path)
+            append_manifest_entry(manifest_file, entry)
+            record_result(entry)
+
+        for entry in unchanged:
+            record_result(entry)
+
+        # Largest documents first, so the tail of the run is made of small ones
+        initial_tasks = iter(sorted(pending, key=lambda item: item['Size'], reverse=True))
+        follow_up_tasks = deque()
+        task_to_entry = {}
+        splits = {}
 
-    with ProcessPoolExecutor(max_workers=12) as executor:
-        future_to_pdf = {
-            executor.submit(process_pdf, os.path.join(pdf_directory, pdf_file), idx + 1, output_directory): (idx + 1, pdf_file)
-            for idx, pdf_file in enumerate(pdf_files)
-        }
+        def submit_tasks():
+            # Keep at most max_in_flight tasks queued or running; follow-ups of started documents go first
+            while len(task_to_entry) < max_in_flight:
+                if follow_up_tasks:
+                    kind, entry, start, fn, args = follow_up_tasks.popleft()
+                    task_to_entry[pool.submit(fn, *args, front=True)] = (kind, entry, start)
+                    continue
+                entry = next(initial_tasks, None)
+                if entry is None:
+                    return
+                pdf_path = os.path.join(pdf_directory, entry['PDF File'])
+                if entry['Size'] >= split_min_bytes:
+                    task_to_entry[pool.submit(count_pdf_pages, pdf_path, backend)] = ('count', entry, None)
+                else:
+                    task_to_entry[pool.submit(process_pdf, pdf_path, entry['Serial Number'], output_directory, backend)] = ('document', entry, None)
 
-        for future in as_completed(future_to_pdf):
-            serial_number, pdf_file = future_to_pdf[future]
-            result = future.result()
-            if result[-1]:  # Check if there's an error (last element in result)
-                errors.append((serial_number, pdf_file, result[-1]))
+        with SupervisedPool(max_workers, task_timeout, memory_limit, max_tasks_per_worker) as pool:
+            submit_tasks()
+            for task_id, pool_status, value in pool.results():
+                kind, entry, start = task_to_entry.pop(task_id)
+                serial_number = entry['Serial Number']
+                pdf_path = os.path.join(pdf_directory, entry['PDF File'])
+                status = POOL_FAILURE_STATUSES.get(pool_status, 'Error') if pool_status != SUCCESS else None
+
+                if kind == 'count':
+                    if status:
+                        finish_entry(entry, failed_result(), value, 1, status)
+                    elif value and value > pages_per_task:
+                        ranges = page_ranges(value, pages_per_task)
+                        splits[serial_number] = {'Pages': value, 'Starts': [start for start, _ in ranges], 'Remaining': len(ranges),
+                                                 'Metadata': None, 'Error': None, 'Status': None, 'Seconds': 0.0}
+                        for start, stop in ranges:
+                            follow_up_tasks.append(('range', entry, start, extract_page_range, (pdf_path, serial_number, start, stop, output_directory, backend)))
+                    else:
+                        follow_up_tasks.append(('document', entry, None, process_pdf, (pdf_path, serial_number, output_directory, backend)))
+
+                elif kind == 'document':
+                    split = splits.pop(serial_number, None)
+                    if status:
+                        finish_entry(entry, failed_result(task_timeout if status == 'Timeout' else 0.0), value, 1, status)
+                    else:
+                        _, _, result, error = value
+                        finish_entry(entry, result, error, len(split['Starts']) if split else 1, split['Status'] if split else None)
+
+                else:
+                    split = splits[serial_number]
+                    split['Remaining'] -= 1
+                    if status:
+                        split['Error'] = split['Error'] or value
+                        split['Status'] = split['Status'] or status
+                    else:
+                        _, _, metadata, error, seconds = value
+                        split['Seconds'] += seconds
+                        if metadata is not None:
+                            split['Metadata'] = metadata
+                        split['Error'] = split['Error'] or error
+                    if split['Remaining'] == 0:
+                        # Reassembly also runs in a worker, so the parent never holds document text
+                        follow_up_tasks.append(('document', entry, None, assemble_split_document,
+                                                (pdf_path, serial_number, output_directory, split['Starts'], split['Metadata'],
+                                                 split['Pages'], split['Seconds'], split['Error'])))
+                submit_tasks()
+    finally:
+        manifest_file.close()
+        if summary_file:
+            summary_file.close()
+        if report_file:
+            report_file.close()
+        if error_file:
+            error_file.close()
 
     return errors
 
 def main():
-    pdf_directory = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/1 pdf input'
-    output_directory = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/2 text output'
+    parser = argparse.ArgumentParser(description='Extract text and metadata from a folder of PDFs.')
+    parser.add_argument('--pdf-directory', default='/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/1 pdf input')
+    parser.add_argument('--output-directory', default='/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/2 text output')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--max-in-flight', type=int, default=None, help='Tasks queued or running at once (default: twice the workers)')
+    parser.add_argument('--backend', default=DEFAULT_BACKEND, choices=available_backends(), help='PDF text extraction backend')
+    parser.add_argument('--timeout', type=float, default=TASK_TIMEOUT_SECONDS, help='Seconds a task may run before it is killed')
+    parser.add_argument('--memory-limit-mb', type=int, default=MEMORY_LIMIT_BYTES // (1024 * 1024), help='Memory a worker may use before it is killed')
+    parser.add_argument('--retry-failed', action='store_true', help='Extract PDFs that failed in earlier runs again')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.start_from_args(args)
+
+    pdf_directory = args.pdf_directory
+    output_directory = args.output_directory
     csv_file_path = os.path.join(output_directory, 'metadata_summary.csv')
+    error_csv_path = os.path.join(output_directory, 'error_log.csv')
+    report_csv_path = os.path.join(output_directory, 'extraction_report.csv')
 
     if not os.path.exists(output_directory):
         os.makedirs(output_directory)
 
-    errors = process_pdfs_in_parallel(pdf_directory, output_directory)
-
-    # Collect metadata for CSV
-    metadata_list = []
-    for idx, pdf_file in enumerate(os.listdir(pdf_directory)):
-        if pdf_file.endswith('.pdf'):
-            serial_number = idx + 1
-            pdf_path = os.path.join(pdf_directory, pdf_file)
-            text = extract_text_from_pdf(pdf_path, serial_number)[2]
-            metadata = extract_and_standardize_metadata(pdf_path, text)  # Pass both pdf_path and text
-            original_pdf_name = pdf_file
-            metadata_list.append({
-                'Serial Number': serial_number,
-                'Author': metadata['Author'],
-                'Year': metadata['Year'],
-                'DOI': metadata['DOI'],
-                'Original PDF Name': original_pdf_name
-           })
-
-    # Write metadata to CSV
-    with open(csv_file_path, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['Serial Number', 'Author', 'Year', 'DOI', 'Original PDF Name']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for metadata in metadata_list:
-            writer.writerow(metadata)
-
-    # Logging errors to CSV if any
+    # Summary, error and page count/timing rows are written as each document finishes
+    errors = process_pdfs_in_parallel(pdf_directory, output_directory, csv_file_path, error_csv_path, report_csv_path=report_csv_path,
+                                      task_timeout=args.timeout, memory_limit=args.memory_limit_mb * 1024 * 1024,
+                                      max_workers=args.workers, max_in_flight=args.max_in_flight, backend=args.backend,
+                                      retry_failed=args.retry_failed)
+
     if errors:
-        log_errors_to_csv(errors, os.path.join(output_directory, 'error_log.csv'))
         print("Errors logged to 'error_log.csv'")
     else:
-            print("No errors encountered.")
+        print("No errors encountered.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,338 @@
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import instrumentation
+from analysis_store import STORE_FILENAME
+
+DEFAULT_ROOT = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI'
+STATE_FILENAME = '.pipeline_state.json'
+CODE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# Folder and file paths are relative to the root unless absolute. Every stage's section is part of its cache
+# key; 'resources' (worker counts that do not change results) is not.
+DEFAULT_CONFIG = {
+    'paths': {
+        'pdf_input': '1 pdf input',
+        'text_output': '2 text output',
+        'processed_output': '3 processed output',
+        'topic_distribution': '4 topic distribution',
+        'topics_over_time': '6 topics over time',
+        'network_analysis': '7 network analysis',
+        'store': STORE_FILENAME,
+    },
+    'extract': {'backend': None},
+    'preprocess': {},
+    'lda': {'num_topics': 10, 'num_folds': 5, 'passes': 10, 'tolerance': None, 'max_passes': 50, 'cores': None, 'concurrent_folds': None},
+    'store': {},
+    'topics_over_time': {},
+    'topic_bubbles': {},
+    'network': {'min_probability': 0.0, 'weighting': 'binary'},
+    'dominant_topics': {},
+    'similarity_overview': {'order': 'dominance', 'resolution': 1000},
+    'similarity_index': {'method': 'auto'},
+    'resources': {'extract_workers': None, 'preprocess_workers': None},
+}
+
+def resolve_paths(config, root):
+    return {name: path if os.path.isabs(path) else os.path.join(root, path) for name, path in config['paths'].items()}
+
+def _headless():
+    import matplotlib
+    matplotlib.use('Agg')
+
+# Stage functions; each runs in a worker process with the full config and the resolved paths
+
+def run_extract(config, paths):
+    from pdf_text_extractor_with_metadata import process_pdfs_in_parallel
+    from pdf_backends import DEFAULT_BACKEND
+    output_directory = paths['text_output']
+    os.makedirs(output_directory, exist_ok=True)
+    errors = process_pdfs_in_parallel(paths['pdf_input'], output_directory,
+                                      os.path.join(output_directory, 'metadata_summary.csv'),
+                                      os.path.join(output_directory, 'error_log.csv'),
+                                      report_csv_path=os.path.join(output_directory, 'extraction_report.csv'),
+                                      max_workers=config['resources']['extract_workers'],
+                                      backend=config['extract']['backend'] or DEFAULT_BACKEND)
+    if errors:
+        print(f"{len(errors)} extraction errors logged to 'error_log.csv'")
+
+def run_preprocess(config, paths):
+    import subprocess
+    # The script's file name is not an importable module name, so its process pool workers could not
+    # unpickle its functions under spawn; run it through its own command line instead
+    command = [sys.executable, os.path.join(CODE_DIRECTORY, 'Pre-Processing_Script_LDASR-15Mar.py'),
+               '--input-folder', paths['text_output'], '--output-folder', paths['processed_output'],
+               # The pipeline owns the processed output folder, so texts whose PDF was removed are pruned from it
+               '--prune']
+    if config['resources']['preprocess_workers']:
+        command += ['--workers', str(config['resources']['preprocess_workers'])]
+    subprocess.run(command, check=True)
+
+def run_lda(config, paths):
+    import LDA_Script5
+    from token_cache import CACHE_DIRNAME
+    options = config['lda']
+    os.makedirs(paths['topic_distribution'], exist_ok=True)
+    processed_texts = LDA_Script5.load_processed_texts(paths['processed_output'])
+    average_coherence = LDA_Script5.perform_lda_and_save_distributions(
+        processed_texts, paths['topic_distribution'], num_topics=options['num_topics'], num_folds=options['num_folds'],
+        coherence_cache_path=os.path.join(paths['processed_output'], CACHE_DIRNAME, 'coherence_stats.npz'),
+        total_cores=options['cores'], concurrent_folds=options['concurrent_folds'],
+        passes=options['passes'], tolerance=options['tolerance'], max_passes=options['max_passes'])
+    LDA_Script5.save_lda_summary(paths['topic_distribution'], average_coherence)
+
+def run_store(config, paths):
+    from DataFrame_Network import build_merged_topic_data
+    build_merged_topic_data(os.path.join(paths['text_output'], 'metadata_summary.csv'), paths['topic_distribution'], paths['store'])
+
+def run_topics_over_time(config, paths):
+    _headless()
+    from TopicTime import plot_topics_over_time
+    plot_topics_over_time(os.path.join(paths['text_output'], 'metadata_summary.csv'), paths['topic_distribution'],
+                          paths['topics_over_time'], paths['store'], show=False)
+
+def run_topic_bubbles(config, paths):
+    _headless()
+    from TopicTime_Bubble import plot_topic_bubbles
+    plot_topic_bubbles(os.path.join(paths['text_output'], 'metadata_summary.csv'), paths['topic_distribution'],
+                       paths['topics_over_time'], paths['store'], show=False)
+
+def run_network(config, paths):
+    from NetworkAnalysis import analyse_topic_network
+    analyse_topic_network(os.path.join(paths['text_output'], 'metadata_summary.csv'), paths['topic_distribution'], paths['store'],
+                          paths['network_analysis'], config['network']['min_probability'], config['network']['weighting'])
+
+def run_dominant_topics(config, paths):
+    _headless()
+    from Barchart_Av_Dis import plot_dominant_topics
+    plot_dominant_topics(paths['topic_distribution'], os.path.join(paths['topic_distribution'], 'dominant_topics.png'))
+
+def run_similarity_overview(config, paths):
+    _headless()
+    from DocSimHeatmap import load_topic_distributions, plot_similarity_overview
+    options = config['similarity_overview']
+    plot_similarity_overview(load_topic_distributions(paths['topic_distribution']),
+                             os.path.join(paths['topic_distribution'], 'document_similarity_overview.png'),
+                             options['order'], options['resolution'])
+
+def run_similarity_index(config, paths):
+    from similarity_index import update_index
+    index, added, removed = update_index(os.path.join(paths['topic_distribution'], 'similarity_index.npz'), paths['topic_distribution'],
+                                         config['similarity_index']['method'])
+    print(f"{index.method} similarity index of {len(index)} documents ({added} added or updated, {removed} removed)")
+
+class Stage:
+    """
+    A pipeline stage: the function that runs it, the stages it depends on, the input files it reads
+    (glob patterns over the resolved paths), the modules whose code it runs, and the outputs that must
+    exist for a cached run to count. Its cache key hashes all of these, its config section and the keys
+    of the stages it depends on.
+    """
+
+    def __init__(self, name, function, depends_on=(), inputs=(), code=(), outputs=()):
+        self.name = name
+        self.function = function
+        self.depends_on = tuple(depends_on)
+        self.inputs = tuple(inputs)
+        self.code = ('pipeline.py',) + tuple(code)
+        self.outputs = tuple(outputs)
+
+STORE_CODE = ('analysis_store.py', 'topic_time_cube.py', 'topic_store.py')
+FOLD_OUTPUTS = ('topic_distribution', 'topic_distributions_fold_*.npz')
+
+STAGES = [
+    Stage('extract', run_extract, inputs=[('pdf_input', '*.pdf')],
+          code=['pdf_text_extractor_with_metadata.py', 'pdf_backends.py', 'supervised_pool.py'],
+          outputs=[('text_output', 'metadata_summary.csv')]),
+    Stage('preprocess', run_preprocess, ['extract'], inputs=[('text_output', '*.txt')],
+          code=['Pre-Processing_Script_LDASR-15Mar.py'], outputs=[('processed_output', '*.txt')]),
+    Stage('lda', run_lda, ['preprocess'], inputs=[('processed_output', '*.txt')],
+          code=['LDA_Script5.py', 'lda_training.py', 'topic_distributions.py', 'topic_store.py', 'coherence_cache.py', 'token_cache.py'],
+          outputs=[FOLD_OUTPUTS, ('topic_distribution', 'topic_keywords.csv')]),
+    Stage('store', run_store, ['extract', 'lda'], inputs=[('text_output', 'metadata_summary.csv'), FOLD_OUTPUTS],
+          code=('DataFrame_Network.py',) + STORE_CODE, outputs=[('store', ''), ('topic_distribution', 'merged_topic_data.csv')]),
+    Stage('topics_over_time', run_topics_over_time, ['store'], code=('TopicTime.py',) + STORE_CODE,
+          outputs=[('topics_over_time', 'topics_over_time.png')]),
+    Stage('topic_bubbles', run_topic_bubbles, ['store'], code=('TopicTime_Bubble.py',) + STORE_CODE,
+          outputs=[('topics_over_time', 'adjusted_topics_over_time_bubble.png')]),
+    Stage('network', run_network, ['store'], code=('NetworkAnalysis.py', 'topic_cooccurrence.py') + STORE_CODE,
+          outputs=[('network_analysis', 'networkanalysis.csv'), ('network_analysis', 'topic_cooccurrence_network.png')]),
+    Stage('dominant_topics', run_dominant_topics, ['lda'], inputs=[FOLD_OUTPUTS, ('topic_distribution', 'topic_words_fold_*.npz')],
+          code=['Barchart_Av_Dis.py', 'topic_alignment.py', 'topic_store.py', 'doc_similarity.py'],
+          outputs=[('topic_distribution', 'dominant_topics.png')]),
+    Stage('similarity_overview', run_similarity_overview, ['lda'], inputs=[FOLD_OUTPUTS],
+          code=['DocSimHeatmap.py', 'doc_similarity.py', 'topic_store.py'],
+          outputs=[('topic_distribution', 'document_similarity_overview.png')]),
+    Stage('similarity_index', run_similarity_index, ['lda'], inputs=[FOLD_OUTPUTS],
+          code=['similarity_index.py', 'doc_similarity.py', 'topic_store.py'],
+          outputs=[('topic_distribution', 'similarity_index.npz')]),
+]
+
+class PipelineState:
+    """
+    The cache keys of the last successful run of every stage, and the content hashes of the files
+    read so far, kept by (size, mtime) so unchanged files are not read again.
+    Saved as JSON in the root folder after every finished stage.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.stages, self.files = {}, {}
+        if os.path.exists(file_path):
+            with open(file_path, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+            self.stages, self.files = state['stages'], state['files']
+
+    def file_hash(self, path):
+        stat = os.stat(path)
+        cached = self.files.get(path)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        self.files[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def save(self):
+        # Forget the hashes of files that have since been deleted
+        self.files = {path: signature for path, signature in self.files.items() if os.path.exists(path)}
+        temp_path = self.file_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'stages': self.stages, 'files': self.files}, file, indent=1)
+        os.replace(temp_path, self.file_path)
+
+def expand(paths, path_name, pattern):
+    base = paths[path_name]
+    return sorted(path for path in glob.glob(os.path.join(glob.escape(base), pattern)) if os.path.isfile(path)) if pattern else [base]
+
+def stage_key(stage, config, paths, state, upstream_keys):
+    digest = hashlib.sha256(stage.name.encode('utf-8'))
+    digest.update(json.dumps([config['paths'], config.get(stage.name, {})], sort_keys=True).encode('utf-8'))
+    for name in stage.depends_on:
+        digest.update(upstream_keys[name].encode('utf-8'))
+    for module in stage.code:
+        digest.update(state.file_hash(os.path.join(CODE_DIRECTORY, module)).encode('utf-8'))
+    for path_name, pattern in stage.inputs:
+        for path in expand(paths, path_name, pattern):
+            digest.update(os.path.relpath(path, paths[path_name]).encode('utf-8'))
+            digest.update(state.file_hash(path).encode('utf-8'))
+    return digest.hexdigest()
+
+def outputs_exist(stage, paths):
+    return all(any(os.path.exists(path) for path in expand(paths, path_name, pattern)) for path_name, pattern in stage.outputs)
+
+def select_stages(targets):
+    """
+    Returns the stages needed for the target stages (all when none are given), in pipeline order.
+    """
+    by_name = {stage.name: stage for stage in STAGES}
+    if not targets:
+        return list(STAGES)
+    needed = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in by_name:
+            raise ValueError(f"Unknown stage: {name} (stages: {', '.join(by_name)})")
+        if name not in needed:
+            needed.add(name)
+            pending.extend(by_name[name].depends_on)
+    return [stage for stage in STAGES if stage.name in needed]
+
+def _run_stage(stage_name, config, paths):
+    started = time.perf_counter()
+    with instrumentation.stage(stage_name):
+        next(stage for stage in STAGES if stage.name == stage_name).function(config, paths)
+    return time.perf_counter() - started
+
+def run_pipeline(config, root, targets=None, force=(), jobs=None, dry_run=False):
+    """
+    Runs the selected stages and the stages they depend on. A stage is skipped when its cache key
+    matches the last successful run and its outputs exist; otherwise it runs, and so does everything
+    downstream of it. Stages whose dependencies are done run in parallel, up to jobs at a time.
+    Returns the names of the stages that failed.
+    """
+    paths = resolve_paths(config, root)
+    state = PipelineState(os.path.join(root, STATE_FILENAME))
+    stages = select_stages(targets)
+    pending = {stage.name: stage for stage in stages}
+    keys, failed, running = {}, [], {}
+
+    with ProcessPoolExecutor(max_workers=jobs or max(1, min(4, os.cpu_count() or 1))) as executor:
+        while pending or running:
+            # Start every stage whose dependencies are done; a stage's key is computed only then, once its inputs are final
+            ready = [stage for stage in pending.values() if all(name in keys or name in failed for name in stage.depends_on)]
+            for stage in ready:
+                del pending[stage.name]
+                if any(name in failed for name in stage.depends_on):
+                    print(f"[{stage.name}] not run: a stage it depends on failed")
+                    failed.append(stage.name)
+                    continue
+                key = stage_key(stage, config, paths, state, keys)
+                cached = stage.name not in force and state.stages.get(stage.name, {}).get('key') == key and outputs_exist(stage, paths)
+                if cached or dry_run:
+                    print(f"[{stage.name}] {'up to date' if cached else 'would run'}")
+                    # In a dry run, stages downstream of one that would run get a key that cannot match either
+                    keys[stage.name] = key if cached else 'changed:' + key
+                    continue
+                print(f"[{stage.name}] running")
+                running[executor.submit(_run_stage, stage.name, config, paths)] = (stage.name, key)
+            if ready and not running:
+                continue
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, key = running.pop(future)
+                try:
+                    seconds = future.result()
+                except Exception as error:
+                    print(f"[{name}] failed: {error!r}")
+                    failed.append(name)
+                    state.stages.pop(name, None)
+                    continue
+                print(f"[{name}] done in {seconds:.1f}s")
+                keys[name] = key
+                state.stages[name] = {'key': key, 'seconds': round(seconds, 3)}
+            state.save()
+    state.save()
+    return failed
+
+def load_config(config_path=None):
+    """
+    Returns the default config, updated section by section from a JSON file if given.
+    """
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    if config_path:
+        with open(config_path, 'r', encoding='utf-8') as file:
+            for section, values in json.load(file).items():
+                config.setdefault(section, {}).update(values)
+    return config
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the extraction, pre-processing, LDA and analysis stages, skipping those whose inputs are unchanged.')
+    parser.add_argument('stages', nargs='*', help=f"Stages to bring up to date, with the stages they depend on (default: all). Stages: {', '.join(stage.name for stage in STAGES)}")
+    parser.add_argument('--root', default=DEFAULT_ROOT, help='Folder the configured paths are relative to')
+    parser.add_argument('--config', default=None, help='JSON file overriding sections of the default config (paths, stage parameters, resources)')
+    parser.add_argument('--force', nargs='*', default=[], help='Stages to rerun even if cached')
+    parser.add_argument('--jobs', type=int, default=None, help='Stages to run at once (default: up to 4)')
+    parser.add_argument('--dry-run', action='store_true', help='Only report which stages are up to date')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.start_from_args(args)
+
+    failed = run_pipeline(load_config(args.config), args.root, args.stages, args.force, args.jobs, args.dry_run)
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
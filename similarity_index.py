@@ -0,0 +1,264 @@
+import os
+import time
+import argparse
+import numpy as np
+
+from doc_similarity import normalize_rows
+from topic_store import load_fold_distributions
+
+# Up to this many documents queries scan every vector; above it, random-projection LSH picks candidates
+EXACT_MAX_DOCUMENTS = 100000
+NUM_TABLES = 8
+NUM_BITS = 16
+# Most candidates an LSH query scores exactly
+MAX_CANDIDATES = 20000
+
+def last_occurrences(keys):
+    """
+    Returns the positions of the last occurrence of every distinct key, in order, so a key given twice
+    is indexed once, with its later vector.
+    """
+    last = {key: position for position, key in enumerate(keys)}
+    return sorted(last.values())
+
+class SimilarityIndex:
+    """
+    A persisted nearest-neighbour index over document-topic vectors, keyed by document (filename).
+
+    Exact indexes score a query against every normalised vector. LSH indexes hash the vectors with
+    random hyperplanes into several tables, take the documents sharing a bucket with the query (or a
+    bucket one bit away) as candidates, and score only those exactly, up to MAX_CANDIDATES of them,
+    preferring those that collide in the most tables. If that yields fewer than k documents the query
+    falls back to an exact scan. Documents can be added or re-scored in
+    place with add(), which hashes only the new vectors, and dropped with remove().
+    """
+
+    def __init__(self, keys, vectors, method, planes=None, thresholds=None, codes=None):
+        self.keys = np.asarray(keys, dtype=object)
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.method = method
+        self.thresholds = thresholds
+        self.planes = planes
+        self.codes = codes
+        self._positions = {key: position for position, key in enumerate(self.keys)}
+        self._buckets = None
+        self.max_candidates = MAX_CANDIDATES
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def build(cls, keys, vectors, method='auto', num_tables=NUM_TABLES, num_bits=NUM_BITS, seed=0):
+        """
+        Builds an index; method 'auto' picks 'exact' up to EXACT_MAX_DOCUMENTS documents and 'lsh' above.
+        A key given more than once keeps its last vector.
+        """
+        rows = last_occurrences(keys)
+        keys = [keys[row] for row in rows]
+        unit = normalize_rows(np.asarray(vectors)[rows])
+        if method == 'auto':
+            method = 'exact' if len(unit) <= EXACT_MAX_DOCUMENTS else 'lsh'
+        if method == 'exact':
+            return cls(keys, unit, 'exact')
+        planes = np.random.default_rng(seed).standard_normal((num_tables, num_bits, unit.shape[1])).astype(np.float32)
+        # Each hyperplane is offset to the median projection of the vectors, so every bit splits them in half.
+        # Topic vectors crowd around the simplex corners, and hyperplanes through the origin leave most buckets empty.
+        thresholds = np.median(np.einsum('tbk,nk->tbn', planes, unit[::max(1, len(unit) // 10000)]), axis=2)
+        index = cls(keys, unit, 'lsh', planes, thresholds)
+        index.codes = index._hash(unit)
+        return index
+
+    def _hash(self, unit):
+        """
+        Returns the bucket code of every vector in every table, as a tables x vectors array.
+        """
+        bits = np.einsum('tbk,nk->tnb', self.planes, unit) > self.thresholds[:, None, :]
+        return bits.astype(np.int64) @ (1 << np.arange(self.planes.shape[1], dtype=np.int64))
+
+    def _get_buckets(self):
+        """
+        Builds (once per change) each table's documents sorted by bucket code, for binary-search lookups.
+        """
+        if self._buckets is None:
+            orders = np.argsort(self.codes, axis=1, kind='stable')
+            self._buckets = (orders, np.take_along_axis(self.codes, orders, axis=1))
+        return self._buckets
+
+    def add(self, keys, vectors):
+        """
+        Adds documents, or replaces the vectors of documents already in the index.
+        A key given more than once keeps its last vector.
+        """
+        rows = last_occurrences(keys)
+        keys = [keys[row] for row in rows]
+        unit = normalize_rows(np.asarray(vectors)[rows])
+        if len(self.keys) and unit.shape[1] != self.vectors.shape[1]:
+            raise ValueError(f'Vectors have {unit.shape[1]} topics but the index has {self.vectors.shape[1]}; rebuild the index')
+        positions = np.array([self._positions.get(key, -1) for key in keys], dtype=np.int64)
+        existing = positions >= 0
+        self.vectors[positions[existing]] = unit[existing]
+        new_keys = [key for key, is_existing in zip(keys, existing) if not is_existing]
+        for key in new_keys:
+            self._positions[key] = len(self._positions)
+        self.keys = np.concatenate([self.keys, np.asarray(new_keys, dtype=object)])
+        self.vectors = np.concatenate([self.vectors, unit[~existing]])
+        if self.method == 'lsh':
+            codes = self._hash(unit)
+            self.codes[:, positions[existing]] = codes[:, existing]
+            self.codes = np.concatenate([self.codes, codes[:, ~existing]], axis=1)
+            self._buckets = None
+
+    def remove(self, keys):
+        """
+        Drops documents from the index.
+        """
+        keep = np.ones(len(self.keys), dtype=bool)
+        keep[[self._positions[key] for key in keys]] = False
+        self.keys = self.keys[keep]
+        self.vectors = self.vectors[keep]
+        self._positions = {key: position for position, key in enumerate(self.keys)}
+        if self.method == 'lsh':
+            self.codes = self.codes[:, keep]
+            self._buckets = None
+
+    def _candidates(self, unit_query):
+        """
+        Returns the positions of the documents sharing a bucket, or a bucket one bit away, with the query
+        in any table; beyond max_candidates, those sharing buckets in the most tables.
+        """
+        orders, sorted_codes = self._get_buckets()
+        codes = self._hash(unit_query[None, :])[:, 0]
+        probes = codes[:, None] ^ np.concatenate(([0], 1 << np.arange(self.planes.shape[1], dtype=np.int64)))[None, :]
+        candidates = []
+        for table, table_probes in enumerate(probes):
+            starts = np.searchsorted(sorted_codes[table], table_probes, side='left')
+            stops = np.searchsorted(sorted_codes[table], table_probes, side='right')
+            candidates.extend(orders[table][start:stop] for start, stop in zip(starts, stops) if stop > start)
+        if not candidates:
+            return np.zeros(0, dtype=np.int64)
+        collisions = np.bincount(np.concatenate(candidates), minlength=len(self.keys))
+        positions = np.flatnonzero(collisions)
+        if len(positions) > self.max_candidates:
+            positions = positions[np.argpartition(-collisions[positions], self.max_candidates - 1)[:self.max_candidates]]
+        return positions
+
+    def query(self, vector, k=10, exclude=None):
+        """
+        Returns the k documents most similar to a topic vector as a list of (key, cosine similarity),
+        most similar first, leaving out the document at position exclude if given.
+        """
+        unit_query = normalize_rows(np.asarray(vector, dtype=np.float32)[None, :])[0]
+        positions = self._candidates(unit_query) if self.method == 'lsh' else None
+        if positions is not None and exclude is not None:
+            positions = positions[positions != exclude]
+        if positions is None or len(positions) < k:
+            positions = np.arange(len(self.keys))
+            if exclude is not None:
+                positions = np.delete(positions, exclude)
+        scores = self.vectors[positions] @ unit_query
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(self.keys[positions[i]], float(scores[i])) for i in top]
+
+    def query_key(self, key, k=10):
+        """
+        Returns the k documents most similar to a document in the index, excluding the document itself.
+        """
+        position = self._positions.get(key)
+        if position is None:
+            raise ValueError(f'{key!r} is not in the similarity index')
+        return self.query(self.vectors[position], k, exclude=position)
+
+    def save(self, file_path):
+        arrays = {'keys': np.asarray(self.keys, dtype=str), 'vectors': self.vectors, 'method': np.array(self.method)}
+        if self.method == 'lsh':
+            arrays.update(planes=self.planes, thresholds=self.thresholds, codes=self.codes)
+        temp_path = file_path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            np.savez(file, **arrays)
+        os.replace(temp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        with np.load(file_path) as data:
+            method = str(data['method'])
+            lsh = {name: data[name] for name in ('planes', 'thresholds', 'codes')} if method == 'lsh' else {}
+            return cls(data['keys'].astype(object), data['vectors'], method, **lsh)
+
+def load_scored_documents(folder_path):
+    """
+    Returns (keys, vectors) for every document in the fold topic distribution outputs of a folder.
+    Documents are keyed by filename, or by 'fold N/document ID' where no filenames were recorded.
+    """
+    keys, vectors = [], []
+    for fold, data in load_fold_distributions(folder_path):
+        if data['filenames'] is not None:
+            keys.extend(data['filenames'])
+        else:
+            keys.extend(f'fold {fold}/{document_id}' for document_id in data['document_ids'])
+        vectors.append(data['distributions'])
+    return keys, (np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32))
+
+def update_index(index_path, folder_path, method='auto'):
+    """
+    Builds the index for a folder's topic distributions, or, when an index already exists, adds the
+    documents that are new or whose topic vectors changed since it was built and drops those no longer
+    in the folder. An index over a different number of topics is rebuilt.
+    Returns (index, documents added or updated, documents removed).
+    """
+    keys, vectors = load_scored_documents(folder_path)
+    index = SimilarityIndex.load(index_path) if os.path.exists(index_path) else None
+    if index is None or index.vectors.shape[1] != vectors.shape[1]:
+        removed = 0 if index is None else len(set(index.keys) - set(keys))
+        index = SimilarityIndex.build(keys, vectors, method)
+        index.save(index_path)
+        return index, len(keys), removed
+    current = set(keys)
+    removed = [key for key in index.keys if key not in current]
+    if removed:
+        index.remove(removed)
+    unit = normalize_rows(vectors)
+    positions = np.array([index._positions.get(key, -1) for key in keys], dtype=np.int64)
+    changed = positions < 0
+    changed[~changed] = ~np.isclose(index.vectors[positions[~changed]], unit[~changed], atol=1e-6).all(axis=1)
+    if changed.any():
+        index.add([key for key, is_changed in zip(keys, changed) if is_changed], vectors[changed])
+    if removed or changed.any():
+        index.save(index_path)
+    return index, int(changed.sum()), len(removed)
+
+def main():
+    topic_dist_folder = '/Users/andy/Documents/Systemic Review LDA Analysis 2024/SLR-LDA-HF-AI/4 topic distribution'
+    parser = argparse.ArgumentParser(description='Find the papers most similar to a paper by their topic distributions.')
+    parser.add_argument('--folder', default=topic_dist_folder, help='Folder with the topic_distributions_fold_N outputs')
+    parser.add_argument('--index', default=None, help='Index file (default: similarity_index.npz in the folder)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='Build the index, or add newly scored documents to it')
+    build_parser.add_argument('--method', choices=['auto', 'exact', 'lsh'], default='auto')
+    build_parser.add_argument('--rebuild', action='store_true', help='Discard the existing index first')
+    query_parser = subparsers.add_parser('query', help='List the documents most similar to a document')
+    query_parser.add_argument('document', help='Filename of the document')
+    query_parser.add_argument('-k', type=int, default=10)
+    args = parser.parse_args()
+
+    index_path = args.index or os.path.join(args.folder, 'similarity_index.npz')
+    if args.command == 'build':
+        if args.rebuild and os.path.exists(index_path):
+            os.remove(index_path)
+        index, added, removed = update_index(index_path, args.folder, args.method)
+        print(f'{index.method} index of {len(index)} documents ({added} added or updated, {removed} removed) saved to {index_path}')
+        return
+
+    index = SimilarityIndex.load(index_path)
+    started = time.perf_counter()
+    try:
+        results = index.query_key(args.document, args.k)
+    except ValueError as error:
+        parser.error(str(error))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    for rank, (key, score) in enumerate(results, start=1):
+        print(f'{rank:>3}  {score:.4f}  {key}')
+    print(f'({elapsed_ms:.1f} ms)')
+
+if __name__ == '__main__':
+    main()
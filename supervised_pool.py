@@ -0,0 +1,205 @@
+import os
+import sys
+import time
+import signal
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+
+# psutil is optional; without it worker memory is read from /proc where available
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Task outcomes yielded by SupervisedPool.results()
+SUCCESS = 'Success'
+FAILED = 'Failed'
+TIMEOUT = 'Timeout'
+MEMORY_LIMIT = 'MemoryLimit'
+CRASHED = 'Crashed'
+
+def get_rss_bytes(pid):
+    """
+    Returns the resident set size of a process in bytes, or None if it cannot be measured on this platform.
+    """
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f'/proc/{pid}/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def peak_rss_bytes():
+    """
+    Returns this process's peak resident set size in bytes (ru_maxrss is in kilobytes on Linux, bytes on macOS).
+    """
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _worker_loop(conn):
+    """
+    Runs tasks received over the pipe until the None sentinel arrives. Ctrl-C is left to the
+    supervisor, which terminates its workers itself.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        task_id, fn, args = task
+        try:
+            conn.send((task_id, SUCCESS, fn(*args)))
+        except Exception as e:
+            conn.send((task_id, FAILED, f"{type(e).__name__}: {e}"))
+    conn.close()
+
+class SupervisedPool:
+    """
+    A process pool whose supervisor enforces a wall-clock and memory budget per task.
+    A worker that exceeds either budget is killed and replaced, so one pathological input cannot
+    stall the pool. Workers are also retired after max_tasks_per_worker tasks to cap leaked memory.
+
+    Tasks are submitted with submit() and collected with results(), which yields
+    (task_id, status, value) as tasks finish: value is the return value for SUCCESS and
+    an error message for every other status.
+    """
+
+    def __init__(self, max_workers, task_timeout=None, memory_limit=None, max_tasks_per_worker=None, poll_interval=0.5):
+        self.max_workers = max_workers
+        self.task_timeout = task_timeout
+        self.memory_limit = memory_limit
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.poll_interval = poll_interval
+        self._context = multiprocessing.get_context()
+        self._queue = deque()
+        self._workers = []
+        self._next_task_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown(cancel=exc_type is not None)
+
+    def submit(self, fn, *args, front=False):
+        """
+        Queues fn(*args) and returns its task id. Tasks with front=True jump the queue.
+        """
+        task_id = self._next_task_id
+        self._next_task_id += 1
+        if front:
+            self._queue.appendleft((task_id, fn, args))
+        else:
+            self._queue.append((task_id, fn, args))
+        return task_id
+
+    def _spawn(self):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_loop, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        worker = {'process': process, 'conn': parent_conn, 'task': None, 'started': None, 'completed': 0}
+        self._workers.append(worker)
+        return worker
+
+    def _retire(self, worker, kill=False):
+        """
+        Stops a worker, gracefully after its current task or immediately if kill is set.
+        """
+        self._workers.remove(worker)
+        process = worker['process']
+        if not kill:
+            try:
+                worker['conn'].send(None)
+            except OSError:
+                pass
+            process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=1)
+        if process.is_alive():
+            process.kill()
+            process.join()
+        worker['conn'].close()
+
+    def _assign(self):
+        """
+        Hands queued tasks to idle workers, spawning workers up to max_workers.
+        """
+        idle = [worker for worker in self._workers if worker['task'] is None]
+        while self._queue:
+            if idle:
+                worker = idle.pop()
+            elif len(self._workers) < self.max_workers:
+                worker = self._spawn()
+            else:
+                break
+            task = self._queue.popleft()
+            worker['conn'].send(task)
+            worker['task'] = task[0]
+            worker['started'] = time.monotonic()
+
+    def _poll(self):
+        """
+        Waits up to poll_interval for results, then enforces the budgets on running tasks.
+        Returns the (task_id, status, value) tuples that finished in this round.
+        """
+        finished = []
+        busy = [worker for worker in self._workers if worker['task'] is not None]
+        ready = wait([worker['conn'] for worker in busy], timeout=self.poll_interval)
+        for worker in busy:
+            if worker['conn'] not in ready:
+                continue
+            task_id = worker['task']
+            try:
+                finished.append(worker['conn'].recv())
+            except (EOFError, OSError):
+                self._retire(worker, kill=True)
+                finished.append((task_id, CRASHED, f"Worker exited with code {worker['process'].exitcode}"))
+                continue
+            worker['task'] = None
+            worker['completed'] += 1
+            if self.max_tasks_per_worker and worker['completed'] >= self.max_tasks_per_worker:
+                self._retire(worker)
+
+        now = time.monotonic()
+        for worker in busy:
+            if worker['task'] is None or worker not in self._workers:
+                continue
+            if self.task_timeout and now - worker['started'] > self.task_timeout:
+                finished.append((worker['task'], TIMEOUT, f"Timed out after {self.task_timeout} seconds"))
+                self._retire(worker, kill=True)
+                continue
+            if self.memory_limit:
+                rss = get_rss_bytes(worker['process'].pid)
+                if rss is not None and rss > self.memory_limit:
+                    finished.append((worker['task'], MEMORY_LIMIT, f"Exceeded memory limit of {self.memory_limit // (1024 * 1024)} MB"))
+                    self._retire(worker, kill=True)
+        return finished
+
+    def results(self):
+        """
+        Yields (task_id, status, value) for every submitted task as it finishes, including tasks
+        submitted while iterating, until the queue is empty and no task is running.
+        """
+        while self._queue or any(worker['task'] is not None for worker in self._workers):
+            self._assign()
+            yield from self._poll()
+
+    def shutdown(self, cancel=False):
+        """
+        Stops all workers. With cancel set, queued tasks are dropped and running ones killed.
+        """
+        if cancel:
+            self._queue.clear()
+        for worker in list(self._workers):
+            self._retire(worker, kill=cancel)
@@ -0,0 +1,144 @@
+import os
+import random
+import numpy as np
+
+# Vocabulary for synthetic documents, loosely drawn from the review's subject area
+VOCABULARY = [
+    'human', 'factors', 'artificial', 'intelligence', 'system', 'design', 'evaluation', 'user', 'interaction',
+    'trust', 'automation', 'workload', 'decision', 'support', 'model', 'learning', 'data', 'analysis', 'health',
+    'clinical', 'performance', 'cognitive', 'operator', 'interface', 'safety', 'risk', 'machine', 'network',
+    'image', 'classification', 'accuracy', 'participants', 'study', 'results', 'method', 'framework', 'process',
+    'organisation', 'management', 'algorithm', 'problem', 'solving', 'environment', 'social', 'technology',
+    'research', 'transparency', 'explanation', 'usability', 'experience', 'team', 'collaboration', 'training',
+    'patient', 'diagnosis', 'prediction', 'sensor', 'smart', 'monitoring', 'behaviour', 'attention', 'error',
+]
+
+LINES_PER_PAGE = 40
+WORDS_PER_LINE = 12
+
+def escape_pdf_text(text):
+    """
+    Escapes backslashes and parentheses for use in a PDF string literal.
+    """
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def random_sentence(rng, words):
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(words))
+
+def write_pdf(pdf_path, page_lines, title, author, creation_date):
+    """
+    Writes a minimal, valid PDF with one Helvetica text line per entry of each page in page_lines
+    and a document information dictionary holding the title, author and creation date.
+    """
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        4: f"<< /Title ({escape_pdf_text(title)}) /Author ({escape_pdf_text(author)}) /CreationDate ({creation_date}) >>".encode('latin-1'),
+    }
+    kids = []
+    for index, lines in enumerate(page_lines):
+        page_id, content_id = 5 + 2 * index, 6 + 2 * index
+        kids.append(f"{page_id} 0 R")
+        stream = "BT /F1 9 Tf 11 TL 50 760 Td " + ' '.join(f"({escape_pdf_text(line)}) Tj T*" for line in lines) + " ET"
+        stream = stream.encode('latin-1')
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>").encode('latin-1')
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode('latin-1')
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += f"{object_id} 0 obj\n".encode('latin-1') + objects[object_id] + b"\nendobj\n"
+    xref_offset = len(output)
+    size = max(objects) + 1
+    output += f"xref\n0 {size}\n0000000000 65535 f \n".encode('latin-1')
+    for object_id in range(1, size):
+        output += f"{offsets[object_id]:010d} 00000 n \n".encode('latin-1')
+    output += f"trailer\n<< /Size {size} /Root 1 0 R /Info 4 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode('latin-1')
+    with open(pdf_path, 'wb') as file:
+        file.write(output)
+
+def generate_pdf_corpus(output_directory, num_documents=50, min_pages=1, max_pages=30, seed=42):
+    """
+    Generates a deterministic corpus of synthetic PDFs with text, author, year and a DOI,
+    and returns their paths. The same arguments always produce byte-identical files.
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    rng = random.Random(seed)
+    pdf_paths = []
+    for index in range(num_documents):
+        pages = rng.randint(min_pages, max_pages)
+        year = rng.randint(2000, 2024)
+        page_lines = [[random_sentence(rng, WORDS_PER_LINE) for _ in range(LINES_PER_PAGE)] for _ in range(pages)]
+        page_lines[0][1] = f"doi:10.{1000 + index}/synthetic.{seed}.{index}"
+        pdf_path = os.path.join(output_directory, f"synthetic_{index:05d}.pdf")
+        write_pdf(pdf_path, page_lines, title=random_sentence(rng, 6).title(), author=f"Author{index}, A",
+                  creation_date=f"D:{year}0101000000")
+        pdf_paths.append(pdf_path)
+    return pdf_paths
+
+def topic_vocabularies(num_topics, seed=42):
+    """
+    Splits the vocabulary into num_topics overlapping word lists, one per synthetic topic.
+    """
+    rng = random.Random(seed)
+    words = list(VOCABULARY)
+    rng.shuffle(words)
+    size = max(len(words) // num_topics, 1)
+    return [words[topic * size:(topic + 1) * size] + rng.sample(words, max(size // 4, 1)) for topic in range(num_topics)]
+
+def split_artefacts(rng, word, artefact_rate):
+    """
+    Returns the word, split in two (as text extraction leaves some words) with probability artefact_rate.
+    """
+    if len(word) > 3 and rng.random() < artefact_rate:
+        cut = rng.randint(1, len(word) - 1)
+        return word[:cut] + ' ' + word[cut:]
+    return word
+
+def generate_text_corpus(output_directory, num_documents=50, min_words=500, max_words=5000, num_topics=10, artefact_rate=0.05, seed=42):
+    """
+    Generates a deterministic corpus of extractor-style text files (a metadata header, '---METADATA END---'
+    and the text) and returns their paths. Each document mixes a few of num_topics word lists, so LDA finds
+    structure in it, and artefact_rate of its words are split in two for merge_artefacts() to rejoin.
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    rng = random.Random(seed)
+    topics = topic_vocabularies(num_topics, seed)
+    text_paths = []
+    for index in range(num_documents):
+        year = rng.randint(2000, 2024)
+        weights = [rng.gammavariate(0.2, 1.0) + 1e-9 for _ in range(num_topics)]
+        document_topics = rng.choices(range(num_topics), weights=weights, k=rng.randint(min_words, max_words))
+        words = [split_artefacts(rng, rng.choice(topics[topic]), artefact_rate) for topic in document_topics]
+        lines = [' '.join(words[start:start + WORDS_PER_LINE]) for start in range(0, len(words), WORDS_PER_LINE)]
+        header = (f"Title: {random_sentence(rng, 6).title()}\nAuthor: Author{index}, A\nYear: {year}\n"
+                  f"DOI: 10.{1000 + index}/synthetic.{seed}.{index}\nKeywords: Unknown\nCreated: D:{year}0101000000\nModified: Unknown")
+        text_path = os.path.join(output_directory, f"{index + 1}-Author{index}-{year}.txt")
+        with open(text_path, 'w', encoding='utf-8') as file:
+            file.write(header + "\n\n---METADATA END---\n\n" + '\n'.join(lines))
+        text_paths.append(text_path)
+    return text_paths
+
+def generate_topic_distributions(output_folder, num_documents=1000, num_topics=10, num_folds=5, alpha=0.1, seed=42):
+    """
+    Generates deterministic per-fold topic distribution outputs (CSV and .npz, as the LDA scripts write them)
+    for num_documents documents split across num_folds folds, and returns the CSV paths.
+    Distributions are drawn from a symmetric Dirichlet(alpha), so most documents have a few dominant topics.
+    """
+    from topic_distributions import save_topic_distribution_outputs
+    os.makedirs(output_folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    distributions = rng.dirichlet(np.full(num_topics, alpha), size=num_documents).astype(np.float32)
+    years = rng.integers(2000, 2025, size=num_documents)
+    filenames = [f"{index + 1}-Author{index}-{year}.txt" for index, year in enumerate(years)]
+    fold_of = rng.permutation(num_documents) % num_folds
+    csv_paths = []
+    for fold in range(num_folds):
+        rows = np.flatnonzero(fold_of == fold)
+        csv_path = os.path.join(output_folder, f'topic_distributions_fold_{fold + 1}.csv')
+        save_topic_distribution_outputs(distributions[rows], csv_path, [filenames[row] for row in rows], minimum_probability=0.01)
+        csv_paths.append(csv_path)
+    return csv_paths
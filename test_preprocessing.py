@@ -0,0 +1,142 @@
+import os
+import sys
+import random
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+# The script's file name is not an importable module name
+spec = importlib.util.spec_from_file_location('preprocessing', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Pre-Processing_Script_LDASR-15Mar.py'))
+preprocessing = importlib.util.module_from_spec(spec)
+sys.modules['preprocessing'] = preprocessing  # So forked pool workers can unpickle its functions
+spec.loader.exec_module(preprocessing)
+
+# A small fixed vocabulary standing in for the NLTK word list, with words whose halves are words too
+VOCABULARY = frozenset([
+    'a', 'an', 'the', 'in', 'to', 'for', 'and', 'of', 'is', 'on', 'with', 'human', 'factors', 'artificial',
+    'intelligence', 'system', 'design', 'evaluation', 'user', 'interaction', 'trust', 'automation', 'work', 'load',
+    'workload', 'data', 'base', 'database', 'in', 'side', 'inside', 'out', 'come', 'outcome', 'over', 'view',
+    'overview', 'with', 'out', 'without', 'some', 'thing', 'something', 'can', 'not', 'cannot', 'any', 'one', 'anyone',
+])
+
+SAMPLE_TEXTS = [
+    '',
+    'the',
+    'work load is a human factors measure',
+    # Words split by line-end hyphenation and by extraction artefacts
+    'the data- base and the data base with work-\nload over view',
+    'artifi cial intelli gence in side the sys tem de sign',
+    # Chains of merges and merges that a longer word would swallow
+    'with out any one can not some thing in side out come',
+    'a a a an an the the the',
+    # Non-words, numbers, punctuation and mixed case
+    'Table 3 ( p < 0.05 ) shows TRUST and trust , et al. 2019 xyz qwv',
+    'évaluation naïve café user interaction – evaluation',
+]
+
+def reference_merge_artefacts(text, is_valid_word):
+    """
+    The original list-deleting implementation, kept as the reference for the single-pass rewrite.
+    """
+    words = text.split()
+    i = 0
+    while i < len(words) - 1:
+        if is_valid_word(words[i] + words[i + 1]):
+            words[i] = words[i] + words[i + 1]  # Merge the words
+            del words[i + 1]  # Remove the next word as it's merged
+        else:
+            i += 1
+
+    # Remove standalone non-words
+    words = [word for word in words if is_valid_word(word)]
+
+    return ' '.join(words)
+
+def reference_process_text(text, is_valid_word):
+    """
+    The original process_files() handling of one file's text: the metadata header is kept as is.
+    """
+    metadata_end_index = text.find('---METADATA END---')
+    if metadata_end_index != -1:
+        metadata = text[:metadata_end_index + len('---METADATA END---')].strip()
+        content = text[metadata_end_index + len('---METADATA END---'):].strip()
+    else:
+        metadata = ""
+        content = text
+    processed_content = reference_merge_artefacts(content, is_valid_word)
+    return metadata + '\n\n' + processed_content if metadata else processed_content
+
+@pytest.fixture(autouse=True)
+def fixed_vocabulary(monkeypatch):
+    monkeypatch.setattr(preprocessing, 'get_english_vocab', lambda cache_path=None: VOCABULARY)
+
+def is_valid_word(word):
+    return word in VOCABULARY
+
+@pytest.mark.parametrize('text', SAMPLE_TEXTS)
+def test_merge_artefacts_matches_reference(text):
+    assert preprocessing.merge_artefacts(text) == reference_merge_artefacts(text, is_valid_word)
+
+def test_merge_artefacts_matches_reference_on_random_token_sequences():
+    rng = random.Random(42)
+    # Word halves and non-words make merges and merge chains frequent
+    tokens = sorted(VOCABULARY) + ['lo', 'ad', 'bas', 'e', 'xq', 'de-', 'sign', 'in-', '42']
+    for _ in range(2000):
+        text = ' '.join(rng.choice(tokens) for _ in range(rng.randint(0, 40)))
+        assert preprocessing.merge_artefacts(text) == reference_merge_artefacts(text, is_valid_word)
+
+def write_sample_inputs(input_folder):
+    input_folder.mkdir()
+    texts = {}
+    for index, text in enumerate(SAMPLE_TEXTS):
+        header = f"Title: Paper {index}\nAuthor: Author{index}, A\nYear: 2020\nDOI: Unknown\n\n---METADATA END---\n\n"
+        # Every other file has a metadata header; those without are processed whole
+        texts[f'{index + 1}-Author{index}-2020.txt'] = header + text if index % 2 == 0 else text
+    for filename, text in texts.items():
+        (input_folder / filename).write_text(text, encoding='utf-8')
+    (input_folder / 'notes.csv').write_text('skipped', encoding='utf-8')
+    return texts
+
+def assert_outputs_match_reference(output_folder, texts):
+    assert sorted(os.listdir(output_folder)) == sorted(texts)
+    for filename, text in texts.items():
+        expected = reference_process_text(text, is_valid_word).encode('utf-8')
+        assert (output_folder / filename).read_bytes() == expected
+
+# Files are processed on a thread, so the patched vocabulary applies whatever the platform's start method
+def test_process_files_output_is_byte_identical(tmp_path):
+    input_folder, output_folder = tmp_path / 'input', tmp_path / 'output'
+    texts = write_sample_inputs(input_folder)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        preprocessing.process_files(str(input_folder), str(output_folder), executor=executor)
+
+    assert_outputs_match_reference(output_folder, texts)
+
+# Forked workers inherit the patched vocabulary and the registered module; spawned ones would get neither
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason="needs the 'fork' start method")
+def test_process_files_in_a_process_pool(tmp_path):
+    input_folder, output_folder = tmp_path / 'input', tmp_path / 'output'
+    texts = write_sample_inputs(input_folder)
+
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('fork')) as executor:
+        preprocessing.process_files(str(input_folder), str(output_folder), executor=executor)
+
+    assert_outputs_match_reference(output_folder, texts)
+
+def test_process_files_prunes_outputs_without_input_only_when_asked(tmp_path):
+    input_folder, output_folder = tmp_path / 'input', tmp_path / 'output'
+    input_folder.mkdir()
+    output_folder.mkdir()
+    (input_folder / '1-Author0-2020.txt').write_text('the work load', encoding='utf-8')
+    (output_folder / '2-Author1-2021.txt').write_text('the data base', encoding='utf-8')
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        preprocessing.process_files(str(input_folder), str(output_folder), executor=executor)
+    assert sorted(os.listdir(output_folder)) == ['1-Author0-2020.txt', '2-Author1-2021.txt']
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        preprocessing.process_files(str(input_folder), str(output_folder), executor=executor, prune=True)
+    assert sorted(os.listdir(output_folder)) == ['1-Author0-2020.txt']
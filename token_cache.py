@@ -0,0 +1,168 @@
+import os
+import json
+import hashlib
+import numpy as np
+from gensim.utils import simple_preprocess
+from instrumentation import traced
+
+CACHE_DIRNAME = '.token_cache'
+METADATA_MARKER = '---METADATA END---'
+# Bump when tokenization changes, so existing caches are rebuilt
+TOKENIZER_VERSION = 1
+
+def get_stop_words():
+    """
+    Returns the NLTK English stop words as a frozenset, for constant-time membership tests.
+    """
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words('english'))
+
+def read_document_text(file_path):
+    """
+    Reads a text file and returns only the text after the "---METADATA END---" marker.
+    """
+    with open(file_path, 'r', encoding='utf-8') as file:
+        _, _, text_after_metadata = file.read().partition(METADATA_MARKER)
+    return text_after_metadata.strip()
+
+def preprocess_text(text, stop_words):
+    """
+    Tokenizes a document with gensim's simple_preprocess and drops stop words.
+    """
+    return [word for word in simple_preprocess(text) if word not in stop_words]
+
+def file_sha256(file_path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def stop_words_sha256(stop_words):
+    return hashlib.sha256('\n'.join(sorted(stop_words)).encode('utf-8')).hexdigest()
+
+def list_text_files(folder_path):
+    return sorted(filename for filename in os.listdir(folder_path) if filename.endswith('.txt'))
+
+class TokenizedCorpus:
+    """
+    A tokenized corpus held as integer token ids in one flat array, with per-document offsets
+    into it, the vocabulary mapping ids back to words, and the source filenames.
+    """
+
+    def __init__(self, filenames, vocab, tokens, offsets):
+        self.filenames = filenames
+        self.vocab = vocab
+        self.tokens = tokens
+        self.offsets = offsets
+        self._vocab_array = np.array(vocab, dtype=object)
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def token_ids(self, index):
+        return self.tokens[self.offsets[index]:self.offsets[index + 1]]
+
+    def document(self, index):
+        return self._vocab_array[self.token_ids(index)].tolist()
+
+    def texts(self):
+        """
+        Returns every document as a list of words, in filename order.
+        """
+        return [self.document(index) for index in range(len(self))]
+
+def load_cache(cache_dir):
+    """
+    Loads a token cache with its arrays memory-mapped, or returns None if there is no complete cache.
+    """
+    index_path = os.path.join(cache_dir, 'index.json')
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, 'r', encoding='utf-8') as file:
+        index = json.load(file)
+    with open(os.path.join(cache_dir, 'vocab.txt'), 'r', encoding='utf-8') as file:
+        vocab = file.read().split('\n') if index['vocab_size'] else []
+    tokens = np.load(os.path.join(cache_dir, 'tokens.npy'), mmap_mode='r')
+    offsets = np.load(os.path.join(cache_dir, 'offsets.npy'), mmap_mode='r')
+    return index, TokenizedCorpus([entry['filename'] for entry in index['files']], vocab, tokens, offsets)
+
+def save_cache(cache_dir, index, corpus):
+    """
+    Writes the cache arrays and vocabulary, then the index last, so an interrupted write
+    leaves the previous index pointing at a complete cache or no index at all.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    index_path = os.path.join(cache_dir, 'index.json')
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    for name, array in (('tokens.npy', corpus.tokens), ('offsets.npy', corpus.offsets)):
+        temp_path = os.path.join(cache_dir, name + '.tmp')
+        with open(temp_path, 'wb') as file:
+            np.save(file, array)
+        os.replace(temp_path, os.path.join(cache_dir, name))
+    with open(os.path.join(cache_dir, 'vocab.txt'), 'w', encoding='utf-8') as file:
+        file.write('\n'.join(corpus.vocab))
+    index['vocab_size'] = len(corpus.vocab)
+    with open(index_path + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(index, file)
+    os.replace(index_path + '.tmp', index_path)
+
+@traced()
+def load_tokenized_corpus(folder_path, cache_dir=None, stop_words=None):
+    """
+    Returns the tokenized corpus for the .txt files in folder_path, served from a memory-mapped cache
+    (by default in a .token_cache folder inside folder_path). Files whose size and modification time
+    are unchanged are trusted; others are hashed, and only those whose content changed, plus new files,
+    are tokenized. Token ids of existing words stay stable across updates.
+    """
+    cache_dir = cache_dir or os.path.join(folder_path, CACHE_DIRNAME)
+    stop_words = get_stop_words() if stop_words is None else frozenset(stop_words)
+    stop_words_hash = stop_words_sha256(stop_words)
+
+    cached = load_cache(cache_dir)
+    if cached and (cached[0]['version'] != TOKENIZER_VERSION or cached[0]['stop_words_sha256'] != stop_words_hash):
+        cached = None
+    old_entries = {entry['filename']: (position, entry) for position, entry in enumerate(cached[0]['files'])} if cached else {}
+    old_corpus = cached[1] if cached else None
+
+    vocab = list(old_corpus.vocab) if old_corpus else []
+    word_ids = {word: token_id for token_id, word in enumerate(vocab)}
+    files, segments = [], []
+    changed = not cached
+    for filename in list_text_files(folder_path):
+        file_path = os.path.join(folder_path, filename)
+        stat = os.stat(file_path)
+        position, entry = old_entries.get(filename, (None, None))
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            sha256 = entry['sha256']
+        else:
+            sha256 = file_sha256(file_path)
+            changed = True
+        files.append({'filename': filename, 'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': sha256})
+        if entry and entry['sha256'] == sha256:
+            segments.append(old_corpus.token_ids(position))
+            continue
+        changed = True
+        words = preprocess_text(read_document_text(file_path), stop_words)
+        ids = []
+        for word in words:
+            token_id = word_ids.get(word)
+            if token_id is None:
+                token_id = word_ids[word] = len(vocab)
+                vocab.append(word)
+            ids.append(token_id)
+        segments.append(np.asarray(ids, dtype=np.int32))
+
+    if len(files) != len(old_entries):
+        changed = True
+    if not changed:
+        return old_corpus
+
+    lengths = np.array([len(segment) for segment in segments], dtype=np.int64)
+    offsets = np.zeros(len(segments) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    tokens = np.concatenate(segments).astype(np.int32) if segments else np.zeros(0, dtype=np.int32)
+    index = {'version': TOKENIZER_VERSION, 'stop_words_sha256': stop_words_hash, 'files': files}
+    save_cache(cache_dir, index, TokenizedCorpus([entry['filename'] for entry in files], vocab, tokens, offsets))
+    return load_cache(cache_dir)[1]
@@ -0,0 +1,91 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from doc_similarity import normalize_rows
+
+def shared_vocabulary_matrices(topic_words):
+    """
+    Re-expresses each fold's topics x words matrix over the union of the folds' vocabularies.
+    topic_words maps fold number -> (topic_word, vocabulary). Returns (vocabulary, {fold: matrix}).
+    """
+    vocabularies = [np.asarray(vocabulary, dtype=str) for _, vocabulary in topic_words.values()]
+    vocabulary, columns = np.unique(np.concatenate(vocabularies), return_inverse=True)
+    matrices = {}
+    start = 0
+    for (fold, (topic_word, _)), fold_vocabulary in zip(topic_words.items(), vocabularies):
+        matrix = np.zeros((topic_word.shape[0], len(vocabulary)), dtype=np.float32)
+        matrix[:, columns[start:start + len(fold_vocabulary)]] = topic_word
+        matrices[fold] = matrix
+        start += len(fold_vocabulary)
+    return vocabulary, matrices
+
+def match_topics(reference, topic_word):
+    """
+    Matches the topics of one model to those of a reference model over the same vocabulary, maximising
+    the total cosine similarity of the matched topic-word rows (Hungarian assignment).
+    Returns (mapping, similarities): mapping[t] is the reference topic matched to topic t, and
+    similarities[t] their cosine similarity. Topics left over when the model has more topics than the
+    reference get the IDs after the reference's.
+    """
+    similarity = normalize_rows(topic_word) @ normalize_rows(reference).T
+    rows, cols = linear_sum_assignment(similarity, maximize=True)
+    mapping = np.full(len(topic_word), -1, dtype=np.int64)
+    mapping[rows] = cols
+    unmatched = mapping < 0
+    mapping[unmatched] = len(reference) + np.arange(unmatched.sum())
+    similarities = np.zeros(len(topic_word), dtype=np.float32)
+    similarities[rows] = similarity[rows, cols]
+    return mapping, similarities
+
+def align_fold_topics(topic_words, reference_fold=None):
+    """
+    Matches every fold's topics to those of the reference fold (by default the last one).
+    Returns ({fold: mapping}, {fold: similarities}) as from match_topics(); the reference fold maps to itself.
+    """
+    if reference_fold is None:
+        reference_fold = max(topic_words)
+    _, matrices = shared_vocabulary_matrices(topic_words)
+    mappings, similarities = {}, {}
+    for fold, matrix in matrices.items():
+        mappings[fold], similarities[fold] = match_topics(matrices[reference_fold], matrix)
+    return mappings, similarities
+
+def remap_distributions(distributions, mapping, num_topics=None):
+    """
+    Moves the columns of a documents x topics matrix to the topic IDs given by mapping.
+    """
+    num_topics = num_topics or int(mapping.max()) + 1
+    remapped = np.zeros((len(distributions), num_topics), dtype=np.float32)
+    remapped[:, mapping] = distributions
+    return remapped
+
+def consensus_distributions(fold_data, mappings):
+    """
+    Builds each document's consensus topic distribution from the fold outputs (a list of
+    (fold number, data) as from topic_store.load_fold_distributions()). Each fold's distributions are
+    remapped to the aligned topic IDs, cut at the fold's minimum probability as in its CSV and
+    renormalised to sum to 1, then averaged over the folds that scored the document. Documents are
+    identified by filename where recorded, else by fold and Document ID.
+    Returns (document keys, documents x topics matrix).
+    """
+    num_topics = max(int(mapping.max()) + 1 for mapping in mappings.values())
+    keys, rows = [], []
+    for fold, data in fold_data:
+        distributions = np.where(data['distributions'] >= max(data['minimum_probability'], 1e-8), data['distributions'], 0)
+        distributions = remap_distributions(distributions, mappings[fold], num_topics)
+        totals = distributions.sum(axis=1, keepdims=True)
+        rows.append(np.divide(distributions, totals, out=np.zeros_like(distributions), where=totals > 0))
+        if data['filenames'] is not None:
+            keys.append(np.asarray(data['filenames'], dtype=object))
+        else:
+            keys.append(np.array([f'fold {fold}/{document_id}' for document_id in data['document_ids']], dtype=object))
+    document_keys, inverse = np.unique(np.concatenate(keys).astype(str), return_inverse=True)
+    sums = np.zeros((len(document_keys), num_topics), dtype=np.float64)
+    np.add.at(sums, inverse, np.concatenate(rows))
+    counts = np.bincount(inverse, minlength=len(document_keys))
+    return document_keys, (sums / counts[:, None]).astype(np.float32)
+
+def dominant_topic_counts(consensus):
+    """
+    Returns the number of documents whose most probable consensus topic is each topic.
+    """
+    return np.bincount(consensus.argmax(axis=1), minlength=consensus.shape[1])
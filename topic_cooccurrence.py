@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import networkx as nx
+from scipy.sparse import csr_matrix, triu
+
+WEIGHTINGS = ('binary', 'probability')
+
+def document_topic_matrix(df, min_probability=0.0, weighting='binary', document_column='Document ID'):
+    """
+    Builds a sparse documents x topics matrix from long-format topic distribution rows, keeping the
+    rows with a probability of at least min_probability. With 'binary' weighting an entry is 1 when the
+    document has the topic; with 'probability' it is the topic's probability (summed over repeated rows).
+    Returns (matrix, document IDs, topic IDs), the IDs labelling the matrix rows and columns.
+    """
+    if weighting not in WEIGHTINGS:
+        raise ValueError(f"Unknown weighting: {weighting} (expected one of {', '.join(WEIGHTINGS)})")
+    rows = df[df['Probability'] >= min_probability]
+    document_ids, doc_index = np.unique(rows[document_column].to_numpy(), return_inverse=True)
+    topic_ids, topic_index = np.unique(rows['Topic ID'].to_numpy(), return_inverse=True)
+    values = rows['Probability'].to_numpy(dtype=np.float64) if weighting == 'probability' else np.ones(len(rows))
+    matrix = csr_matrix((values, (doc_index, topic_index)), shape=(len(document_ids), len(topic_ids)))
+    if weighting == 'binary':
+        # Repeated (document, topic) rows were summed; a topic counts once per document
+        matrix.data[:] = 1.0
+    return matrix, document_ids, topic_ids
+
+def cooccurrence_matrix(doc_topic):
+    """
+    Returns the topics x topics co-occurrence matrix X^T X of a documents x topics matrix as a sparse
+    matrix: with binary weighting, entry (i, j) counts the documents having both topics, and the diagonal
+    counts the documents having each topic.
+    """
+    return (doc_topic.T @ doc_topic).tocsr()
+
+def cooccurrence_edges(matrix, topic_ids):
+    """
+    Returns the topic pairs that co-occur as a DataFrame with 'Weight', 'Topic 1' and 'Topic 2'
+    columns (Topic 1 < Topic 2), heaviest first.
+    """
+    pairs = triu(matrix, k=1).tocoo()
+    edges = pd.DataFrame({'Weight': pairs.data, 'Topic 1': topic_ids[pairs.row], 'Topic 2': topic_ids[pairs.col]})
+    edges = edges[edges['Weight'] > 0]
+    if np.allclose(edges['Weight'], np.round(edges['Weight'])):
+        edges['Weight'] = edges['Weight'].round().astype(np.int64)
+    return edges.sort_values(['Weight', 'Topic 1', 'Topic 2'], ascending=[False, True, True], kind='stable').reset_index(drop=True)
+
+def cooccurrence_graph(matrix, topic_ids):
+    """
+    Builds the weighted topic co-occurrence graph directly from the sparse adjacency, with nodes
+    labelled by topic ID. Topics that co-occur with no other topic are left out.
+    """
+    adjacency = triu(matrix, k=1)
+    adjacency = (adjacency + adjacency.T).tocsr()
+    adjacency.eliminate_zeros()
+    graph = nx.from_scipy_sparse_array(adjacency)
+    graph = nx.relabel_nodes(graph, dict(enumerate(topic_ids.tolist())))
+    graph.remove_nodes_from(list(nx.isolates(graph)))
+    return graph
@@ -0,0 +1,88 @@
+import os
+import numpy as np
+from scipy.sparse import csr_matrix
+from gensim.matutils import dirichlet_expectation
+from topic_store import distributions_frame, save_topic_distributions_npz
+from instrumentation import traced
+
+# Documents inferred together; bounds the memory of the batched variational inference
+INFERENCE_CHUNKSIZE = 1024
+# Documents formatted per block when writing CSVs
+WRITE_BLOCK_SIZE = 100000
+
+def batched_inference(model, chunk):
+    """
+    gensim's LdaModel.inference() for a chunk of bag-of-words documents, with the per-document
+    variational updates done for all documents at once on their concatenated word entries instead of
+    in a Python loop. Each document still stops iterating when its own gamma converges, and the random
+    initialisation is drawn exactly as gensim draws it. Returns gamma.
+    """
+    dtype = model.dtype
+    lengths = np.fromiter((len(doc) for doc in chunk), dtype=np.int64, count=len(chunk))
+    ids = np.fromiter((word_id for doc in chunk for word_id, _ in doc), dtype=np.int64, count=lengths.sum())
+    counts = np.fromiter((count for doc in chunk for _, count in doc), dtype=dtype, count=lengths.sum())
+    epsilon = np.finfo(dtype).eps
+
+    gamma = model.random_state.gamma(100., 1. / 100., (len(chunk), model.num_topics)).astype(dtype, copy=False)
+    exp_elog_theta = np.exp(dirichlet_expectation(gamma))
+    # Working set: documents whose word entries (with their topic-word weights) are held contiguously.
+    # It shrinks to the documents still iterating once at least half of it has converged.
+    work = np.arange(len(chunk))
+    work_lengths, work_counts = lengths, counts
+    work_betas = np.ascontiguousarray(model.expElogbeta.T[ids])
+    running = np.ones(len(chunk), dtype=bool)
+    for _ in range(model.iterations):
+        if not running.any():
+            break
+        if 2 * running.sum() <= len(work):
+            keep = np.repeat(running, work_lengths)
+            work_betas, work_counts = work_betas[keep], work_counts[keep]
+            work, work_lengths = work[running], work_lengths[running]
+            running = np.ones(len(work), dtype=bool)
+
+        theta = exp_elog_theta[work]
+        phinorm = np.einsum('ek,ek->e', np.repeat(theta, work_lengths, axis=0), work_betas) + epsilon
+        indptr = np.concatenate(([0], np.cumsum(work_lengths)))
+        # Sums each document's weighted entries: row d of the product is sum over its words of cts / phinorm * beta
+        weights = csr_matrix((work_counts / phinorm, np.arange(len(work_counts)), indptr), shape=(len(work), len(work_counts)))
+        new_gamma = (model.alpha + theta * (weights @ work_betas))[running]
+        docs = work[running]
+        mean_change = np.mean(np.abs(new_gamma - gamma[docs]), axis=1)
+        gamma[docs] = new_gamma
+        exp_elog_theta[docs] = np.exp(dirichlet_expectation(new_gamma))
+        running[running] = mean_change >= model.gamma_threshold
+    return gamma
+
+@traced()
+def infer_document_topics(model, corpus, chunksize=INFERENCE_CHUNKSIZE):
+    """
+    Returns the topic distribution of every document in a bag-of-words corpus as a dense float32
+    matrix (documents x topics), inferring a chunk of documents at a time with batched_inference().
+    The distributions are those get_document_topics() returns, before its minimum_probability filter.
+    """
+    distributions = np.empty((len(corpus), model.num_topics), dtype=np.float32)
+    for start in range(0, len(corpus), chunksize):
+        chunk = corpus[start:start + chunksize]
+        gamma = batched_inference(model, chunk)
+        distributions[start:start + len(chunk)] = gamma / gamma.sum(axis=1, keepdims=True)
+    return distributions
+
+def save_topic_distributions_csv(distributions, file_path, filenames=None, minimum_probability=0.0, block_size=WRITE_BLOCK_SIZE):
+    """
+    Writes a documents x topics matrix as a long-format CSV (see distributions_frame()).
+    Rows are built and formatted a block of documents at a time.
+    """
+    with open(file_path, 'w', newline='', encoding='utf-8') as file:
+        for start in range(0, max(len(distributions), 1), block_size):
+            block = distributions[start:start + block_size]
+            frame = distributions_frame(block, None if filenames is None else filenames[start:start + block_size],
+                                        minimum_probability, np.arange(start, start + len(block)))
+            frame.to_csv(file, header=start == 0, index=False, float_format='%.9g', lineterminator='\r\n')
+
+@traced('write_topic_distributions')
+def save_topic_distribution_outputs(distributions, file_path, filenames=None, minimum_probability=0.0):
+    """
+    Writes the CSV at file_path and the .npz store alongside it.
+    """
+    save_topic_distributions_csv(distributions, file_path, filenames, minimum_probability)
+    save_topic_distributions_npz(distributions, os.path.splitext(file_path)[0] + '.npz', filenames, minimum_probability)
@@ -0,0 +1,119 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+
+FOLD_FILE_PATTERN = re.compile(r'topic_distributions_fold_(\d+)\.(?:npz|csv)')
+TOPIC_WORDS_FILE_PATTERN = re.compile(r'topic_words_fold_(\d+)\.npz')
+
+def distributions_frame(distributions, filenames=None, minimum_probability=0.0, document_ids=None):
+    """
+    Returns a documents x topics matrix as the long DataFrame of the topic distribution CSVs: one
+    'Document ID, Topic ID, Probability' row per pair at or above minimum_probability (never below 1e-8,
+    like get_document_topics()), with a leading 'Filename' column when filenames are given.
+    Document IDs default to the row numbers.
+    """
+    minimum_probability = max(minimum_probability, 1e-8)
+    doc_index, topic_ids = np.nonzero(distributions >= minimum_probability)
+    document_ids = doc_index if document_ids is None else np.asarray(document_ids)[doc_index]
+    frame = pd.DataFrame({'Document ID': document_ids.astype(np.int64),
+                          'Topic ID': topic_ids.astype(np.int64),
+                          'Probability': distributions[doc_index, topic_ids]})
+    if filenames is not None:
+        frame.insert(0, 'Filename', np.asarray(filenames, dtype=object)[doc_index])
+    return frame
+
+def save_topic_distributions_npz(distributions, file_path, filenames=None, minimum_probability=0.0):
+    """
+    Writes a documents x topics matrix to an uncompressed .npz store: the dense float32 matrix,
+    the document IDs, the filenames if given, and the minimum_probability the CSV output applied,
+    so the store can be read back at disk speed with no parsing.
+    """
+    arrays = {'distributions': np.asarray(distributions, dtype=np.float32),
+              'document_ids': np.arange(len(distributions), dtype=np.int64),
+              'minimum_probability': np.float64(minimum_probability)}
+    if filenames is not None:
+        arrays['filenames'] = np.asarray(filenames, dtype=str)
+    temp_path = file_path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        np.savez(file, **arrays)
+    os.replace(temp_path, file_path)
+
+def load_distributions(file_path):
+    """
+    Loads one topic distribution output, given with or without its extension, as a dict with the
+    dense 'distributions' matrix, 'document_ids', 'filenames' (None if not recorded) and
+    'minimum_probability'. Reads the .npz store when there is one and parses the CSV otherwise.
+    """
+    base_path = os.path.splitext(file_path)[0]
+    if os.path.exists(base_path + '.npz'):
+        with np.load(base_path + '.npz') as data:
+            return {'distributions': data['distributions'],
+                    'document_ids': data['document_ids'],
+                    'filenames': data['filenames'].astype(object) if 'filenames' in data else None,
+                    'minimum_probability': float(data['minimum_probability'])}
+
+    frame = pd.read_csv(base_path + '.csv')
+    document_ids = np.sort(frame['Document ID'].unique())
+    num_topics = int(frame['Topic ID'].max()) + 1 if len(frame) else 0
+    distributions = np.zeros((len(document_ids), num_topics), dtype=np.float32)
+    distributions[np.searchsorted(document_ids, frame['Document ID']), frame['Topic ID']] = frame['Probability']
+    filenames = None
+    if 'Filename' in frame:
+        filenames = frame.drop_duplicates('Document ID').set_index('Document ID')['Filename'].loc[document_ids].to_numpy(dtype=object)
+    return {'distributions': distributions, 'document_ids': document_ids, 'filenames': filenames, 'minimum_probability': 0.0}
+
+def list_fold_files(folder_path):
+    """
+    Returns (fold number, path without extension) for every topic_distributions_fold_N output in the
+    folder, stored as .npz, .csv or both, in fold order.
+    """
+    folds = {}
+    for filename in os.listdir(folder_path):
+        match = FOLD_FILE_PATTERN.fullmatch(filename)
+        if match:
+            folds[int(match.group(1))] = os.path.join(folder_path, f'topic_distributions_fold_{match.group(1)}')
+    return sorted(folds.items())
+
+def load_fold_distributions(folder_path):
+    """
+    Loads every fold's topic distributions (see load_distributions()) as a list of (fold number, dict).
+    """
+    return [(fold, load_distributions(base_path)) for fold, base_path in list_fold_files(folder_path)]
+
+def load_topic_distributions_frame(folder_path):
+    """
+    Returns the topic distributions of every fold as one long DataFrame with the rows of the fold CSVs,
+    plus a 'Fold' column, built from the .npz stores where available.
+    """
+    frames = []
+    for fold, data in load_fold_distributions(folder_path):
+        frame = distributions_frame(data['distributions'], data['filenames'], data['minimum_probability'], data['document_ids'])
+        frame['Probability'] = frame['Probability'].astype(np.float64)
+        frame.insert(0, 'Fold', fold)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=['Fold', 'Document ID', 'Topic ID', 'Probability'])
+    return pd.concat(frames, ignore_index=True)
+
+def save_topic_words(topic_word, vocabulary, file_path):
+    """
+    Writes a fold model's topics x words probability matrix (as from get_topics()) to an .npz store,
+    with the vocabulary naming its columns, so topics can be matched across folds with different dictionaries.
+    """
+    temp_path = file_path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        np.savez(file, topic_word=np.asarray(topic_word, dtype=np.float32), vocabulary=np.asarray(vocabulary, dtype=str))
+    os.replace(temp_path, file_path)
+
+def load_fold_topic_words(folder_path):
+    """
+    Loads every topic_words_fold_N.npz in the folder as a dict of fold number -> (topic_word, vocabulary).
+    """
+    topic_words = {}
+    for filename in os.listdir(folder_path):
+        match = TOPIC_WORDS_FILE_PATTERN.fullmatch(filename)
+        if match:
+            with np.load(os.path.join(folder_path, filename)) as data:
+                topic_words[int(match.group(1))] = (data['topic_word'], data['vocabulary'].astype(object))
+    return dict(sorted(topic_words.items()))
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+class TopicTimeCube:
+    """
+    Aggregates of the topic distribution rows by integer year and topic: the sum, sum of squares and
+    number of probability rows per (year, topic), and the number of distinct documents per year.
+    The year axis runs over every year from the first to the last, so years without documents are
+    present with zero counts. Means, spreads and trends are derived from these arrays without
+    touching the rows again.
+    """
+
+    def __init__(self, years, topic_ids, sums, sum_squares, counts, documents):
+        self.years = np.asarray(years, dtype=np.int64)
+        self.topic_ids = np.asarray(topic_ids, dtype=np.int64)
+        self.sums = np.asarray(sums, dtype=np.float64)
+        self.sum_squares = np.asarray(sum_squares, dtype=np.float64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.documents = np.asarray(documents, dtype=np.int64)
+
+    @classmethod
+    def from_rows(cls, years, doc_keys, topic_ids, probabilities, year_range=None, all_topic_ids=None):
+        """
+        Builds the cube from parallel arrays of topic rows with scatter-adds (bincount) over the flat
+        (year, topic) index. Documents are counted once per year however many topic rows they have.
+        """
+        years = np.asarray(years, dtype=np.int64)
+        topic_ids = np.asarray(topic_ids, dtype=np.int64)
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        if year_range is None:
+            year_range = (years.min(), years.max()) if len(years) else (0, -1)
+        year_axis = np.arange(year_range[0], year_range[1] + 1)
+        topic_axis = np.unique(topic_ids) if all_topic_ids is None else np.asarray(all_topic_ids, dtype=np.int64)
+        year_index = years - year_range[0]
+        flat = year_index * len(topic_axis) + np.searchsorted(topic_axis, topic_ids)
+        size = len(year_axis) * len(topic_axis)
+        shape = (len(year_axis), len(topic_axis))
+        sums = np.bincount(flat, weights=probabilities, minlength=size).reshape(shape)
+        sum_squares = np.bincount(flat, weights=probabilities ** 2, minlength=size).reshape(shape)
+        counts = np.bincount(flat, minlength=size).reshape(shape)
+        year_doc_pairs = np.unique(np.stack([year_index, np.asarray(doc_keys, dtype=np.int64)]), axis=1)
+        documents = np.bincount(year_doc_pairs[0], minlength=len(year_axis))
+        return cls(year_axis, topic_axis, sums, sum_squares, counts, documents)
+
+    @classmethod
+    def from_stats(cls, stats, year_documents):
+        """
+        Builds the cube from long (Year, Topic ID, Rows, Sum, Sum Squares) and (Year, Documents) frames,
+        adding up repeated entries (such as those of different folds).
+        """
+        if not len(stats):
+            return cls([], [], np.zeros((0, 0)), np.zeros((0, 0)), np.zeros((0, 0)), [])
+        years = stats['Year'].to_numpy(dtype=np.int64)
+        year_axis = np.arange(years.min(), years.max() + 1)
+        topic_axis = np.unique(stats['Topic ID'].to_numpy(dtype=np.int64))
+        flat = (years - year_axis[0]) * len(topic_axis) + np.searchsorted(topic_axis, stats['Topic ID'].to_numpy(dtype=np.int64))
+        size, shape = len(year_axis) * len(topic_axis), (len(year_axis), len(topic_axis))
+
+        def scatter(column):
+            return np.bincount(flat, weights=stats[column].to_numpy(dtype=np.float64), minlength=size).reshape(shape)
+
+        documents = np.bincount(year_documents['Year'].to_numpy(dtype=np.int64) - year_axis[0],
+                                weights=year_documents['Documents'].to_numpy(dtype=np.float64), minlength=len(year_axis))
+        return cls(year_axis, topic_axis, scatter('Sum'), scatter('Sum Squares'), scatter('Rows').round(), documents.round())
+
+    def stats_frames(self):
+        """
+        Returns the non-empty cells as the long frames from_stats() reads.
+        """
+        year_index, topic_index = np.nonzero(self.counts)
+        stats = pd.DataFrame({'Year': self.years[year_index], 'Topic ID': self.topic_ids[topic_index],
+                              'Rows': self.counts[year_index, topic_index], 'Sum': self.sums[year_index, topic_index],
+                              'Sum Squares': self.sum_squares[year_index, topic_index]})
+        has_documents = self.documents > 0
+        return stats, pd.DataFrame({'Year': self.years[has_documents], 'Documents': self.documents[has_documents]})
+
+    def mean(self):
+        """
+        Mean probability per (year, topic); NaN where there are no rows.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.sums / self.counts
+
+    def variance(self):
+        """
+        Sample variance of the probabilities per (year, topic); NaN with fewer than two rows.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variance = (self.sum_squares - self.sums ** 2 / self.counts) / (self.counts - 1)
+        return np.where(self.counts > 1, np.maximum(variance, 0.0), np.nan)
+
+    def confidence_band(self, z=1.96):
+        """
+        Returns (lower, upper): the mean plus or minus z standard errors, per (year, topic).
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            half_width = z * np.sqrt(self.variance() / self.counts)
+        mean = self.mean()
+        return mean - half_width, mean + half_width
+
+    def moving_average(self, window=3):
+        """
+        Mean probability per (year, topic) over the window years ending at each year, pooling the rows
+        of those years (so years with more documents weigh more).
+        """
+        def trailing(values):
+            cumulative = np.cumsum(np.concatenate([np.zeros((1,) + values.shape[1:]), values]), axis=0)
+            return cumulative[1:] - cumulative[np.maximum(np.arange(1, len(values) + 1) - window, 0)]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return trailing(self.sums) / trailing(self.counts)
+
+    def trend(self):
+        """
+        Per-topic least-squares slope of the yearly mean probability against the year, weighting each
+        year by its number of rows. Returns one slope per topic (change in probability per year).
+        """
+        weights = self.counts.astype(np.float64)
+        mean = np.nan_to_num(self.mean())
+        total = weights.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            year_mean = (weights * self.years[:, None]).sum(axis=0) / total
+            centered = self.years[:, None] - year_mean
+            return (weights * centered * mean).sum(axis=0) / (weights * centered ** 2).sum(axis=0)
+
+    def frame(self):
+        """
+        Returns the non-empty cells as a long DataFrame: Year, Topic ID, Probability (mean), Rows, Std.
+        """
+        year_index, topic_index = np.nonzero(self.counts)
+        return pd.DataFrame({'Year': self.years[year_index],
+                             'Topic ID': self.topic_ids[topic_index],
+                             'Probability': self.mean()[year_index, topic_index],
+                             'Rows': self.counts[year_index, topic_index],
+                             'Std': np.sqrt(self.variance()[year_index, topic_index])})
+
+    def articles_frame(self):
+        """
+        Returns the number of distinct documents per year, for the years that have any.
+        """
+        has_documents = self.documents > 0
+        return pd.DataFrame({'Year': self.years[has_documents], 'Articles': self.documents[has_documents]})